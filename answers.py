@@ -0,0 +1,147 @@
+"""
+Câu trả lời cho chế độ sửa lỗi không tương tác
+
+Các bước sửa lỗi cần người dùng quyết định (địa chỉ syslog của 4.2, VLAN mới cho
+5.9/5.10, VM nào được sửa ở 7.x) được cung cấp trước qua file answers hoặc tham số
+dòng lệnh, nhờ đó sửa lỗi có thể chạy song song trên nhiều host mà không dừng ở input().
+
+Định dạng file answers (JSON, hoặc YAML nếu cài PyYAML):
+
+    {
+        "syslog_host": "tcp://192.168.1.10:514",
+        "vlan": {"VM Network": 20, "*": 30},
+        "vms": "all",
+        "hosts": {
+            "192.168.1.100": {"vlan": {"VM Network": 120}}
+        }
+    }
+
+- syslog_host: tcp|udp|ssl://host:port, nhiều đích phân cách bởi dấu phẩy.
+- vlan: tên port group -> VLAN ID mới (0-4094); "*" áp dụng cho port group không có tên riêng.
+- vms: "all", hoặc {sec_id: "all" | [tên VM / vmid]}, "*" cho các mục còn lại.
+- hosts: ghi đè theo từng host (trộn với phần chung).
+"""
+
+import json
+import os
+import re
+
+ANSWER_KEYS = ("syslog_host", "vlan", "vms")
+
+# Một đích syslog của ESXi: tcp|udp|ssl://host:port (host là tên / IPv4 / [IPv6]);
+# syslog_host có thể gồm nhiều đích phân cách bởi dấu phẩy
+SYSLOG_TARGET_RE = re.compile(r"(tcp|udp|ssl)://(\[[0-9A-Fa-f:.]+\]|[A-Za-z0-9.-]+):(\d{1,5})")
+
+# VLAN ID hợp lệ cho port group (4095 = trunk mọi VLAN, không dùng làm VLAN mới)
+VLAN_ID_RANGE = (0, 4094)
+
+
+def load_answers(path):
+    """Đọc file answers (JSON hoặc YAML)."""
+    path = os.path.expanduser(path)
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yml", ".yaml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Cần cài PyYAML để đọc file answers dạng YAML (pip install pyyaml)")
+            data = yaml.safe_load(f) or {}
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"File answers không hợp lệ: {path}")
+    return data
+
+
+def is_valid_syslog_host(value):
+    """syslog_host có đúng dạng tcp|udp|ssl://host:port (một hoặc nhiều đích, phân cách bởi dấu phẩy) không."""
+    if not isinstance(value, str) or not value.strip():
+        return False
+    for target in value.split(","):
+        m = SYSLOG_TARGET_RE.fullmatch(target.strip())
+        if m is None or not 0 < int(m.group(3)) <= 65535:
+            return False
+    return True
+
+
+def parse_vlan_id(value):
+    """VLAN ID (int) trong VLAN_ID_RANGE; ValueError nếu không phải số hoặc ngoài khoảng."""
+    vlan_id = int(str(value).strip())
+    low, high = VLAN_ID_RANGE
+    if not low <= vlan_id <= high:
+        raise ValueError(f"VLAN ID phải trong khoảng {low}-{high}: {vlan_id}")
+    return vlan_id
+
+
+def parse_vlan_args(values):
+    """Chuyển các tham số --vlan 'Tên port group=ID' thành dict {tên: ID}."""
+    vlan = {}
+    for item in values or []:
+        name, sep, vlan_id = item.rpartition("=")
+        if not sep or not name or not vlan_id.strip().isdigit():
+            raise ValueError(f"Tham số --vlan không hợp lệ (cần dạng 'Tên=ID'): {item}")
+        try:
+            vlan[name.strip()] = parse_vlan_id(vlan_id)
+        except ValueError as e:
+            raise ValueError(f"Tham số --vlan không hợp lệ ({e}): {item}") from None
+    return vlan
+
+
+def merge_answers(base, override):
+    """Trộn hai bộ answers; dict con (vlan, vms) được trộn theo khóa."""
+    merged = dict(base or {})
+    for key, val in (override or {}).items():
+        if isinstance(val, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **val}
+        else:
+            merged[key] = val
+    return merged
+
+
+def answers_for_host(answers, host):
+    """Answers áp dụng cho một host (phần chung + phần ghi đè của host)."""
+    common = {k: v for k, v in answers.items() if k != "hosts"}
+    return merge_answers(common, answers.get("hosts", {}).get(host))
+
+
+def vlan_for_portgroup(host_answers, pg_name):
+    """VLAN ID mới cho port group, None nếu không có câu trả lời."""
+    vlan = host_answers.get("vlan") or {}
+    new_vlan = vlan.get(pg_name, vlan.get("*"))
+    return parse_vlan_id(new_vlan) if new_vlan is not None else None
+
+
+def vm_selection(host_answers, sec_id):
+    """Lựa chọn VM cho mục 7.x: 'all', list tên/vmid, hoặc None nếu không có câu trả lời."""
+    vms = host_answers.get("vms")
+    if isinstance(vms, dict):
+        return vms.get(sec_id, vms.get("*"))
+    return vms
+
+
+def missing_answers(host_answers, sec_id, detail):
+    """
+    Kiểm tra trước khi sửa: mục sec_id còn thiếu câu trả lời nào không.
+
+    Trả về chuỗi mô tả phần còn thiếu, hoặc None nếu đủ.
+    """
+    if sec_id == "4.2":
+        syslog_host = host_answers.get("syslog_host")
+        if not syslog_host:
+            return "thiếu syslog_host"
+        if not is_valid_syslog_host(syslog_host):
+            return f"syslog_host không hợp lệ (cần dạng tcp|udp|ssl://host:port): {syslog_host!r}"
+    if sec_id in ("5.9", "5.10"):
+        missing = []
+        for pg in (detail or {}).get("bad_pgs", []):
+            try:
+                new_vlan = vlan_for_portgroup(host_answers, pg["name"])
+            except ValueError as e:
+                return f"VLAN không hợp lệ cho port group {pg['name']}: {e}"
+            if new_vlan is None:
+                missing.append(pg["name"])
+        if missing:
+            return f"thiếu VLAN cho port group: {', '.join(missing)}"
+    if sec_id.startswith("7.") and vm_selection(host_answers, sec_id) is None:
+        return "thiếu lựa chọn VM (vms)"
+    return None
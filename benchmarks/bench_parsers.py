@@ -0,0 +1,497 @@
+"""
+Microbenchmark các parser output ESXi
+
+So các parser hiện tại (checks/*.py) với bản cài đặt trước đây (giữ nguyên văn bên dưới,
+phần "parser cũ") trên hai loại dữ liệu:
+
+- corpus (benchmarks/corpus/): output mẫu theo định dạng ESXi 8 (vib list, getallvms với
+  tên VM / datastore có khoảng trắng, portgroup list, advanced list, vswitch list,
+  security policy, syslog config, dump .vmx)
+- output tổng hợp cỡ lớn sinh tất định: 10k VM (getallvms + dump .vmx), 5k VIB,
+  1k port group (network inventory gộp), 5k advanced option
+
+Với mỗi trường hợp, script kiểm tra kết quả của parser cũ và mới GIỐNG HỆT NHAU rồi đo
+thời gian (lấy lần nhanh nhất trong --repeat lần). Trả mã 1 nếu có kết quả khác nhau.
+
+    python benchmarks/bench_parsers.py
+    python benchmarks/bench_parsers.py --vms 20000 --repeat 5 --output parsers.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(REPO_ROOT, "benchmarks", "corpus")
+sys.path.insert(0, REPO_ROOT)
+
+from utils import BATCH_MARKER  # noqa: E402
+from checks.base import ALLOWED_LEVELS, parse_bad_vibs  # noqa: E402
+from checks.logging import parse_syslog_config  # noqa: E402
+from checks.network import (  # noqa: E402
+    SECURITY_POLICY_FIELDS, parse_network_inventory, parse_security_policy,
+    parse_standard_portgroups, parse_vswitch_list,
+)
+from checks.settings import parse_advanced_settings  # noqa: E402
+from checks.virtual_machine import parse_vms_list, parse_vmx_dump  # noqa: E402
+
+
+# ==================== parser cũ (để đối chiếu) ====================
+
+def legacy_split_batch_output(output, marker=BATCH_MARKER):
+    sections = {}
+    name = None
+    buf = []
+    prefix = marker + " "
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            if name is not None:
+                sections[name] = "\n".join(buf)
+            name = line[len(prefix):]
+            buf = []
+        elif name is not None:
+            buf.append(line)
+    if name is not None:
+        sections[name] = "\n".join(buf)
+    return sections
+
+
+def legacy_parse_bad_vibs(output):
+    bad_vibs = []
+    started_data = False
+
+    for line in output.splitlines():
+        if not started_data:
+            if "Acceptance Level" in line:
+                started_data = True
+            continue
+
+        if not line.strip():
+            continue
+
+        if line.replace("-", "").strip() == "":
+            continue
+
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+
+        vib_name = parts[0]
+        vib_accept = parts[3]
+
+        if vib_accept not in ALLOWED_LEVELS:
+            bad_vibs.append({"name": vib_name, "acceptance": vib_accept})
+
+    return bad_vibs
+
+
+def legacy_parse_vswitch_policy(output, key="Allow Forged Transmits"):
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith(key):
+            parts = line.split(":", 1)
+            if len(parts) == 2:
+                val_str = parts[1].strip().lower()
+                return val_str == "true"
+    return None
+
+
+def legacy_parse_standard_portgroups(output):
+    pgs = []
+    start_parsing = False
+    for line in output.splitlines():
+        if line.strip().startswith("----"):
+            start_parsing = True
+            continue
+        if not start_parsing:
+            continue
+        if not line.strip():
+            continue
+
+        parts = line.split()
+        if len(parts) >= 4:
+            try:
+                vlan = int(parts[-1])
+                name = " ".join(parts[:-3])
+                pgs.append({"name": name, "vswitch": parts[-3], "vlan": vlan})
+            except ValueError:
+                pass
+    return pgs
+
+
+def legacy_parse_vswitch_list(output):
+    vswitches = {}
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if ":" not in line:
+            continue
+        key, val = line.split(":", 1)
+        key = key.strip()
+        val = val.strip()
+        if key == "Name":
+            current = vswitches.setdefault(val, {"name": val, "portgroups": [], "uplinks": []})
+        elif current is not None and key in ("Portgroups", "Uplinks"):
+            current[key.lower()] = [item.strip() for item in val.split(",") if item.strip()]
+    return vswitches
+
+
+def legacy_parse_security_policy(output):
+    policy = {}
+    overrides = {}
+    for field, label, _ in SECURITY_POLICY_FIELDS:
+        policy[field] = legacy_parse_vswitch_policy(output, label)
+        overrides[field] = legacy_parse_vswitch_policy(output, f"Override Vswitch {label}")
+    policy["overrides"] = overrides
+    return policy
+
+
+def legacy_parse_network_inventory(output):
+    sections = legacy_split_batch_output(output)
+    vswitches = legacy_parse_vswitch_list(sections.get("vswitches", ""))
+    portgroups = legacy_parse_standard_portgroups(sections.get("portgroups", ""))
+
+    for name, vs in vswitches.items():
+        vs["policy"] = legacy_parse_security_policy(sections.get(f"vswitch-policy {name}", ""))
+    for pg in portgroups:
+        pg["policy"] = legacy_parse_security_policy(sections.get(f"portgroup-policy {pg['name']}", ""))
+
+    return {"vswitches": vswitches, "portgroups": portgroups}
+
+
+def legacy_parse_vms_list(output):
+    vms = []
+    lines = output.splitlines()
+    data_lines = [line for line in lines if line.strip() and not line.strip().startswith("Vmid")]
+
+    for line in data_lines:
+        parts = line.split()
+        if not parts:
+            continue
+
+        try:
+            vmid = parts[0]
+            int(vmid)
+
+            path_start_idx = -1
+            for i, p in enumerate(parts):
+                if p.startswith("["):
+                    path_start_idx = i
+                    break
+
+            if path_start_idx != -1:
+                name = " ".join(parts[1:path_start_idx])
+                line_rest = " ".join(parts[path_start_idx:])
+
+                if ".vmx" in line_rest:
+                    raw_path = line_rest.split(".vmx")[0] + ".vmx"
+                    path = raw_path
+
+                    if raw_path.startswith("["):
+                        ds_end = raw_path.find("]")
+                        if ds_end != -1:
+                            ds_name = raw_path[1:ds_end]
+                            rel_path = raw_path[ds_end+1:].strip()
+                            path = f"/vmfs/volumes/{ds_name}/{rel_path}"
+
+                vms.append({"vmid": vmid, "name": name, "path": path})
+        except ValueError:
+            continue
+
+    return vms
+
+
+def legacy_parse_vmx(text):
+    config = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or "=" not in line:
+            continue
+        key, raw_val = line.split("=", 1)
+        key = key.strip()
+        if key not in config:
+            config[key] = raw_val.strip().replace('"', '')
+    return config
+
+
+def legacy_parse_vmx_dump(output):
+    configs = {}
+    path = None
+    buf = []
+    prefix = BATCH_MARKER + " "
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            if path is not None:
+                configs[path] = legacy_parse_vmx("\n".join(buf))
+            path = line[len(prefix):]
+            buf = []
+        elif path is not None:
+            buf.append(line)
+    if path is not None:
+        configs[path] = legacy_parse_vmx("\n".join(buf))
+    return configs
+
+
+def legacy_parse_advanced_settings(output):
+    settings = {}
+    current = None
+    for line in output.splitlines():
+        line = line.strip()
+        if ":" not in line:
+            continue
+        field, val = line.split(":", 1)
+        field = field.strip()
+        val = val.strip()
+        if field == "Path":
+            current = settings.setdefault(val, {})
+        elif current is not None:
+            current[field] = val
+    return settings
+
+
+def legacy_parse_syslog_config(output):
+    config = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if ":" in line:
+            key, val = line.split(":", 1)
+            config[key.strip()] = val.strip()
+    return config
+
+
+# (tên, parser cũ, parser mới)
+PARSERS = {
+    "vib_list": (legacy_parse_bad_vibs, parse_bad_vibs),
+    "getallvms": (legacy_parse_vms_list, parse_vms_list),
+    "vmx_dump": (legacy_parse_vmx_dump, parse_vmx_dump),
+    "portgroup_list": (legacy_parse_standard_portgroups, parse_standard_portgroups),
+    "vswitch_list": (legacy_parse_vswitch_list, parse_vswitch_list),
+    "security_policy": (legacy_parse_security_policy, parse_security_policy),
+    "network_inventory": (legacy_parse_network_inventory, parse_network_inventory),
+    "advanced_list": (legacy_parse_advanced_settings, parse_advanced_settings),
+    "syslog_config": (legacy_parse_syslog_config, parse_syslog_config),
+}
+
+# File corpus -> parser dùng để đọc
+CORPUS_FILES = {
+    "vib_list.txt": "vib_list",
+    "getallvms.txt": "getallvms",
+    "vmx_dump.txt": "vmx_dump",
+    "portgroup_list.txt": "portgroup_list",
+    "vswitch_list.txt": "vswitch_list",
+    "policy_vswitch.txt": "security_policy",
+    "policy_portgroup.txt": "security_policy",
+    "advanced_list.txt": "advanced_list",
+    "syslog_config.txt": "syslog_config",
+}
+
+
+# ==================== output tổng hợp ====================
+
+VMX_TEMPLATE = [
+    '.encoding = "UTF-8"',
+    'config.version = "8"',
+    'virtualHW.version = "20"',
+    'displayName = "{name}"',
+    'guestOS = "ubuntu64Guest"',
+    'memSize = "4096"',
+    'numvcpus = "2"',
+    'scsi0.virtualDev = "pvscsi"',
+    'scsi0:0.fileName = "{name}.vmdk"',
+    'ethernet0.virtualDev = "vmxnet3"',
+    'ethernet0.networkName = "VM Network"',
+    'ethernet0.addressType = "vpx"',
+    'uuid.bios = "42 1e 5a 7b 9c 0d 11 22-33 44 55 66 77 88 99 aa"',
+    'nvram = "{name}.nvram"',
+    'tools.syncTime = "FALSE"',
+    'sched.cpu.units = "mhz"',
+    'sched.mem.min = "0"',
+    'migrate.hostLog = "{name}-1a2b3c.hlog"',
+]
+VMX_CIS_SETTINGS = [
+    ("RemoteDisplay.maxConnections", ["1", "2"]),
+    ("isolation.tools.diskShrink.disable", ["TRUE", "FALSE"]),
+    ("isolation.tools.diskWiper.disable", ["TRUE", "FALSE"]),
+    ("tools.guestlib.enableHostInfo", ["FALSE", "TRUE"]),
+    ("log.keepOld", ["10", "3"]),
+    ("log.rotateSize", ["1000000", "2048000"]),
+]
+DATASTORES = ["datastore1", "datastore2", "SAN Volume 01", "nfs-share"]
+VIB_LEVELS = ["VMwareCertified"] * 6 + ["VMwareAccepted", "PartnerSupported", "CommunitySupported"]
+
+
+def _vm_name(rng, i):
+    return f"vm {i:05d} app" if rng.random() < 0.2 else f"vm-{i:05d}"
+
+
+def synth_getallvms(n, seed=1):
+    rng = random.Random(seed)
+    lines = ["Vmid          Name                             File                              Guest OS          Version   Annotation"]
+    for i in range(1, n + 1):
+        name = _vm_name(rng, i)
+        ds = rng.choice(DATASTORES)
+        note = "multi\nline note" if rng.random() < 0.02 else ""
+        lines.append(f"{i:<6} {name:<28} [{ds}] {name}/{name}.vmx    ubuntu64Guest       vmx-20    {note}")
+    return "\n".join(lines) + "\n"
+
+
+def synth_vmx_dump(n, seed=2):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(1, n + 1):
+        name = _vm_name(rng, i)
+        lines.append(f"{BATCH_MARKER} /vmfs/volumes/{rng.choice(DATASTORES)}/{name}/{name}.vmx")
+        lines.extend(line.format(name=name) for line in VMX_TEMPLATE)
+        for key, values in VMX_CIS_SETTINGS:
+            if rng.random() < 0.7:
+                lines.append(f'{key} = "{rng.choice(values)}"')
+        if rng.random() < 0.1:
+            lines.append('# edited by hand')
+    return "\n".join(lines) + "\n"
+
+
+def synth_vib_list(n, seed=3):
+    rng = random.Random(seed)
+    lines = [
+        "Name                           Version                               Vendor  Acceptance Level  Install Date  Platforms",
+        "-----------------------------  ------------------------------------  ------  ----------------  ------------  ---------",
+    ]
+    for i in range(n):
+        lines.append(f"vib-{i:05d}-driver              {rng.randint(1, 9)}.{rng.randint(0, 99)}.0-1OEM.800.1.0.20613240     "
+                     f"VND     {rng.choice(VIB_LEVELS):<17} 2024-01-{rng.randint(1, 28):02d}    host")
+    return "\n".join(lines) + "\n"
+
+
+def synth_network_inventory(n, seed=4):
+    rng = random.Random(seed)
+    vswitch_count = max(1, n // 100)
+    pgs = [(f"PG {i:04d}" if rng.random() < 0.3 else f"pg-{i:04d}", f"vSwitch{i % vswitch_count}") for i in range(n)]
+
+    def policy(override):
+        out = [f"   {label}: {rng.choice(['true', 'false'])}" for _, label, _ in SECURITY_POLICY_FIELDS]
+        if override:
+            out += [f"   Override Vswitch {label}: {rng.choice(['true', 'false'])}" for _, label, _ in SECURITY_POLICY_FIELDS]
+        return out
+
+    lines = [f"{BATCH_MARKER} vswitches"]
+    for v in range(vswitch_count):
+        members = ", ".join(name for name, vs in pgs if vs == f"vSwitch{v}")
+        lines += [f"vSwitch{v}", f"   Name: vSwitch{v}", "   Class: cswitch", "   MTU: 1500",
+                  f"   Uplinks: vmnic{v}", f"   Portgroups: {members}", ""]
+    lines += [f"{BATCH_MARKER} portgroups",
+              "Name                    Virtual Switch  Active Clients  VLAN ID",
+              "----------------------  --------------  --------------  -------"]
+    lines += [f"{name:<22}  {vs:<14}  {rng.randint(0, 9):>14}  {rng.choice([0, 1, 100, 200, 4095]):>7}" for name, vs in pgs]
+    for v in range(vswitch_count):
+        lines.append(f"{BATCH_MARKER} vswitch-policy vSwitch{v}")
+        lines += policy(False)
+    for name, _ in pgs:
+        lines.append(f"{BATCH_MARKER} portgroup-policy {name}")
+        lines += policy(True)
+    return "\n".join(lines) + "\n"
+
+
+def synth_advanced_list(n, seed=5):
+    rng = random.Random(seed)
+    blocks = []
+    for i in range(n):
+        value = rng.randint(0, 1000)
+        blocks.append(
+            f"   Path: /Group{i % 50}/Option{i}\n   Type: integer\n   Int Value: {value}\n"
+            f"   Default Int Value: {value}\n   Min Value: 0\n   Max Value: 1000\n   String Value:\n"
+            f"   Default String Value:\n   Valid Characters:\n   Description: Synthetic option {i}: value in range\n"
+        )
+    return "\n".join(blocks)
+
+
+# ==================== đo ====================
+
+def best_time(func, data, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+
+def run_case(label, parser, data, repeat):
+    legacy, current = PARSERS[parser]
+    case = {"case": label, "parser": parser, "bytes": len(data), "lines": data.count("\n")}
+    case["identical"] = legacy(data) == current(data)
+    case["legacy_s"] = round(best_time(legacy, data, repeat), 6)
+    case["new_s"] = round(best_time(current, data, repeat), 6)
+    case["speedup"] = round(case["legacy_s"] / case["new_s"], 2) if case["new_s"] else None
+    return case
+
+
+def print_case(c):
+    status = "giống" if c["identical"] else "KHÁC"
+    print(f"  {c['case']:<28} {c['lines']:>8} dòng  cũ {c['legacy_s'] * 1000:9.2f} ms  "
+          f"mới {c['new_s'] * 1000:9.2f} ms  x{c['speedup']}  kết quả {status}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark các parser output ESXi")
+    parser.add_argument("--vms", type=int, default=10_000, help="Số VM của output tổng hợp (mặc định 10000)")
+    parser.add_argument("--vibs", type=int, default=5_000, help="Số VIB của output tổng hợp (mặc định 5000)")
+    parser.add_argument("--portgroups", type=int, default=1_000, help="Số port group (mặc định 1000)")
+    parser.add_argument("--options", type=int, default=5_000, help="Số advanced option (mặc định 5000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo mỗi parser, lấy lần nhanh nhất")
+    parser.add_argument("--output", metavar="FILE", help="Ghi kết quả ra file JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cases = []
+
+    print("Corpus:")
+    for filename, parser in CORPUS_FILES.items():
+        with open(os.path.join(CORPUS_DIR, filename), encoding="utf-8") as f:
+            data = f.read()
+        case = run_case(filename, parser, data, args.repeat)
+        print_case(case)
+        cases.append(case)
+
+    print("Output tổng hợp:")
+    synthetic = [
+        (f"getallvms x{args.vms}", "getallvms", synth_getallvms(args.vms)),
+        (f"vmx_dump x{args.vms}", "vmx_dump", synth_vmx_dump(args.vms)),
+        (f"vib_list x{args.vibs}", "vib_list", synth_vib_list(args.vibs)),
+        (f"network x{args.portgroups} pg", "network_inventory", synth_network_inventory(args.portgroups)),
+        (f"advanced_list x{args.options}", "advanced_list", synth_advanced_list(args.options)),
+    ]
+    for label, parser, data in synthetic:
+        case = run_case(label, parser, data, args.repeat)
+        print_case(case)
+        cases.append(case)
+
+    mismatches = [c["case"] for c in cases if not c["identical"]]
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": cases,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nĐã ghi kết quả: {args.output}")
+
+    if mismatches:
+        print(f"\nLỖI: kết quả parser mới khác parser cũ: {', '.join(mismatches)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
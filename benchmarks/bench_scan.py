@@ -0,0 +1,286 @@
+"""
+Benchmark quét / sửa lỗi end-to-end trên ESXi giả lập (simulator/)
+
+Với mỗi kịch bản (số host x số VM mỗi host x RTT), script:
+
+1. khởi động simulator trong một process riêng (python -m simulator --reset ...)
+2. chạy run_checks rồi run_fixes (trừ khi --no-fix) trong một process con khác, để
+   peak RSS và các bộ đếm (SSH_STATS, FACT_CACHE) chỉ thuộc về kịch bản đó
+3. ghi lại thời gian, số session SSH, số exec channel, số byte gửi / nhận, peak RSS
+
+Với --delta, bước kiểm tra chạy với kho kết quả delta (fingerprint.py) rồi chạy lại lần
+hai trên cùng fleet (pha checks_delta): khi cấu hình không đổi, lần hai chỉ còn một lệnh
+đọc dấu vân tay mỗi host.
+
+Kết quả ghi ra JSON (mặc định benchmarks/results/scan-<thời gian>.json). Với --compare,
+kết quả được so với một file trước đó và script trả mã 1 nếu có kịch bản chậm hơn
+quá --max-regression hoặc dùng nhiều exec channel hơn.
+
+    python benchmarks/bench_scan.py --preset smoke
+    python benchmarks/bench_scan.py --hosts 1,50 --vms 10,400 --rtt-ms 0,20 --compare old.json
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Các bộ kịch bản có sẵn: (số host, số VM mỗi host, RTT ms)
+PRESETS = {
+    "smoke": {"hosts": [1], "vms": [10], "rtt_ms": [0]},
+    "default": {"hosts": [1, 50], "vms": [10, 400], "rtt_ms": [0, 20]},
+    "full": {"hosts": [1, 50, 500], "vms": [10, 400, 2000], "rtt_ms": [0, 20, 100]},
+}
+
+# Câu trả lời cho bước sửa lỗi để mọi mục đều sửa được mà không hỏi
+BENCH_ANSWERS = {"syslog_host": "udp://10.0.0.10:514", "vlan": {"*": 100}, "vms": "all"}
+
+SIMULATOR_START_TIMEOUT = 600
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark quét / sửa lỗi trên ESXi giả lập")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="smoke",
+                        help="Bộ kịch bản (mặc định smoke); --hosts/--vms/--rtt-ms ghi đè từng chiều")
+    parser.add_argument("--hosts", type=_int_list, help="Danh sách số host, ví dụ 1,50,500")
+    parser.add_argument("--vms", type=_int_list, help="Danh sách số VM mỗi host, ví dụ 10,400,2000")
+    parser.add_argument("--rtt-ms", type=_int_list, help="Danh sách RTT (ms), ví dụ 0,20,100")
+    parser.add_argument("--workers", type=int, default=50, help="Số host xử lý song song (mặc định 50)")
+    parser.add_argument("--failure-rate", type=float, default=0.3, help="Tỉ lệ setting KHÔNG ĐẠT của simulator")
+    parser.add_argument("--no-fix", action="store_true", help="Chỉ đo bước kiểm tra")
+    parser.add_argument("--delta", action="store_true",
+                        help="Đo thêm lần quét lại với --delta (pha checks_delta) trước khi sửa lỗi")
+    parser.add_argument("--base-port", type=int, default=22201, help="Port đầu tiên của simulator")
+    parser.add_argument("--output", metavar="FILE", help="File JSON kết quả")
+    parser.add_argument("--compare", metavar="FILE", help="So với kết quả benchmark trước đó")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Mức chậm hơn tối đa cho phép khi --compare (mặc định 0.2 = 20%%)")
+    parser.add_argument("--worker", metavar="INVENTORY", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+# ==================== process con: chạy một kịch bản ====================
+
+def run_worker(inventory_path, workers, fix, cache_dir, delta=False):
+    """Chạy kiểm tra (và sửa lỗi) trên inventory, in kết quả đo dạng JSON ra stdout."""
+    sys.path.insert(0, REPO_ROOT)
+    import main
+    from fingerprint import open_delta_store
+    from utils import ssh_stats, fact_cache_stats, close_ssh_connections
+    from vmx_cache import set_vmx_cache
+
+    set_vmx_cache(cache_dir=cache_dir)
+    hosts = main.load_inventory(inventory_path, main.AVAILABLE_SECTIONS)
+    sections = main.AVAILABLE_SECTIONS
+    store = open_delta_store() if delta else None
+    phases = {}
+    log = io.StringIO()
+
+    with contextlib.redirect_stdout(log):
+        before = ssh_stats()
+        started = time.perf_counter()
+        all_results = main.run_checks(hosts, sections, max_workers=workers, delta=store)
+        phases["checks"] = _phase(started, before, ssh_stats())
+        counts = all_results.counts()
+
+        if store is not None:
+            before = ssh_stats()
+            started = time.perf_counter()
+            rescan = main.run_checks(hosts, sections, max_workers=workers, delta=store)
+            phases["checks_delta"] = _phase(started, before, ssh_stats())
+            phases["checks_delta"]["identical"] = rescan.counts() == counts
+            store.close()
+
+        if fix:
+            failed_checks = all_results.failed_checks()
+            before = ssh_stats()
+            started = time.perf_counter()
+            main.run_fixes(hosts, all_results, failed_checks, {sec_id for _, sec_id in failed_checks},
+                           answers=BENCH_ANSWERS, max_workers=workers)
+            phases["fix"] = _phase(started, before, ssh_stats())
+            phases["fix"]["failed_checks"] = len(failed_checks)
+        close_ssh_connections()
+
+    result = {
+        "phases": phases,
+        "counts": counts,
+        "fact_cache": fact_cache_stats(),
+        # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+    }
+    print(json.dumps(result))
+
+
+def _phase(started, before, after):
+    phase = {"wall_s": round(time.perf_counter() - started, 3)}
+    phase.update({name: after[name] - before[name] for name in after})
+    return phase
+
+
+# ==================== process cha: điều phối kịch bản ====================
+
+def _start_simulator(state_dir, inventory_path, hosts, vms, rtt_ms, base_port, failure_rate):
+    cmd = [
+        sys.executable, "-m", "simulator",
+        "--hosts", str(hosts), "--vms", str(vms), "--latency-ms", str(rtt_ms),
+        "--failure-rate", str(failure_rate), "--base-port", str(base_port),
+        "--state-dir", state_dir, "--inventory", inventory_path, "--reset",
+    ]
+    proc = subprocess.Popen(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.time() + SIMULATOR_START_TIMEOUT
+    while not os.path.exists(inventory_path):
+        if proc.poll() is not None:
+            raise RuntimeError(f"simulator dừng với mã {proc.returncode}: {proc.stderr.read().decode()[-2000:]}")
+        if time.time() > deadline:
+            proc.kill()
+            raise RuntimeError("simulator khởi động quá lâu")
+        time.sleep(0.2)
+    return proc
+
+
+def _stop_simulator(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def run_scenario(hosts, vms, rtt_ms, args):
+    """Chạy một kịch bản trong thư mục tạm, trả về dict kết quả."""
+    work_dir = tempfile.mkdtemp(prefix="cis-bench-")
+    inventory_path = os.path.join(work_dir, "inventory.json")
+    scenario = {"hosts": hosts, "vms_per_host": vms, "rtt_ms": rtt_ms}
+    try:
+        sim = _start_simulator(os.path.join(work_dir, "state"), inventory_path, hosts, vms, rtt_ms,
+                               args.base_port, args.failure_rate)
+        try:
+            cmd = [sys.executable, os.path.abspath(__file__), "--worker", inventory_path,
+                   "--workers", str(args.workers)] + (["--no-fix"] if args.no_fix else []) \
+                + (["--delta"] if args.delta else [])
+            env = {**os.environ, "CIS_CACHE_DIR": os.path.join(work_dir, "cache")}
+            proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+        finally:
+            _stop_simulator(sim)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip()[-2000:])
+        scenario.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    except (RuntimeError, OSError, ValueError) as e:
+        scenario["error"] = str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return scenario
+
+
+def scenario_key(s):
+    return (s["hosts"], s["vms_per_host"], s["rtt_ms"])
+
+
+def compare(results, baseline, max_regression):
+    """So kết quả với baseline; trả về danh sách mô tả các regression."""
+    old = {scenario_key(s): s for s in baseline.get("results", []) if "phases" in s}
+    regressions = []
+    for s in results:
+        prev = old.get(scenario_key(s))
+        if prev is None or "phases" not in s:
+            continue
+        for phase, now in s["phases"].items():
+            before = prev["phases"].get(phase)
+            if not before:
+                continue
+            label = f"{scenario_key(s)} {phase}"
+            if before["wall_s"] > 0 and now["wall_s"] > before["wall_s"] * (1 + max_regression):
+                regressions.append(f"{label}: {before['wall_s']}s -> {now['wall_s']}s")
+            if now["channels"] > before["channels"]:
+                regressions.append(f"{label}: {before['channels']} -> {now['channels']} exec channel")
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_scenario(s):
+    label = f"{s['hosts']:>4} host x {s['vms_per_host']:>5} VM, RTT {s['rtt_ms']:>3} ms"
+    if "error" in s:
+        print(f"{label}: LỖI {s['error']}")
+        return
+    parts = []
+    for phase, p in s["phases"].items():
+        parts.append(f"{phase} {p['wall_s']:.2f}s ({p['sessions']} session, {p['channels']} exec, "
+                     f"{(p['bytes_sent'] + p['bytes_received']) / 1024:.0f} KiB)")
+    print(f"{label}: {'; '.join(parts)}; peak RSS {s['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args.worker, args.workers, not args.no_fix, os.environ.get("CIS_CACHE_DIR"), delta=args.delta)
+        return 0
+
+    preset = PRESETS[args.preset]
+    grid = itertools.product(args.hosts or preset["hosts"], args.vms or preset["vms"],
+                             args.rtt_ms or preset["rtt_ms"])
+    results = []
+    for hosts, vms, rtt_ms in grid:
+        scenario = run_scenario(hosts, vms, rtt_ms, args)
+        print_scenario(scenario)
+        results.append(scenario)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workers": args.workers,
+            "fix": not args.no_fix,
+            "delta": args.delta,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"scan-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nĐã ghi kết quả: {output}")
+
+    exit_code = 1 if any("error" in s for s in results) else 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nREGRESSION so với", args.compare)
+            for line in regressions:
+                print(f"  - {line}")
+            exit_code = 1
+        else:
+            print(f"\nKhông có regression so với {args.compare}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,51 @@
 """
 CIS VMware ESXi 8 Benchmark Checks Modules
+
+Danh mục mục CIS (catalog.py) được import ngay và không kéo theo paramiko. Các tên
+còn lại (RULES, evaluate_rules, check_x_for_host...) được nạp lười (PEP 562): module
+chứa tên đó chỉ được import ở lần truy cập đầu tiên. Import một module checks sẽ đăng
+ký nguồn dữ liệu và rule của Section đó vào registry trong rules.py (SOURCES, RULES);
+dùng catalog.load_rules để nạp đúng các module cần cho những mục được chọn.
 """
 
-from .base import (
-    check_2_4_for_host, fix_2_4_for_host,
-    check_2_10_for_host, fix_2_10_for_host
-)
+import importlib
 
-from .management import (
-    check_3_3_for_host, fix_3_3_for_host,
-    check_3_7_for_host, fix_3_7_for_host,
-    check_3_8_for_host, fix_3_8_for_host,
-    check_3_9_for_host, fix_3_9_for_host,
-    check_3_12_for_host, fix_3_12_for_host,
-    check_3_13_for_host, fix_3_13_for_host
+from .catalog import (
+    CATALOG, CATALOG_GROUPS, SectionInfo,
+    section_sort_key, result_keys, modules_for_sections, load_rules, format_section_menu
 )
 
-from .logging import (
-    check_4_2_for_host, fix_4_2_for_host
-)
+# Tên được nạp lười -> module trong checks/
+_LAZY_NAMES = {
+    "Rule": "rules", "SOURCES": "rules",
+    "evaluate_rules": "rules", "evaluate_rule": "rules", "run_rule": "rules",
+    "error_result": "rules", "rules_by_source": "rules", "verify_rules": "rules",
+    "fix_vm_sections_for_host": "virtual_machine", "undo_vm_sections": "virtual_machine",
+}
+for _module, _sections in (
+    ("base", ("2_4", "2_10")),
+    ("management", ("3_3", "3_7", "3_8", "3_9", "3_12", "3_13")),
+    ("logging", ("4_2",)),
+    ("network", ("5_6", "5_7", "5_8", "5_9", "5_10", "5_9_and_5_10")),
+    ("virtual_machine", ("7_6", "7_21", "7_22", "7_24", "7_26", "7_27")),
+):
+    for _sec in _sections:
+        _LAZY_NAMES[f"check_{_sec}_for_host"] = _module
+        _LAZY_NAMES[f"fix_{_sec}_for_host"] = _module
+del _module, _sections, _sec
 
-from .network import (
-    check_5_6_for_host, fix_5_6_for_host,
-    check_5_7_for_host, fix_5_7_for_host,
-    check_5_8_for_host, fix_5_8_for_host,
-    check_5_9_and_5_10_for_host, fix_5_9_and_5_10_for_host
-)
 
-from .virtual_machine import (
-    check_7_6_for_host, fix_7_6_for_host,
-    check_7_21_for_host, fix_7_21_for_host,
-    check_7_22_for_host, fix_7_22_for_host,
-    check_7_24_for_host, fix_7_24_for_host,
-    check_7_26_for_host, fix_7_26_for_host,
-    check_7_27_for_host, fix_7_27_for_host
-)
+def __getattr__(name):
+    if name == "RULES":
+        # Registry đầy đủ: nạp mọi module rule
+        return load_rules()
+    module = _LAZY_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
 
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES) | {"RULES"})
@@ -4,69 +4,83 @@ CIS VMware ESXi 8 - Section 2: Base Checks
 - 2.10: Mem.ShareForceSalting must be set to 2
 """
 
-from utils import run_ssh_command
+import string
+
+from utils import run_ssh_command, run_ssh_reads, iter_lines, shell_quote
+from .rules import Rule, register_rules, register_source, run_rule
+from .settings import undo_advanced_setting
 
 ALLOWED_LEVELS = {"VMwareCertified", "VMwareAccepted", "PartnerSupported"}
 
-def parse_host_acceptance_level(output: str) -> str | None:
+MEM_SHARE_FORCE_SALTING = 2
+
+ACCEPTANCE_GET_CMD = "esxcli software acceptance get"
+VIB_LIST_CMD = "esxcli software vib list"
+
+# Dòng phân cách dưới header chỉ gồm dấu '-' và khoảng trắng
+_SEPARATOR_CHARS = string.whitespace + "-"
+
+
+def parse_host_acceptance_level(output) -> str | None:
     """Parse acceptance level từ output của esxcli software acceptance get."""
-    for line in output.splitlines():
+    for line in iter_lines(output):
         line = line.strip()
         if line:
             return line
     return None
 
 
-def parse_bad_vibs(output: str):
-    """Parse danh sách VIB không đạt yêu cầu."""
-    bad_vibs = []
-    started_data = False
-
-    for line in output.splitlines():
-        if not started_data:
-            if "Acceptance Level" in line:
-                started_data = True
-            continue
-
-        if not line.strip():
-            continue
+def parse_bad_vibs(output):
+    """
+    Parse danh sách VIB không đạt yêu cầu.
 
-        if line.replace("-", "").strip() == "":
-            continue
+    Một lượt qua các dòng (str hoặc iterable các dòng): bỏ qua tới dòng header, sau đó
+    mỗi dòng chỉ tách tới cột Acceptance Level. Dòng phân cách chỉ bị loại khi cột đó
+    không thuộc ALLOWED_LEVELS (trường hợp hiếm), nên VIB đạt không tốn thêm phép kiểm tra.
+    """
+    bad_vibs = []
+    lines = iter(iter_lines(output))
+    for line in lines:
+        if "Acceptance Level" in line:
+            break
 
-        parts = line.split()
-        if len(parts) < 4:
+    for line in lines:
+        parts = line.split(None, 4)
+        if len(parts) < 4 or parts[3] in ALLOWED_LEVELS or not line.strip(_SEPARATOR_CHARS):
             continue
+        bad_vibs.append({"name": parts[0], "acceptance": parts[3]})
 
-        vib_name = parts[0]
-        vib_accept = parts[3]
+    return bad_vibs
 
-        if vib_accept not in ALLOWED_LEVELS:
-            bad_vibs.append({"name": vib_name, "acceptance": vib_accept})
 
-    return bad_vibs
+def get_software_inventory(host, username, password, port=22, key_path=None) -> dict:
+    """Acceptance level của host và danh sách VIB không đạt (hai lệnh đọc song song trên cùng kết nối)."""
+    out_accept, out_vibs = run_ssh_reads(
+        host, username, password,
+        [ACCEPTANCE_GET_CMD, VIB_LIST_CMD],
+        port=port, key_path=key_path,
+    )
+    return {
+        "acceptance_level": parse_host_acceptance_level(out_accept),
+        "acceptance_output": out_accept,
+        "bad_vibs": parse_bad_vibs(out_vibs),
+    }
 
 
-def check_2_4_for_host(host, username, password, port=22, key_path=None):
-    """
-    CIS 2.4: Kiểm tra Host image profile acceptance level
-    Phải là VMwareCertified, VMwareAccepted, hoặc PartnerSupported
-    """
-    print(f"\n=== Kiểm tra 2.4 trên host {host} ===")
-    out_accept = run_ssh_command(host, username, password, "esxcli software acceptance get", port=port, key_path=key_path)
-    host_level = parse_host_acceptance_level(out_accept)
+def _evaluate_2_4(rule, host, software):
+    """Đánh giá 2.4: acceptance level của host và của từng VIB."""
+    host_level = software["acceptance_level"]
 
     if host_level is None:
         print(f"[{host}] KHÔNG đọc được acceptance level từ output:")
-        print(out_accept)
+        print(software["acceptance_output"])
         host_level_ok = False
     else:
-        host_level_ok = host_level in ALLOWED_LEVELS
+        host_level_ok = rule.matches(host_level)
         status = "ĐẠT" if host_level_ok else "KHÔNG ĐẠT"
         print(f"[{host}] Host acceptance level: {host_level} -> {status}")
 
-    out_vibs = run_ssh_command(host, username, password, "esxcli software vib list", port=port, key_path=key_path)
-    bad_vibs = parse_bad_vibs(out_vibs)
+    bad_vibs = software["bad_vibs"]
 
     if not bad_vibs:
         print(f"[{host}] Tất cả VIB đều có Acceptance Level hợp lệ.")
@@ -77,14 +91,15 @@ def check_2_4_for_host(host, username, password, port=22, key_path=None):
             print(f"   - {vib['name']} : {vib['acceptance']}")
         vibs_ok = False
 
-    overall_ok = host_level_ok and vibs_ok
-    print(f"[{host}] KẾT LUẬN CIS 2.4: {'ĐẠT' if overall_ok else 'KHÔNG ĐẠT'}")
+    return host_level_ok and vibs_ok, {"acceptance_level": host_level, "bad_vibs": bad_vibs}
 
-    return {
-        "host": host,
-        "cis_2_4_ok": overall_ok,
-        "detail": {"bad_vibs": bad_vibs}
-    }
+
+def check_2_4_for_host(host, username, password, port=22, key_path=None):
+    """
+    CIS 2.4: Kiểm tra Host image profile acceptance level
+    Phải là VMwareCertified, VMwareAccepted, hoặc PartnerSupported
+    """
+    return run_rule("2.4", host, username, password, port=port, key_path=key_path)
 
 
 def fix_2_4_for_host(host, username, password, port=22, key_path=None):
@@ -95,51 +110,37 @@ def fix_2_4_for_host(host, username, password, port=22, key_path=None):
     return True
 
 
-def parse_mem_share_force_salting(output: str) -> tuple[int | None, str]:
-    """Parse giá trị Mem.ShareForceSalting."""
-    value = None
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith("Int Value"):
-            parts = line.split(":", 1)
-            if len(parts) == 2:
-                try:
-                    value = int(parts[1].strip())
-                except ValueError:
-                    value = None
-            break
-    return value, output
-
-
 def check_2_10_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 2.10: Kiểm tra Mem.ShareForceSalting
     Yêu cầu: giá trị phải bằng 2
     """
-    print(f"\n=== Kiểm tra CIS 2.10 trên host {host} ===")
-    cmd = "esxcli system settings advanced list -o /Mem/ShareForceSalting"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    value, raw = parse_mem_share_force_salting(out)
-
-    if value is None:
-        print(f"[{host}] KHÔNG đọc được giá trị Mem.ShareForceSalting.")
-        ok = False
-    else:
-        print(f"[{host}] Mem.ShareForceSalting (Int Value): {value}")
-        ok = (value == 2)
-        print(f"[{host}] KẾT LUẬN CIS 2.10: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-
-    return {
-        "host": host,
-        "cis_2_10_ok": ok,
-        "detail": {"current_value": value}
-    }
+    return run_rule("2.10", host, username, password, port=port, key_path=key_path)
 
 
 def fix_2_10_for_host(host, username, password, port=22, key_path=None):
     """Sửa lỗi CIS 2.10: Set Mem.ShareForceSalting = 2."""
-    print(f"[{host}] Đang sửa lỗi CIS 2.10 (Set Mem.ShareForceSalting = 2)...")
-    cmd = "esxcli system settings advanced set -o /Mem/ShareForceSalting -i 2"
+    print(f"[{host}] Đang sửa lỗi CIS 2.10 (Set Mem.ShareForceSalting = {MEM_SHARE_FORCE_SALTING})...")
+    cmd = f"esxcli system settings advanced set -o /Mem/ShareForceSalting -i {MEM_SHARE_FORCE_SALTING}"
     run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
     return True
 
+
+def _undo_2_4(rule, detail):
+    """Hoàn tác 2.4: trả acceptance level về mức đọc được lúc kiểm tra (VIB không bị gỡ nên không cần hoàn tác)."""
+    prior = detail.get("acceptance_level")
+    if prior is None:
+        return []
+    return [("acceptance_level", prior, f"esxcli software acceptance set --level={shell_quote(prior)}")]
+
+
+register_source("software", get_software_inventory, reads=[ACCEPTANCE_GET_CMD, VIB_LIST_CMD])
+
+register_rules(
+    Rule("2.4", "software",
+         key="acceptance_level", comparator="in", expected=ALLOWED_LEVELS, evaluate=_evaluate_2_4,
+         fix=fix_2_4_for_host, fix_value="PartnerSupported", undo=_undo_2_4),
+    Rule("2.10", "advanced",
+         key="/Mem/ShareForceSalting", expected=MEM_SHARE_FORCE_SALTING,
+         fix=fix_2_10_for_host, fix_value=MEM_SHARE_FORCE_SALTING, undo=undo_advanced_setting),
+)
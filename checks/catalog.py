@@ -0,0 +1,144 @@
+"""
+Danh mục các mục CIS (chỉ metadata)
+
+Module này không import paramiko hay code kiểm tra: số mục, tiêu đề, nhóm, module
+khai báo rule và nguồn dữ liệu của mỗi mục có sẵn ngay, nên `--list`, `--help` và menu
+chọn mục không phải nạp các module checks. Module của rule (và module đăng ký nguồn dữ
+liệu của nó) chỉ được import khi mục đó thật sự được chạy, qua load_rules.
+
+Khi thêm một Rule mới ở checks/*.py, thêm mục tương ứng vào CATALOG_GROUPS;
+load_rules báo lỗi nếu danh mục và registry không khớp. Tiêu đề của mục chỉ khai báo ở
+đây (Rule.title đọc từ CATALOG), để --list và báo cáo luôn giống nhau.
+"""
+
+import importlib
+
+# Module đăng ký từng nguồn dữ liệu (register_source)
+SOURCE_MODULES = {
+    "software": "base",
+    "advanced": "settings",
+    "advopt": "settings",
+    "syslog": "logging",
+    "network": "network",
+    "vmx": "virtual_machine",
+}
+
+# (nhóm, module khai báo rule, [(mục, tiêu đề, nguồn dữ liệu)]) theo thứ tự hiển thị
+CATALOG_GROUPS = [
+    ("BASE - Phần 2", "base", [
+        ("2.4", "Host image profile acceptance level", "software"),
+        ("2.10", "Mem.ShareForceSalting", "advanced"),
+    ]),
+    ("MANAGEMENT - Phần 3", "management", [
+        ("3.3", "Disable Managed Object Browser (MOB)", "advopt"),
+        ("3.7", "DCUI timeout", "advanced"),
+        ("3.8", "ESXi Shell Interactive Timeout", "advanced"),
+        ("3.9", "ESXi Shell Timeout", "advanced"),
+        ("3.12", "Account Lock Failures", "advopt"),
+        ("3.13", "Account Unlock Time", "advopt"),
+    ]),
+    ("LOGGING - Phần 4", "logging", [
+        ("4.2", "Remote Syslog", "syslog"),
+    ]),
+    ("NETWORK - Phần 5", "network", [
+        ("5.6", "Reject Forged Transmits", "network"),
+        ("5.7", "Reject MAC Address Changes", "network"),
+        ("5.8", "Reject Promiscuous Mode", "network"),
+        ("5.9", "VLAN Configuration (không dùng VLAN 1)", "network"),
+        ("5.10", "VLAN Configuration (không dùng VLAN 4095 / 0)", "network"),
+    ]),
+    ("VIRTUAL MACHINE - Phần 7", "virtual_machine", [
+        ("7.6", "RemoteDisplay.maxConnections", "vmx"),
+        ("7.21", "Disable disk shrinking", "vmx"),
+        ("7.22", "Disable disk wiping", "vmx"),
+        ("7.24", "Disable host info to guest", "vmx"),
+        ("7.26", "Log keepOld", "vmx"),
+        ("7.27", "Log rotateSize", "vmx"),
+    ]),
+]
+
+
+def section_sort_key(rule_id):
+    return [int(n) for n in rule_id.split(".")]
+
+
+def default_result_key(rule_id):
+    """Khóa kết quả mặc định của một mục, ví dụ "3.7" -> "cis_3_7_ok"."""
+    return f"cis_{rule_id.replace('.', '_')}_ok"
+
+
+class SectionInfo:
+    """Metadata của một mục CIS: id, title, group, module (trong checks/), source, result_key."""
+
+    __slots__ = ("id", "title", "group", "module", "source", "result_key")
+
+    def __init__(self, id, title, group, module, source, result_key=None):
+        self.id = id
+        self.title = title
+        self.group = group
+        self.module = module
+        self.source = source
+        self.result_key = result_key or default_result_key(id)
+
+    @property
+    def per_vm(self):
+        return self.source == "vmx"
+
+    def __repr__(self):
+        return f"SectionInfo({self.id!r}, module={self.module!r}, source={self.source!r})"
+
+
+CATALOG = {
+    sec_id: SectionInfo(sec_id, title, group, module, source)
+    for group, module, sections in CATALOG_GROUPS
+    for sec_id, title, source in sections
+}
+
+
+def result_keys(sec_ids=None):
+    """{mục: khóa kết quả} của các mục sec_ids (mặc định mọi mục trong danh mục)."""
+    return {sec_id: CATALOG[sec_id].result_key for sec_id in (CATALOG if sec_ids is None else sec_ids)}
+
+
+def modules_for_sections(sec_ids):
+    """Các module checks cần import để chạy sec_ids: module khai báo rule và module của nguồn dữ liệu."""
+    modules = []
+    for sec_id in sorted(sec_ids, key=section_sort_key):
+        info = CATALOG[sec_id]
+        for module in (SOURCE_MODULES[info.source], info.module):
+            if module not in modules:
+                modules.append(module)
+    return modules
+
+
+def load_rules(sec_ids=None):
+    """
+    Import các module cần cho sec_ids (mặc định mọi mục) và trả về registry RULES.
+
+    Module đã import không bị nạp lại, nên gọi lặp lại (mỗi host, mỗi lần sửa) chỉ tốn
+    một lần tra sys.modules cho mỗi module.
+    """
+    sec_ids = list(CATALOG) if sec_ids is None else [s for s in sec_ids if s in CATALOG]
+    for module in modules_for_sections(sec_ids):
+        importlib.import_module(f"{__package__}.{module}")
+
+    from .rules import RULES
+    missing = [sec_id for sec_id in sec_ids if sec_id not in RULES]
+    if missing:
+        raise ImportError(f"Danh mục và registry rule không khớp, thiếu rule: {', '.join(missing)}")
+    return RULES
+
+
+def format_section_menu(sec_ids=None):
+    """Các dòng menu liệt kê mục CIS theo nhóm (mặc định mọi mục)."""
+    wanted = set(CATALOG if sec_ids is None else sec_ids)
+    lines = []
+    for group, _, sections in CATALOG_GROUPS:
+        rows = [(sec_id, title) for sec_id, title, _ in sections if sec_id in wanted]
+        if not rows:
+            continue
+        if lines:
+            lines.append("")
+        lines.append(f"[{group}]")
+        lines.extend(f"  {sec_id:<4} - {title}" for sec_id, title in rows)
+    return lines
@@ -3,48 +3,50 @@ CIS VMware ESXi 8 - Section 4: Logging Checks
 - 4.2: Configure remote syslog
 """
 
-from utils import run_ssh_command
+from utils import run_ssh_command, run_ssh_read, iter_lines, shell_quote
+from .rules import Rule, register_rules, register_source, run_rule
 
 
-def parse_syslog_config(output: str):
+def parse_syslog_config(output):
     """Parse 'esxcli system syslog config get' output."""
     config = {}
-    for line in output.splitlines():
-        line = line.strip()
-        if ":" in line:
-            key, val = line.split(":", 1)
+    for line in iter_lines(output):
+        key, sep, val = line.partition(":")
+        if sep:
             config[key.strip()] = val.strip()
     return config
 
 
+SYSLOG_CONFIG_CMD = "esxcli system syslog config get"
+
+
+def get_syslog_config(host, username, password, port=22, key_path=None) -> dict:
+    """Đọc cấu hình syslog của host (một lần cho cả lần chạy)."""
+    out = run_ssh_read(host, username, password, SYSLOG_CONFIG_CMD, port=port, key_path=key_path)
+    return parse_syslog_config(out)
+
+
 def check_4_2_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 4.2: Kiểm tra Remote Syslog Host
     Yêu cầu: Remote Host phải được cấu hình (không phải <none>)
     """
-    print(f"\n=== Kiểm tra CIS 4.2 trên host {host} ===")
-    cmd = "esxcli system syslog config get"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    config = parse_syslog_config(out)
-    
-    remote_host = config.get("Remote Host", "<none>")
-    print(f"[{host}] Remote Host: {remote_host}")
-    
-    if remote_host and remote_host != "<none>":
-        ok = True
-    else:
-        ok = False
-        
-    print(f"[{host}] KẾT LUẬN CIS 4.2: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_4_2_ok": ok, "detail": {"remote_host": remote_host}}
+    return run_rule("4.2", host, username, password, port=port, key_path=key_path)
+
 
+def fix_4_2_for_host(host, username, password, port=22, key_path=None, loghost=None):
+    """
+    Sửa lỗi CIS 4.2: Cấu hình Remote Syslog Host.
 
-def fix_4_2_for_host(host, username, password, port=22, key_path=None):
-    """Sửa lỗi CIS 4.2: Cấu hình Remote Syslog Host."""
+    Truyền loghost để chạy không tương tác; nếu không sẽ hỏi người dùng.
+    """
     print(f"[{host}] Đang sửa lỗi CIS 4.2 (Set Remote Host)...")
     
     example = "tcp://192.168.1.10:514"
-    user_val = input(f"    >> Nhập địa chỉ Remote Syslog (ví dụ {example}): ").strip()
+    if loghost:
+        user_val = loghost
+    else:
+        user_val = input(f"    >> Nhập địa chỉ Remote Syslog (ví dụ {example}): ").strip()
     
     if not user_val:
         print(f"    -> Sử dụng mặc định: {example}")
@@ -52,9 +54,28 @@ def fix_4_2_for_host(host, username, password, port=22, key_path=None):
     else:
         loghost = user_val
 
-    cmd = f"esxcli system syslog config set --loghost='{loghost}'"
+    cmd = f"esxcli system syslog config set --loghost={shell_quote(loghost)}"
     run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
     
     # Reload syslog to apply changes
     run_ssh_command(host, username, password, "esxcli system syslog reload", port=port, key_path=key_path)
     return True
+
+
+def _undo_4_2(rule, detail):
+    """Hoàn tác 4.2: trả Remote Host về giá trị lúc kiểm tra ('<none>' = bỏ cấu hình)."""
+    prior = detail.get("current_value")
+    if prior is None:
+        return []
+    loghost = "" if prior in rule.expected else prior
+    return [(rule.key, prior,
+             f"esxcli system syslog config set --loghost={shell_quote(loghost)} && esxcli system syslog reload")]
+
+
+register_source("syslog", get_syslog_config, reads=[SYSLOG_CONFIG_CMD])
+
+register_rules(
+    Rule("4.2", "syslog",
+         key="Remote Host", comparator="configured", expected=("<none>",), fix=fix_4_2_for_host,
+         undo=_undo_4_2),
+)
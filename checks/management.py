@@ -9,50 +9,18 @@ CIS VMware ESXi 8 - Section 3: Management Checks
 """
 
 from utils import run_ssh_command
+from .rules import Rule, register_rules, run_rule
+from .settings import undo_advanced_setting, undo_host_advopt
 
 
 # ==================== CIS 3.3 ====================
 
-def parse_vim_cmd_bool(output: str):
-    """Parse boolean value from vim-cmd output."""
-    enabled = None
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith("value"):
-            parts = line.split("=", 1)
-            if len(parts) == 2:
-                raw_val = parts[1].strip().strip(",")
-                low = raw_val.lower()
-                if low.startswith("true"):
-                    enabled = True
-                elif low.startswith("false"):
-                    enabled = False
-            break
-    return enabled, output
-
 def check_3_3_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 3.3: Kiểm tra Managed Object Browser (MOB)
     Yêu cầu: MOB phải bị disable (false)
     """
-    print(f"\n=== Kiểm tra CIS 3.3 trên host {host} ===")
-    cmd = "vim-cmd hostsvc/advopt/view Config.HostAgent.plugins.solo.enableMob"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    mob_enabled, raw = parse_vim_cmd_bool(out)
-
-    if mob_enabled is None:
-        print(f"[{host}] KHÔNG đọc được giá trị MOB.")
-        ok = False
-    else:
-        print(f"[{host}] Config.HostAgent.plugins.solo.enableMob = {mob_enabled}")
-        ok = not mob_enabled
-        print(f"[{host}] KẾT LUẬN CIS 3.3: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-
-    return {
-        "host": host,
-        "cis_3_3_ok": ok,
-        "detail": {"mob_enabled": mob_enabled}
-    }
+    return run_rule("3.3", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_3_for_host(host, username, password, port=22, key_path=None):
@@ -65,21 +33,6 @@ def fix_3_3_for_host(host, username, password, port=22, key_path=None):
 
 # ==================== CIS 3.7 ====================
 
-def parse_int_value(output: str):
-    """Parse Int Value từ output của esxcli system settings advanced list."""
-    value = None
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith("Int Value"):
-            parts = line.split(":", 1)
-            if len(parts) == 2:
-                try:
-                    value = int(parts[1].strip())
-                except ValueError:
-                    value = None
-            break
-    return value, output
-
 DCUI_TIMEOUT_MAX_SECONDS = 600
 
 def check_3_7_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
@@ -87,21 +40,7 @@ def check_3_7_for_host(host: str, username: str, password: str, port: int = 22,
     CIS 3.7: Kiểm tra DCUI timeout
     Yêu cầu: 0 < timeout <= 600 giây
     """
-    print(f"\n=== Kiểm tra CIS 3.7 trên host {host} ===")
-    cmd = "esxcli system settings advanced list -o /UserVars/DcuiTimeOut"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    val, raw = parse_int_value(out)
-
-    ok = False
-    if val is not None:
-        print(f"[{host}] UserVars.DcuiTimeOut: {val}")
-        if 0 < val <= DCUI_TIMEOUT_MAX_SECONDS:
-            ok = True
-    else:
-        print(f"[{host}] Không đọc được giá trị DCUI timeout.")
-    
-    print(f"[{host}] KẾT LUẬN CIS 3.7: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_3_7_ok": ok, "detail": {"dcui_timeout": val}}
+    return run_rule("3.7", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_7_for_host(host, username, password, port=22, key_path=None):
@@ -121,21 +60,7 @@ def check_3_8_for_host(host: str, username: str, password: str, port: int = 22,
     CIS 3.8: Kiểm tra ESXi Shell Interactive Timeout
     Yêu cầu: 0 < timeout <= 300 giây
     """
-    print(f"\n=== Kiểm tra CIS 3.8 trên host {host} ===")
-    cmd = "esxcli system settings advanced list -o /UserVars/ESXiShellInteractiveTimeOut"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    val, raw = parse_int_value(out)
-
-    ok = False
-    if val is not None:
-        print(f"[{host}] UserVars.ESXiShellInteractiveTimeOut: {val}")
-        if 0 < val <= SHELL_IDLE_TIMEOUT_MAX_SECONDS:
-            ok = True
-    else:
-        print(f"[{host}] Không đọc được giá trị Shell Interactive Timeout.")
-
-    print(f"[{host}] KẾT LUẬN CIS 3.8: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_3_8_ok": ok, "detail": {"shell_interactive_timeout": val}}
+    return run_rule("3.8", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_8_for_host(host, username, password, port=22, key_path=None):
@@ -155,21 +80,7 @@ def check_3_9_for_host(host: str, username: str, password: str, port: int = 22,
     CIS 3.9: Kiểm tra ESXi Shell Timeout
     Yêu cầu: 0 < timeout <= 3600 giây
     """
-    print(f"\n=== Kiểm tra CIS 3.9 trên host {host} ===")
-    cmd = "esxcli system settings advanced list -o /UserVars/ESXiShellTimeOut"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    val, raw = parse_int_value(out)
-
-    ok = False
-    if val is not None:
-        print(f"[{host}] UserVars.ESXiShellTimeOut: {val}")
-        if 0 < val <= SHELL_TIMEOUT_MAX_SECONDS:
-            ok = True
-    else:
-        print(f"[{host}] Không đọc được giá trị Shell Timeout.")
-    
-    print(f"[{host}] KẾT LUẬN CIS 3.9: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_3_9_ok": ok, "detail": {"shell_timeout": val}}
+    return run_rule("3.9", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_9_for_host(host, username, password, port=22, key_path=None):
@@ -182,20 +93,6 @@ def fix_3_9_for_host(host, username, password, port=22, key_path=None):
 
 # ==================== CIS 3.12 ====================
 
-def parse_vim_cmd_int(output: str):
-    """Parse integer value from vim-cmd output (value = <int>)."""
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith("value ="):
-            parts = line.split("=", 1)
-            if len(parts) == 2:
-                val_str = parts[1].strip().rstrip(",")
-                try:
-                    return int(val_str)
-                except ValueError:
-                    pass
-    return None
-
 ACCOUNT_LOCK_FAILURES = 5
 
 def check_3_12_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
@@ -203,21 +100,7 @@ def check_3_12_for_host(host: str, username: str, password: str, port: int = 22,
     CIS 3.12: Kiểm tra Security.AccountLockFailures
     Yêu cầu: giá trị phải bằng 5
     """
-    print(f"\n=== Kiểm tra CIS 3.12 trên host {host} ===")
-    cmd = "vim-cmd hostsvc/advopt/view Security.AccountLockFailures"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    val = parse_vim_cmd_int(out)
-
-    ok = False
-    if val is not None:
-        print(f"[{host}] Security.AccountLockFailures: {val}")
-        if val == ACCOUNT_LOCK_FAILURES:
-            ok = True
-    else:
-        print(f"[{host}] Không đọc được giá trị Security.AccountLockFailures.")
-    
-    print(f"[{host}] KẾT LUẬN CIS 3.12: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_3_12_ok": ok, "detail": {"account_lock_failures": val}}
+    return run_rule("3.12", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_12_for_host(host, username, password, port=22, key_path=None):
@@ -237,21 +120,7 @@ def check_3_13_for_host(host: str, username: str, password: str, port: int = 22,
     CIS 3.13: Kiểm tra Security.AccountUnlockTime
     Yêu cầu: giá trị phải bằng 900
     """
-    print(f"\n=== Kiểm tra CIS 3.13 trên host {host} ===")
-    cmd = "vim-cmd hostsvc/advopt/view Security.AccountUnlockTime"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    val = parse_vim_cmd_int(out)
-
-    ok = False
-    if val is not None:
-        print(f"[{host}] Security.AccountUnlockTime: {val}")
-        if val == ACCOUNT_UNLOCK_TIME:
-            ok = True
-    else:
-        print(f"[{host}] Không đọc được giá trị Security.AccountUnlockTime.")
-
-    print(f"[{host}] KẾT LUẬN CIS 3.13: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_3_13_ok": ok, "detail": {"account_unlock_time": val}}
+    return run_rule("3.13", host, username, password, port=port, key_path=key_path)
 
 
 def fix_3_13_for_host(host, username, password, port=22, key_path=None):
@@ -260,3 +129,25 @@ def fix_3_13_for_host(host, username, password, port=22, key_path=None):
     cmd = f"vim-cmd hostsvc/advopt/update Security.AccountUnlockTime int {ACCOUNT_UNLOCK_TIME}"
     run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
     return True
+
+
+register_rules(
+    Rule("3.3", "advopt",
+         key="Config.HostAgent.plugins.solo.enableMob", expected=False, fix=fix_3_3_for_host, fix_value=False,
+         undo=undo_host_advopt),
+    Rule("3.7", "advanced",
+         key="/UserVars/DcuiTimeOut", comparator="range", expected=(0, DCUI_TIMEOUT_MAX_SECONDS),
+         fix=fix_3_7_for_host, fix_value=DCUI_TIMEOUT_MAX_SECONDS, undo=undo_advanced_setting),
+    Rule("3.8", "advanced",
+         key="/UserVars/ESXiShellInteractiveTimeOut", comparator="range", expected=(0, SHELL_IDLE_TIMEOUT_MAX_SECONDS),
+         fix=fix_3_8_for_host, fix_value=SHELL_IDLE_TIMEOUT_MAX_SECONDS, undo=undo_advanced_setting),
+    Rule("3.9", "advanced",
+         key="/UserVars/ESXiShellTimeOut", comparator="range", expected=(0, SHELL_TIMEOUT_MAX_SECONDS),
+         fix=fix_3_9_for_host, fix_value=SHELL_TIMEOUT_MAX_SECONDS, undo=undo_advanced_setting),
+    Rule("3.12", "advopt",
+         key="Security.AccountLockFailures", expected=ACCOUNT_LOCK_FAILURES,
+         fix=fix_3_12_for_host, fix_value=ACCOUNT_LOCK_FAILURES, undo=undo_host_advopt),
+    Rule("3.13", "advopt",
+         key="Security.AccountUnlockTime", expected=ACCOUNT_UNLOCK_TIME,
+         fix=fix_3_13_for_host, fix_value=ACCOUNT_UNLOCK_TIME, undo=undo_host_advopt),
+)
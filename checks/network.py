@@ -3,191 +3,351 @@ CIS VMware ESXi 8 - Section 5: Network Checks
 - 5.6: Reject Forged Transmits on vSwitch
 - 5.7: Reject MAC Address Changes on vSwitch
 - 5.8: Reject Promiscuous Mode on vSwitch
-- 5.9 & 5.10: Port Group VLAN checks (không dùng VLAN 0, 1, 4095)
-"""
-
-from utils import run_ssh_command
+- 5.9: Port Group không dùng native VLAN (VLAN 1)
+- 5.10: Port Group không dùng VLAN 4095 và VLAN 0
 
+Tất cả các mục Section 5 được đánh giá từ một bản chụp mạng (network inventory)
+đọc trong MỘT lần exec: mọi standard vSwitch, mọi port group, VLAN và security
+policy hiệu lực (kể cả override ở port group).
+"""
 
-def parse_vswitch_policy(output: str, key="Allow Forged Transmits") -> bool | None:
-    """Parse output from esxcli network vswitch standard policy security get."""
-    for line in output.splitlines():
-        line = line.strip()
-        if line.startswith(key):
-            parts = line.split(":", 1)
-            if len(parts) == 2:
-                val_str = parts[1].strip().lower()
-                return val_str == "true"
-    return None
+from utils import run_ssh_command, run_ssh_read, split_batch_lines, iter_lines, collapse_spaces, shell_quote, BATCH_MARKER
+from .rules import Rule, RULES, register_rules, register_source, run_rule
 
 
-def get_standard_portgroups(host, username, password, port=22, key_path=None):
-    """Lấy danh sách standard port groups từ ESXi."""
-    cmd = "esxcli network vswitch standard portgroup list"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    
+def parse_standard_portgroups(output):
+    """Parse output của 'esxcli network vswitch standard portgroup list'."""
     pgs = []
-    lines = out.splitlines()
-    start_parsing = False
+    lines = iter(iter_lines(output))
     for line in lines:
-        if line.strip().startswith("----"):
-            start_parsing = True
-            continue
-        if not start_parsing:
+        if line.lstrip().startswith("----"):
+            break
+
+    # Tên port group có thể chứa khoảng trắng: tách 3 cột cuối từ bên phải
+    # (Virtual Switch, Active Clients, VLAN ID), phần còn lại là tên
+    for line in lines:
+        parts = line.rsplit(None, 3)
+        if len(parts) < 4:
             continue
-        if not line.strip():
+        try:
+            vlan = int(parts[3])
+        except ValueError:
             continue
-            
-        parts = line.split()
-        if len(parts) >= 4:
-            try:
-                vlan = int(parts[-1])
-                name = " ".join(parts[:-3])
-                pgs.append({"name": name, "vlan": vlan})
-            except ValueError:
-                pass
+        pgs.append({"name": collapse_spaces(parts[0].strip()), "vswitch": parts[1], "vlan": vlan})
     return pgs
 
 
+# ==================== Network inventory ====================
+
+# Các trường security policy: (khóa trong inventory, nhãn trong output esxcli, option của lệnh set)
+# Dùng option dạng dài vì với portgroup, '-p' là tên port group chứ không phải promiscuous.
+SECURITY_POLICY_FIELDS = [
+    ("allow_forged_transmits", "Allow Forged Transmits", "--allow-forged-transmits"),
+    ("allow_mac_change", "Allow MAC Address Change", "--allow-mac-change"),
+    ("allow_promiscuous", "Allow Promiscuous", "--allow-promiscuous"),
+]
+
+# Script đọc toàn bộ cấu hình standard vSwitch trong một lần exec.
+# Tên port group lấy từ dòng 'Portgroups:' của vswitch list (phân cách bởi dấu phẩy).
+NETWORK_INVENTORY_CMD = f"""VS_LIST=$(esxcli network vswitch standard list)
+echo '{BATCH_MARKER} vswitches'
+echo "$VS_LIST"
+echo '{BATCH_MARKER} portgroups'
+esxcli network vswitch standard portgroup list
+echo "$VS_LIST" | sed -n 's/^ *Name: //p' | while read -r vs; do
+  echo "{BATCH_MARKER} vswitch-policy $vs"
+  esxcli network vswitch standard policy security get -v "$vs"
+done
+echo "$VS_LIST" | sed -n 's/^ *Portgroups: //p' | tr ',' '\\n' | while read -r pg; do
+  [ -n "$pg" ] || continue
+  echo "{BATCH_MARKER} portgroup-policy $pg"
+  esxcli network vswitch standard portgroup policy security get -p "$pg"
+done"""
+
+
+def parse_vswitch_list(output) -> dict:
+    """Parse 'esxcli network vswitch standard list' thành dict {tên vSwitch: {...}}."""
+    vswitches = {}
+    current = None
+    for line in iter_lines(output):
+        key, sep, val = line.partition(":")
+        if not sep:
+            continue
+        key = key.strip()
+        if key == "Name":
+            val = val.strip()
+            current = vswitches.setdefault(val, {"name": val, "portgroups": [], "uplinks": []})
+        elif current is not None and key in ("Portgroups", "Uplinks"):
+            current[key.lower()] = [item.strip() for item in val.split(",") if item.strip()]
+    return vswitches
+
+
+# Nhãn trong output esxcli -> (dict đích, khóa trong inventory)
+_POLICY_LABELS = {label: ("policy", field) for field, label, _ in SECURITY_POLICY_FIELDS}
+_POLICY_LABELS.update({f"Override Vswitch {label}": ("overrides", field) for field, label, _ in SECURITY_POLICY_FIELDS})
+
+
+def parse_security_policy(output) -> dict:
+    """Parse security policy (của vSwitch hoặc port group) thành dict các giá trị bool, trong một lượt."""
+    policy = {field: None for field, _, _ in SECURITY_POLICY_FIELDS}
+    overrides = dict(policy)
+    targets = {"policy": policy, "overrides": overrides}
+    for line in iter_lines(output):
+        label, sep, val = line.partition(":")
+        if not sep:
+            continue
+        target = _POLICY_LABELS.get(label.strip())
+        if target is None:
+            continue
+        values = targets[target[0]]
+        if values[target[1]] is None:
+            values[target[1]] = val.strip().lower() == "true"
+    policy["overrides"] = overrides
+    return policy
+
+
+def parse_network_inventory(output) -> dict:
+    """Tách output của NETWORK_INVENTORY_CMD thành inventory {'vswitches': ..., 'portgroups': ...}."""
+    sections = split_batch_lines(output)
+    vswitches = parse_vswitch_list(sections.get("vswitches", ()))
+    portgroups = parse_standard_portgroups(sections.get("portgroups", ()))
+
+    for name, vs in vswitches.items():
+        vs["policy"] = parse_security_policy(sections.get(f"vswitch-policy {name}", ()))
+    for pg in portgroups:
+        pg["policy"] = parse_security_policy(sections.get(f"portgroup-policy {pg['name']}", ()))
+
+    return {"vswitches": vswitches, "portgroups": portgroups}
+
+
+def get_network_inventory(host, username, password, port=22, key_path=None) -> dict:
+    """Lấy network inventory của host (một lần exec cho cả lần chạy)."""
+    out = run_ssh_read(host, username, password, NETWORK_INVENTORY_CMD, port=port, key_path=key_path)
+    return parse_network_inventory(out)
+
+
+def find_policy_violations(inventory: dict, field: str) -> list:
+    """
+    Liệt kê các vSwitch / port group có security policy `field` = true.
+
+    Với port group, giá trị là policy hiệu lực; 'override' cho biết port group tự
+    ghi đè (True) hay kế thừa từ vSwitch (False).
+    """
+    violations = []
+    for name, vs in inventory["vswitches"].items():
+        if vs["policy"][field]:
+            violations.append({"type": "vswitch", "name": name})
+    for pg in inventory["portgroups"]:
+        if pg["policy"][field]:
+            violations.append({
+                "type": "portgroup",
+                "name": pg["name"],
+                "vswitch": pg["vswitch"],
+                "override": pg["policy"]["overrides"][field],
+            })
+    return violations
+
+
+def _evaluate_security_policy(rule, host, inventory):
+    """Đánh giá security policy rule.key trên mọi vSwitch và port group của inventory."""
+    field = rule.key
+    label = next(label for f, label, _ in SECURITY_POLICY_FIELDS if f == field)
+
+    values = [vs["policy"][field] for vs in inventory["vswitches"].values()]
+    values += [pg["policy"][field] for pg in inventory["portgroups"]]
+    violations = find_policy_violations(inventory, field)
+
+    ok = False
+    if not values or any(v is None for v in values):
+        print(f"[{host}] KHÔNG đọc được giá trị {label}.")
+        current = None
+    else:
+        for name, vs in inventory["vswitches"].items():
+            print(f"[{host}] {name}: {label} = {vs['policy'][field]}")
+        for pg in inventory["portgroups"]:
+            print(f"[{host}]   - Port Group '{pg['name']}' ({pg['vswitch']}): {label} = {pg['policy'][field]}")
+        current = bool(violations)
+        ok = not violations
+
+    return ok, {field: current, "violations": violations}
+
+
+def _fix_security_policy(host, username, password, port, key_path, field):
+    """Tắt security policy `field` trên các vSwitch / port group vi phạm, gửi trong một lần exec."""
+    flag = next(option for f, _, option in SECURITY_POLICY_FIELDS if f == field)
+    inventory = get_network_inventory(host, username, password, port=port, key_path=key_path)
+    violations = find_policy_violations(inventory, field)
+
+    fixed_vswitches = {v["name"] for v in violations if v["type"] == "vswitch"}
+    cmds = []
+    for v in violations:
+        if v["type"] == "vswitch":
+            cmds.append(f"esxcli network vswitch standard policy security set -v {shell_quote(v['name'])} {flag}=false")
+        elif v["override"] is not False or v["vswitch"] not in fixed_vswitches:
+            # Port group kế thừa từ vSwitch sẽ tự đạt khi vSwitch được sửa
+            cmds.append(f"esxcli network vswitch standard portgroup policy security set -p {shell_quote(v['name'])} {flag}=false")
+
+    if not cmds:
+        print(f"[{host}] Không có vSwitch / Port Group nào cần sửa.")
+        return True
+
+    for v in violations:
+        print(f"    -> {v['type']} '{v['name']}'")
+    run_ssh_command(host, username, password, "\n".join(cmds), port=port, key_path=key_path)
+    return True
+
+
+def _undo_security_policy(rule, detail):
+    """
+    Hoàn tác 5.6-5.8: bật lại policy trên đúng các vSwitch / port group mà
+    _fix_security_policy đã tắt (port group kế thừa được trả lại qua vSwitch).
+    """
+    flag = next(option for f, _, option in SECURITY_POLICY_FIELDS if f == rule.key)
+    violations = detail.get("violations") or []
+    vswitches = {v["name"] for v in violations if v["type"] == "vswitch"}
+    undo = []
+    for v in violations:
+        if v["type"] == "vswitch":
+            undo.append((f"vswitch {v['name']}", True,
+                         f"esxcli network vswitch standard policy security set -v {shell_quote(v['name'])} {flag}=true"))
+        elif v["override"] is not False or v["vswitch"] not in vswitches:
+            undo.append((f"portgroup {v['name']}", True,
+                         f"esxcli network vswitch standard portgroup policy security set -p {shell_quote(v['name'])} {flag}=true"))
+    return undo
+
+
 # ==================== CIS 5.6 ====================
 
 def check_5_6_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
-    CIS 5.6: Kiểm tra Allow Forged Transmits trên vSwitch0
+    CIS 5.6: Kiểm tra Allow Forged Transmits trên mọi vSwitch và port group
     Yêu cầu: phải là false
     """
-    print(f"\n=== Kiểm tra CIS 5.6 trên host {host} ===")
-    cmd = "esxcli network vswitch standard policy security get -v vSwitch0"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    
-    allow_forged = parse_vswitch_policy(out, "Allow Forged Transmits")
-    
-    ok = False
-    if allow_forged is None:
-        print(f"[{host}] KHÔNG đọc được giá trị Allow Forged Transmits.")
-    else:
-        print(f"[{host}] Allow Forged Transmits: {allow_forged}")
-        if not allow_forged:
-            ok = True
-            
-    print(f"[{host}] KẾT LUẬN CIS 5.6: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_5_6_ok": ok, "detail": {"allow_forged_transmits": allow_forged}}
+    return run_rule("5.6", host, username, password, port=port, key_path=key_path)
 
 
 def fix_5_6_for_host(host, username, password, port=22, key_path=None):
-    """Sửa lỗi CIS 5.6: Disable Allow Forged Transmits trên vSwitch0."""
-    print(f"[{host}] Đang sửa lỗi CIS 5.6 (Disable Allow Forged Transmits on vSwitch0)...")
-    cmd = "esxcli network vswitch standard policy security set -v vSwitch0 -f false"
-    run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    return True
+    """Sửa lỗi CIS 5.6: Disable Allow Forged Transmits trên các vSwitch / port group vi phạm."""
+    print(f"[{host}] Đang sửa lỗi CIS 5.6 (Disable Allow Forged Transmits)...")
+    return _fix_security_policy(host, username, password, port, key_path, "allow_forged_transmits")
 
 
 # ==================== CIS 5.7 ====================
 
 def check_5_7_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
-    CIS 5.7: Kiểm tra Allow MAC Address Changes trên vSwitch0
+    CIS 5.7: Kiểm tra Allow MAC Address Changes trên mọi vSwitch và port group
     Yêu cầu: phải là false
     """
-    print(f"\n=== Kiểm tra CIS 5.7 trên host {host} ===")
-    cmd = "esxcli network vswitch standard policy security get -v vSwitch0"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    
-    allow_mac_change = parse_vswitch_policy(out, "Allow MAC Address Change")
-    
-    ok = False
-    if allow_mac_change is None:
-        print(f"[{host}] KHÔNG đọc được giá trị MAC Address Changes.")
-    else:
-        print(f"[{host}] Allow MAC Address Changes: {allow_mac_change}")
-        if not allow_mac_change:
-            ok = True
-            
-    print(f"[{host}] KẾT LUẬN CIS 5.7: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_5_7_ok": ok, "detail": {"allow_mac_change": allow_mac_change}}
+    return run_rule("5.7", host, username, password, port=port, key_path=key_path)
 
 
 def fix_5_7_for_host(host, username, password, port=22, key_path=None):
-    """Sửa lỗi CIS 5.7: Disable MAC Address Changes trên vSwitch0."""
-    print(f"[{host}] Đang sửa lỗi CIS 5.7 (Disable MAC Address Changes on vSwitch0)...")
-    cmd = "esxcli network vswitch standard policy security set -v vSwitch0 -m false"
-    run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    return True
+    """Sửa lỗi CIS 5.7: Disable MAC Address Changes trên các vSwitch / port group vi phạm."""
+    print(f"[{host}] Đang sửa lỗi CIS 5.7 (Disable MAC Address Changes)...")
+    return _fix_security_policy(host, username, password, port, key_path, "allow_mac_change")
 
 
 # ==================== CIS 5.8 ====================
 
 def check_5_8_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
-    CIS 5.8: Kiểm tra Allow Promiscuous Mode trên vSwitch0
+    CIS 5.8: Kiểm tra Allow Promiscuous Mode trên mọi vSwitch và port group
     Yêu cầu: phải là false
     """
-    print(f"\n=== Kiểm tra CIS 5.8 trên host {host} ===")
-    cmd = "esxcli network vswitch standard policy security get -v vSwitch0"
-    out = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    
-    allow_promiscuous = parse_vswitch_policy(out, "Allow Promiscuous")
-    
-    ok = False
-    if allow_promiscuous is None:
-        print(f"[{host}] KHÔNG đọc được giá trị Allow Promiscuous.")
-    else:
-        print(f"[{host}] Allow Promiscuous: {allow_promiscuous}")
-        if not allow_promiscuous:
-            ok = True
-            
-    print(f"[{host}] KẾT LUẬN CIS 5.8: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    return {"host": host, "cis_5_8_ok": ok, "detail": {"allow_promiscuous": allow_promiscuous}}
+    return run_rule("5.8", host, username, password, port=port, key_path=key_path)
 
 
 def fix_5_8_for_host(host, username, password, port=22, key_path=None):
-    """Sửa lỗi CIS 5.8: Disable Allow Promiscuous trên vSwitch0."""
-    print(f"[{host}] Đang sửa lỗi CIS 5.8 (Disable Allow Promiscuous on vSwitch0)...")
-    cmd = "esxcli network vswitch standard policy security set -v vSwitch0 -p false"
-    run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    return True
+    """Sửa lỗi CIS 5.8: Disable Allow Promiscuous trên các vSwitch / port group vi phạm."""
+    print(f"[{host}] Đang sửa lỗi CIS 5.8 (Disable Allow Promiscuous)...")
+    return _fix_security_policy(host, username, password, port, key_path, "allow_promiscuous")
 
 
 # ==================== CIS 5.9 & 5.10 ====================
 
+# 5.9: native VLAN; 5.10: VLAN 4095 (VGT) và VLAN 0 (EST)
+NATIVE_VLANS = (1,)
+RESERVED_VLANS = (0, 4095)
+
+
+def find_bad_portgroups(inventory: dict, bad_vlans) -> list:
+    """Các port group dùng một trong các VLAN bad_vlans: [{name, vswitch, vlan}]."""
+    return [{"name": pg["name"], "vswitch": pg["vswitch"], "vlan": pg["vlan"]}
+            for pg in inventory["portgroups"] if pg["vlan"] in bad_vlans]
+
+
+def _evaluate_portgroup_vlans(rule, host, inventory):
+    """Đánh giá rule VLAN: VLAN của mọi port group phải thỏa rule (không nằm trong rule.expected)."""
+    bad_vlans = ", ".join(str(v) for v in rule.expected)
+    bad_pgs = [{"name": pg["name"], "vswitch": pg["vswitch"], "vlan": pg["vlan"]}
+               for pg in inventory["portgroups"] if not rule.matches(pg["vlan"])]
+
+    if bad_pgs:
+        print(f"[{host}] Các Port Group vi phạm (VLAN {bad_vlans}):")
+        for pg in bad_pgs:
+            print(f"  - {pg['name']}: VLAN {pg['vlan']}")
+    else:
+        print(f"[{host}] Tất cả Port Group đều có VLAN hợp lệ (khác {bad_vlans}).")
+    return not bad_pgs, {"bad_pgs": bad_pgs}
+
+
+def check_5_9_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
+    """
+    CIS 5.9: Kiểm tra Port Group không dùng native VLAN
+    Yêu cầu: không dùng VLAN 1
+    """
+    return run_rule("5.9", host, username, password, port=port, key_path=key_path)
+
+
+def check_5_10_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
+    """
+    CIS 5.10: Kiểm tra Port Group không dùng VLAN 4095 / VLAN 0
+    Yêu cầu: không dùng VLAN 0 hoặc 4095
+    """
+    return run_rule("5.10", host, username, password, port=port, key_path=key_path)
+
+
 def check_5_9_and_5_10_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 5.9 & 5.10: Kiểm tra VLAN của các Port Groups
     Yêu cầu: không dùng VLAN 0, 1, hoặc 4095
     """
-    print(f"\n=== Kiểm tra CIS 5.9 và 5.10 trên host {host} ===")
-    pgs = get_standard_portgroups(host, username, password, port, key_path=key_path)
-    
-    bad_pgs = [pg for pg in pgs if pg['vlan'] in [0, 1, 4095]]
-    
-    if bad_pgs:
-        print(f"[{host}] Các Port Group vi phạm (VLAN 0, 1, 4095):")
-        for pg in bad_pgs:
-            print(f"  - {pg['name']}: VLAN {pg['vlan']}")
-        ok = False
-    else:
-        print(f"[{host}] Tất cả Port Group đều có VLAN hợp lệ (khác 0, 1, 4095).")
-        ok = True
-        
-    print(f"[{host}] KẾT LUẬN CIS 5.9 và 5.10: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
+    results = [check_5_9_for_host(host, username, password, port=port, key_path=key_path),
+               check_5_10_for_host(host, username, password, port=port, key_path=key_path)]
+    ok = all(res[RULES[sec_id].result_key] for res, sec_id in zip(results, ("5.9", "5.10")))
+    bad_pgs = [pg for res in results for pg in res["detail"]["bad_pgs"]]
     return {"host": host, "cis_5_9_and_5_10_ok": ok, "detail": {"bad_pgs": bad_pgs}}
 
 
-def fix_5_9_and_5_10_for_host(host, username, password, port=22, key_path=None):
-    """Sửa lỗi CIS 5.9 & 5.10: Cập nhật VLAN ID cho các Port Groups vi phạm."""
-    print(f"[{host}] Đang tìm kiếm các Port Group vi phạm để sửa lỗi CIS 5.9 và 5.10...")
-    pgs = get_standard_portgroups(host, username, password, port, key_path=key_path)
-    bad_pgs = [pg for pg in pgs if pg['vlan'] in [0, 1, 4095]]
+def _fix_portgroup_vlans(host, username, password, port, key_path, bad_vlans, vlan_map):
+    """
+    Cập nhật VLAN ID cho các port group đang dùng VLAN trong bad_vlans.
+
+    vlan_map: {tên port group: VLAN mới} ("*" cho mọi port group khác) để chạy
+    không tương tác; nếu không truyền sẽ hỏi người dùng cho từng port group.
+    """
+    inventory = get_network_inventory(host, username, password, port=port, key_path=key_path)
+    bad_pgs = find_bad_portgroups(inventory, bad_vlans)
 
     if not bad_pgs:
-        print(f"[{host}] Không tìm thấy Port Group nào có VLAN 0, 1, 4095 để sửa.")
+        print(f"[{host}] Không tìm thấy Port Group nào có VLAN {', '.join(map(str, bad_vlans))} để sửa.")
         return True
 
     print(f"[{host}] Tìm thấy {len(bad_pgs)} Port Group cần sửa:")
+    all_fixed = True
     for pg in bad_pgs:
         print(f"  - {pg['name']} (Hiện tại: VLAN {pg['vlan']})")
-        
-        while True:
+
+        if vlan_map is not None:
+            new_vlan = vlan_map.get(pg["name"], vlan_map.get("*"))
+            if new_vlan is None or not 1 < int(new_vlan) < 4095:
+                print(f"    !! Không có VLAN hợp lệ cho '{pg['name']}' trong answers, bỏ qua.")
+                all_fixed = False
+                continue
+            new_vlan = int(new_vlan)
+
+        while vlan_map is None:
             new_vlan_str = input(f"    >> Nhập VLAN ID mới cho '{pg['name']}' (ví dụ 20): ").strip()
             if new_vlan_str.isdigit():
                 new_vlan = int(new_vlan_str)
@@ -199,7 +359,53 @@ def fix_5_9_and_5_10_for_host(host, username, password, port=22, key_path=None):
                 print("    !! Vui lòng nhập số nguyên.")
 
         print(f"    -> Đang set VLAN {new_vlan} cho '{pg['name']}'...")
-        cmd_fix = f'esxcli network vswitch standard portgroup set -p "{pg["name"]}" -v {new_vlan}'
+        cmd_fix = f"esxcli network vswitch standard portgroup set -p {shell_quote(pg['name'])} -v {int(new_vlan)}"
         run_ssh_command(host, username, password, cmd_fix, port=port, key_path=key_path)
         
-    return True
+    return all_fixed
+
+
+def _undo_portgroup_vlans(rule, detail):
+    """Hoàn tác 5.9 / 5.10: trả VLAN của các port group vi phạm về VLAN lúc kiểm tra."""
+    return [(f"portgroup {pg['name']}", pg["vlan"],
+             f"esxcli network vswitch standard portgroup set -p {shell_quote(pg['name'])} -v {int(pg['vlan'])}")
+            for pg in detail.get("bad_pgs") or []]
+
+
+def fix_5_9_for_host(host, username, password, port=22, key_path=None, vlan_map=None):
+    """Sửa lỗi CIS 5.9: Đổi VLAN của các Port Group đang dùng native VLAN."""
+    print(f"[{host}] Đang tìm kiếm các Port Group vi phạm để sửa lỗi CIS 5.9...")
+    return _fix_portgroup_vlans(host, username, password, port, key_path, NATIVE_VLANS, vlan_map)
+
+
+def fix_5_10_for_host(host, username, password, port=22, key_path=None, vlan_map=None):
+    """Sửa lỗi CIS 5.10: Đổi VLAN của các Port Group đang dùng VLAN 4095 / VLAN 0."""
+    print(f"[{host}] Đang tìm kiếm các Port Group vi phạm để sửa lỗi CIS 5.10...")
+    return _fix_portgroup_vlans(host, username, password, port, key_path, RESERVED_VLANS, vlan_map)
+
+
+def fix_5_9_and_5_10_for_host(host, username, password, port=22, key_path=None, vlan_map=None):
+    """Sửa lỗi CIS 5.9 & 5.10: Cập nhật VLAN ID cho các Port Groups vi phạm."""
+    print(f"[{host}] Đang tìm kiếm các Port Group vi phạm để sửa lỗi CIS 5.9 và 5.10...")
+    return _fix_portgroup_vlans(host, username, password, port, key_path, NATIVE_VLANS + RESERVED_VLANS, vlan_map)
+
+
+register_source("network", get_network_inventory, reads=[NETWORK_INVENTORY_CMD])
+
+register_rules(
+    Rule("5.6", "network", key="allow_forged_transmits",
+         expected=False, evaluate=_evaluate_security_policy, fix=fix_5_6_for_host, fix_value=False,
+         undo=_undo_security_policy),
+    Rule("5.7", "network", key="allow_mac_change",
+         expected=False, evaluate=_evaluate_security_policy, fix=fix_5_7_for_host, fix_value=False,
+         undo=_undo_security_policy),
+    Rule("5.8", "network", key="allow_promiscuous",
+         expected=False, evaluate=_evaluate_security_policy, fix=fix_5_8_for_host, fix_value=False,
+         undo=_undo_security_policy),
+    Rule("5.9", "network", key="vlan",
+         comparator="not_in", expected=NATIVE_VLANS, evaluate=_evaluate_portgroup_vlans, fix=fix_5_9_for_host,
+         undo=_undo_portgroup_vlans),
+    Rule("5.10", "network", key="vlan",
+         comparator="not_in", expected=RESERVED_VLANS, evaluate=_evaluate_portgroup_vlans, fix=fix_5_10_for_host,
+         undo=_undo_portgroup_vlans),
+)
@@ -0,0 +1,340 @@
+"""
+Mô hình rule khai báo cho các mục CIS
+
+Mỗi mục CIS là một Rule: đọc dữ liệu từ nguồn nào (source), tra khóa nào (key),
+so sánh ra sao (comparator + expected) và sửa bằng hàm nào (fix). Nguồn dữ liệu
+(advanced settings, hostd advopt, syslog, network inventory, software, vmx...) được
+khai báo riêng bằng register_source ở module tương ứng.
+
+Engine gom các rule theo nguồn: mỗi nguồn chỉ được đọc MỘT lần cho mỗi host, sau
+đó mọi rule dùng chung nguồn được đánh giá trong một lượt trên bản chụp đã đọc.
+
+Read planner: mỗi nguồn khai báo các lệnh đọc nó cần (reads). Trước khi đánh giá,
+hợp các lệnh đọc của mọi nguồn được chọn (đã bỏ trùng) được gộp thành MỘT script và
+chạy trong một lần exec; output từng lệnh được đưa vào FACT_CACHE nên fetch của từng
+nguồn (và các parser hiện có) lấy dữ liệu từ cache thay vì gọi SSH.
+
+Kiểm tra lại sau khi sửa (verify_rules): chỉ các mục vừa sửa được đánh giá lại; với
+nguồn scope "vm" chỉ các VM KHÔNG ĐẠT ở lần kiểm tra trước được đọc lại, và mọi lệnh
+đọc của host vẫn nằm trong một lần exec.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+from utils import run_ssh_read_plan
+from .catalog import CATALOG, default_result_key, section_sort_key
+
+
+class Source:
+    """
+    Nguồn dữ liệu của rule.
+
+    fetch(host, username, password, port=, key_path=) trả về bản chụp của host.
+    lookup(snapshot, key) lấy giá trị của một khóa (mặc định snapshot.get(key)).
+    Nguồn có scope "vm" trả về bản chụp (vms, configs) và rule được đánh giá cho từng VM.
+    reads: các lệnh đọc cố định mà fetch dùng (qua run_ssh_read), để read planner gộp trước.
+    fetch_vms(host, username, password, vms, port=, key_path=) / vm_reads(vms): bản chụp
+    và các lệnh đọc chỉ cho các VM cho trước (nguồn scope "vm", dùng khi kiểm tra lại).
+    """
+
+    def __init__(self, name, fetch, lookup=None, scope="host", reads=(), fetch_vms=None, vm_reads=None):
+        self.name = name
+        self.fetch = fetch
+        self.lookup = lookup or (lambda snapshot, key: snapshot.get(key))
+        self.scope = scope
+        self.reads = tuple(reads)
+        self.fetch_vms = fetch_vms
+        self.vm_reads = vm_reads
+
+
+class Rule:
+    """
+    Một mục CIS khai báo.
+
+    - id: số mục ("3.7"); tiêu đề (title) lấy từ danh mục checks/catalog.py
+    - source / key: nguồn dữ liệu và khóa cần tra
+    - comparator / expected: cách so sánh giá trị với yêu cầu (xem COMPARATORS)
+    - evaluate: hàm (rule, host, snapshot) -> (ok, detail) cho các mục không đơn giản
+      là so sánh một giá trị; khi có evaluate thì key/comparator không được dùng
+    - fix / fix_value: hàm sửa (chữ ký như fix_x_for_host) và giá trị ghi khi sửa
+    - undo: hàm (rule, detail) -> [(đối tượng, giá trị cũ, lệnh hoàn tác)] dựng từ detail
+      của kết quả kiểm tra, được ghi vào journal trước khi sửa (xem journal.py)
+    """
+
+    def __init__(self, id, source, key=None, comparator="eq", expected=None,
+                 result_key=None, evaluate=None, fix=None, fix_value=None, undo=None):
+        self.id = id
+        self.source = source
+        self.key = key
+        self.comparator = comparator
+        self.expected = expected
+        self.result_key = result_key or default_result_key(id)
+        self.evaluate = evaluate
+        self.fix = fix
+        self.fix_value = fix_value
+        self.undo = undo
+
+    @property
+    def title(self):
+        return CATALOG[self.id].title
+
+    @property
+    def per_vm(self):
+        return SOURCES[self.source].scope == "vm"
+
+    def matches(self, value):
+        """Giá trị có đạt yêu cầu không; thiếu giá trị (None) luôn là KHÔNG ĐẠT."""
+        if value is None:
+            return False
+        return COMPARATORS[self.comparator](value, self.expected)
+
+    def __repr__(self):
+        return f"Rule({self.id!r}, source={self.source!r}, key={self.key!r})"
+
+
+def _range(value, bounds):
+    low, high = bounds
+    return low < value <= high
+
+
+# Các phép so sánh: (giá trị đọc được, expected) -> bool
+COMPARATORS = {
+    "eq": lambda value, expected: value == expected,
+    "ieq": lambda value, expected: str(value).lower() == str(expected).lower(),
+    "in": lambda value, expected: value in expected,
+    "not_in": lambda value, expected: value not in expected,
+    "range": _range,  # expected = (low, high): low < value <= high
+    "configured": lambda value, expected: bool(value) and value not in (expected or ()),
+}
+
+# Registry: tên nguồn -> Source, số mục -> Rule (theo thứ tự khai báo)
+SOURCES = {}
+RULES = {}
+
+
+def register_source(name, fetch, lookup=None, scope="host", reads=(), fetch_vms=None, vm_reads=None):
+    """Khai báo một nguồn dữ liệu cho rule."""
+    SOURCES[name] = Source(name, fetch, lookup=lookup, scope=scope, reads=reads,
+                           fetch_vms=fetch_vms, vm_reads=vm_reads)
+    return SOURCES[name]
+
+
+def register_rules(*rules):
+    """Thêm các rule vào registry."""
+    for rule in rules:
+        RULES[rule.id] = rule
+
+
+def rules_by_source(rule_ids):
+    """Gom các rule theo nguồn dữ liệu: {source: [Rule]} (giữ thứ tự số mục)."""
+    groups = {}
+    for rule_id in sorted(rule_ids, key=section_sort_key):
+        rule = RULES[rule_id]
+        groups.setdefault(rule.source, []).append(rule)
+    return groups
+
+
+def plan_reads(rule_ids):
+    """Hợp các lệnh đọc cần cho các rule, bỏ trùng, giữ thứ tự."""
+    reads = {}
+    for source in rules_by_source(rule_ids):
+        for cmd in SOURCES[source].reads:
+            reads.setdefault(cmd, None)
+    return list(reads)
+
+
+def prefetch_reads(host, username, password, rule_ids, port=22, key_path=None, extra_reads=()):
+    """
+    Đọc trước mọi lệnh của plan_reads(rule_ids) (và extra_reads) trong một lần exec.
+
+    Lỗi ở bước này không dừng việc kiểm tra: nguồn nào chưa có dữ liệu sẽ tự đọc
+    khi fetch, và lỗi (nếu còn) được gán cho đúng các rule của nguồn đó.
+    """
+    try:
+        return run_ssh_read_plan(host, username, password, plan_reads(rule_ids) + list(extra_reads),
+                                 port=port, key_path=key_path)
+    except Exception as e:
+        print(f"[{host}] CẢNH BÁO: không đọc gộp được, đọc riêng từng nguồn: {e}")
+        return 0
+
+
+def fetch_sources(host, username, password, source_names, port=22, key_path=None, max_workers=1, durations=None):
+    """
+    Đọc các nguồn cho một host, mỗi nguồn một lần, song song tối đa max_workers.
+
+    Trả về (snapshots, errors): {source: bản chụp} và {source: exception}.
+    Nếu có dict durations, thời gian đọc (giây) của từng nguồn được ghi vào đó.
+    """
+    def fetch(name):
+        started = time.perf_counter()
+        try:
+            return SOURCES[name].fetch(host, username, password, port=port, key_path=key_path)
+        finally:
+            elapsed = time.perf_counter() - started
+            METRICS.observe("cis_source_fetch_seconds", elapsed, source=name)
+            if durations is not None:
+                durations[name] = elapsed
+
+    snapshots = {}
+    errors = {}
+    source_names = list(source_names)
+    workers = max(1, min(max_workers, len(source_names)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(fetch, name) for name in source_names}
+        for name, future in futures.items():
+            try:
+                snapshots[name] = future.result()
+            except Exception as e:
+                errors[name] = e
+    return snapshots, errors
+
+
+def _evaluate_value(rule, host, snapshot):
+    value = SOURCES[rule.source].lookup(snapshot, rule.key)
+    if value is None:
+        print(f"[{host}] KHÔNG đọc được giá trị {rule.key}.")
+    else:
+        print(f"[{host}] {rule.key} = {value}")
+    return rule.matches(value), {"current_value": value}
+
+
+def _evaluate_vms(rule, host, snapshot):
+    vms, configs = snapshot
+    if not vms:
+        print(f"[{host}] Không tìm thấy máy ảo nào.")
+        return True, {"failed_vms": []}
+
+    lookup = SOURCES[rule.source].lookup
+    failed_vms = []
+    for vm in vms:
+        val = lookup(configs.get(vm["path"], {}), rule.key)
+        if val is None:
+            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
+        elif rule.matches(val):
+            print(f"  - {vm['name']}: {rule.key} = {val} -> ĐẠT")
+            continue
+        else:
+            print(f"  - {vm['name']}: {rule.key} = {val} -> KHÔNG ĐẠT")
+        # Bản chụp dùng chung cho nhiều rule nên không sửa dict VM gốc
+        failed_vms.append({**vm, "current_value": val})
+    return not failed_vms, {"failed_vms": failed_vms}
+
+
+def evaluate_rule(rule, host, snapshot):
+    """Đánh giá một rule trên bản chụp nguồn của host, trả về dict kết quả."""
+    print(f"\n=== Kiểm tra CIS {rule.id} trên host {host} ===")
+    if rule.evaluate is not None:
+        ok, detail = rule.evaluate(rule, host, snapshot)
+    elif rule.per_vm:
+        ok, detail = _evaluate_vms(rule, host, snapshot)
+    else:
+        ok, detail = _evaluate_value(rule, host, snapshot)
+    print(f"[{host}] KẾT LUẬN CIS {rule.id}: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
+    return {"host": host, rule.result_key: ok, "detail": detail}
+
+
+def error_result(host, rule_id, error):
+    """Kết quả cho một rule không đánh giá được (lỗi kết nối, lỗi lệnh...)."""
+    # Rule có thể chưa được đăng ký nếu chính việc nạp module của nó bị lỗi
+    result_key = RULES[rule_id].result_key if rule_id in RULES else default_result_key(rule_id)
+    return {"host": host, result_key: False, "error": str(error), "detail": {}}
+
+
+def _evaluate_groups(host, groups, snapshots, errors, durations):
+    """Đánh giá các rule đã gom theo nguồn trên các bản chụp, trả về {rule_id: kết quả}."""
+    results = {}
+    for source, rules in groups.items():
+        for rule in rules:
+            started = time.perf_counter()
+            if source in errors:
+                print(f"[{host}] LỖI khi kiểm tra {rule.id}: {errors[source]}")
+                results[rule.id] = error_result(host, rule.id, errors[source])
+            else:
+                try:
+                    results[rule.id] = evaluate_rule(rule, host, snapshots[source])
+                except Exception as e:
+                    print(f"[{host}] LỖI khi kiểm tra {rule.id}: {e}")
+                    results[rule.id] = error_result(host, rule.id, e)
+            # Thời gian của mục = thời gian đọc nguồn (dùng chung) + thời gian đánh giá
+            METRICS.observe("cis_section_seconds", durations.get(source, 0.0) + time.perf_counter() - started,
+                            section=rule.id)
+    return {rule_id: results[rule_id] for rule_id in sorted(results, key=section_sort_key)}
+
+
+def evaluate_rules(host, username, password, rule_ids, port=22, key_path=None, max_workers=1, prefetch=True):
+    """
+    Đánh giá nhiều rule trên một host, trả về {rule_id: kết quả}.
+
+    Với prefetch, mọi lệnh đọc của các nguồn được gộp vào một lần exec trước; sau đó
+    mỗi nguồn dữ liệu được dựng một lần (các nguồn độc lập song song), rồi mọi rule
+    của nguồn đó được đánh giá trên cùng bản chụp. Nguồn đọc lỗi chỉ làm các rule
+    của nguồn đó có kết quả lỗi.
+    """
+    groups = rules_by_source(rule_ids)
+    if prefetch:
+        prefetch_reads(host, username, password, rule_ids, port=port, key_path=key_path)
+    durations = {}
+    snapshots, errors = fetch_sources(host, username, password, groups, port=port, key_path=key_path,
+                                      max_workers=max_workers, durations=durations)
+    return _evaluate_groups(host, groups, snapshots, errors, durations)
+
+
+def _touched_vms(rules, previous):
+    """
+    Các VM cần đọc lại cho các rule scope "vm": hợp failed_vms của kết quả trước
+    (bỏ giá trị cũ). None nếu có rule không có danh sách VM (ví dụ kết quả lỗi).
+    """
+    vms = {}
+    for rule in rules:
+        failed_vms = (previous.get(rule.id) or {}).get("detail", {}).get("failed_vms")
+        if not failed_vms:
+            return None
+        for vm in failed_vms:
+            vms.setdefault(vm["path"], {"vmid": vm["vmid"], "name": vm["name"], "path": vm["path"]})
+    return list(vms.values())
+
+
+def verify_rules(host, username, password, previous, port=22, key_path=None, max_workers=1):
+    """
+    Kiểm tra lại các mục vừa sửa trên một host, trả về {rule_id: kết quả mới}.
+
+    previous: {rule_id: kết quả trước khi sửa}. Nguồn scope "host" được đọc lại như khi
+    kiểm tra; với nguồn scope "vm" có fetch_vms, chỉ các VM trong failed_vms của kết quả
+    trước được đọc lại (các VM khác đã ĐẠT và không bị sửa), nên kết quả mới chỉ liệt kê
+    các VM trong số đó còn KHÔNG ĐẠT. Lệnh đọc của mọi nguồn được gộp vào một lần exec.
+    """
+    groups = rules_by_source(previous)
+    subsets = {}
+    for source, rules in groups.items():
+        src = SOURCES[source]
+        if src.scope == "vm" and src.fetch_vms is not None:
+            vms = _touched_vms(rules, previous)
+            if vms is not None:
+                subsets[source] = vms
+
+    full_ids = [rule.id for source, rules in groups.items() if source not in subsets for rule in rules]
+    extra_reads = [cmd for source, vms in subsets.items() for cmd in SOURCES[source].vm_reads(vms)]
+    prefetch_reads(host, username, password, full_ids, port=port, key_path=key_path, extra_reads=extra_reads)
+
+    durations = {}
+    snapshots, errors = fetch_sources(host, username, password, [s for s in groups if s not in subsets],
+                                      port=port, key_path=key_path, max_workers=max_workers, durations=durations)
+    for source, vms in subsets.items():
+        started = time.perf_counter()
+        try:
+            snapshots[source] = SOURCES[source].fetch_vms(host, username, password, vms, port=port, key_path=key_path)
+        except Exception as e:
+            errors[source] = e
+        finally:
+            durations[source] = time.perf_counter() - started
+            METRICS.observe("cis_source_fetch_seconds", durations[source], source=source)
+    return _evaluate_groups(host, groups, snapshots, errors, durations)
+
+
+def run_rule(rule_id, host, username, password, port=22, key_path=None):
+    """Đánh giá một rule (dùng cho các hàm check_x_for_host); lỗi đọc nguồn được raise."""
+    rule = RULES[rule_id]
+    snapshot = SOURCES[rule.source].fetch(host, username, password, port=port, key_path=key_path)
+    return evaluate_rule(rule, host, snapshot)
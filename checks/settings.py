@@ -0,0 +1,145 @@
+"""
+Bản chụp advanced settings của ESXi
+
+Thay vì mỗi check gọi `esxcli system settings advanced list -o <path>`, chỉ chạy
+MỘT lệnh `esxcli system settings advanced list` cho mỗi host rồi tra theo path.
+Thêm một mục CIS dựa trên advanced setting không tốn thêm round trip nào.
+
+Các option của hostd (`vim-cmd hostsvc/advopt/view`) cũng được đọc gộp trong một
+lần exec cho mỗi host.
+
+undo_advanced_setting / undo_host_advopt dựng lệnh hoàn tác (Rule.undo) cho các rule
+chỉ so sánh một giá trị của hai nguồn này.
+"""
+
+from utils import run_ssh_read, build_batch_command, split_batch_lines, iter_lines
+from .rules import register_source
+
+ADVANCED_SETTINGS_LIST_CMD = "esxcli system settings advanced list"
+
+# Các option hostd cần đọc và kiểu giá trị của chúng
+HOST_ADVOPTS = {
+    "Config.HostAgent.plugins.solo.enableMob": "bool",
+    "Security.AccountLockFailures": "int",
+    "Security.AccountUnlockTime": "int",
+}
+
+HOST_ADVOPTS_BATCH_CMD = build_batch_command(
+    {key: f"vim-cmd hostsvc/advopt/view {key}" for key in HOST_ADVOPTS}
+)
+
+
+def parse_advanced_settings(output) -> dict:
+    """
+    Parse output của 'esxcli system settings advanced list' thành dict {path: {field: value}}.
+
+    Mỗi option bắt đầu bằng dòng 'Path: /Group/Name', các dòng 'Field: value' sau đó
+    thuộc về option đó.
+    """
+    settings = {}
+    current = None
+    for line in iter_lines(output):
+        field, sep, val = line.partition(":")
+        if not sep:
+            continue
+        field = field.strip()
+        val = val.strip()
+        if field == "Path":
+            current = settings.setdefault(val, {})
+        elif current is not None:
+            current[field] = val
+    return settings
+
+
+def get_advanced_settings(host, username, password, port=22, key_path=None) -> dict:
+    """Lấy index advanced settings của host (đọc một lần cho cả lần chạy)."""
+    out = run_ssh_read(host, username, password, ADVANCED_SETTINGS_LIST_CMD, port=port, key_path=key_path)
+    return parse_advanced_settings(out)
+
+
+def get_advanced_int(settings: dict, path: str) -> int | None:
+    """Lấy 'Int Value' của một option trong index, None nếu không có / không hợp lệ."""
+    raw = settings.get(path, {}).get("Int Value")
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return None
+
+
+# ==================== vim-cmd hostsvc/advopt ====================
+
+def parse_vim_cmd_bool(output):
+    """Parse boolean value from vim-cmd output."""
+    enabled = None
+    for line in iter_lines(output):
+        line = line.strip()
+        if line.startswith("value"):
+            parts = line.split("=", 1)
+            if len(parts) == 2:
+                raw_val = parts[1].strip().strip(",")
+                low = raw_val.lower()
+                if low.startswith("true"):
+                    enabled = True
+                elif low.startswith("false"):
+                    enabled = False
+            break
+    return enabled, output
+
+
+def parse_vim_cmd_int(output):
+    """Parse integer value from vim-cmd output (value = <int>)."""
+    for line in iter_lines(output):
+        line = line.strip()
+        if line.startswith("value ="):
+            parts = line.split("=", 1)
+            if len(parts) == 2:
+                val_str = parts[1].strip().rstrip(",")
+                try:
+                    return int(val_str)
+                except ValueError:
+                    pass
+    return None
+
+
+def parse_host_advopts(output) -> dict:
+    """Tách output gộp của HOST_ADVOPTS_BATCH_CMD thành dict {key: giá trị đã ép kiểu}."""
+    sections = split_batch_lines(output)
+    advopts = {}
+    for key, kind in HOST_ADVOPTS.items():
+        raw = sections.get(key, ())
+        if kind == "bool":
+            advopts[key], _ = parse_vim_cmd_bool(raw)
+        else:
+            advopts[key] = parse_vim_cmd_int(raw)
+    return advopts
+
+
+def get_host_advopts(host, username, password, port=22, key_path=None) -> dict:
+    """Đọc tất cả HOST_ADVOPTS của host trong một lần exec (một lần cho cả lần chạy)."""
+    out = run_ssh_read(host, username, password, HOST_ADVOPTS_BATCH_CMD, port=port, key_path=key_path)
+    return parse_host_advopts(out)
+
+
+def undo_advanced_setting(rule, detail):
+    """Hoàn tác rule dựa trên advanced setting (int): ghi lại giá trị đọc được lúc kiểm tra."""
+    prior = detail.get("current_value")
+    if prior is None:
+        return []
+    return [(rule.key, prior, f"esxcli system settings advanced set -o {rule.key} -i {int(prior)}")]
+
+
+def undo_host_advopt(rule, detail):
+    """Hoàn tác rule dựa trên option của hostd: ghi lại giá trị đọc được lúc kiểm tra."""
+    prior = detail.get("current_value")
+    if prior is None:
+        return []
+    kind = HOST_ADVOPTS[rule.key]
+    value = str(prior).lower() if kind == "bool" else int(prior)
+    return [(rule.key, prior, f"vim-cmd hostsvc/advopt/update {rule.key} {kind} {value}")]
+
+
+register_source("advanced", get_advanced_settings, lookup=get_advanced_int,
+                reads=[ADVANCED_SETTINGS_LIST_CMD])
+register_source("advopt", get_host_advopts, reads=[HOST_ADVOPTS_BATCH_CMD])
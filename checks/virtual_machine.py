@@ -6,90 +6,230 @@ CIS VMware ESXi 8 - Section 7: Virtual Machine Checks
 - 7.24: tools.guestlib.enableHostInfo = FALSE
 - 7.26: log.keepOld = 10
 - 7.27: log.rotateSize = 1000000
+
+Danh sách VM được đọc một lần, nội dung mọi file .vmx được kéo về trong một lệnh
+gộp (VMX snapshot) và mọi check Section 7 tra cứu từ bản chụp đó. Với VMX cache
+trên đĩa (vmx_cache.py), chỉ các file đã thay đổi kể từ lần quét trước được đọc lại.
 """
 
-from utils import run_ssh_command
+import re
+
+from utils import run_ssh_command, run_ssh_read, iter_lines, collapse_spaces, shell_quote, BATCH_MARKER, VMX_DUMP_HEADER
+from vmx_cache import get_vmx_cache
+from .rules import Rule, RULES, register_rules, register_source, run_rule
+
+VM_LIST_CMD = "vim-cmd vmsvc/getallvms"
+
+# Giới hạn độ dài một lệnh dump để không vượt ARG_MAX của shell trên ESXi;
+# với vài nghìn VM lệnh sẽ được chia thành vài lần exec.
+VMX_DUMP_MAX_COMMAND_BYTES = 100_000
+
+# Dòng của getallvms: Vmid, Name (có thể chứa khoảng trắng), [Datastore] đường dẫn/file.vmx, ...
+_VM_ROW_RE = re.compile(r"\s*(\d+)\s+(?:(.*?)\s+)??\[([^\]]*)\]\s*(.*?\.vmx)")
 
-def parse_vms_list(output: str):
-    """Parse 'vim-cmd vmsvc/getallvms' output."""
+
+def parse_vms_list(output):
+    """
+    Parse 'vim-cmd vmsvc/getallvms' output.
+
+    Mỗi dòng chỉ được match một lần bằng regex đã biên dịch; output có thể là str hoặc
+    iterable các dòng.
+    """
     vms = []
-    lines = output.splitlines()
-    data_lines = [line for line in lines if line.strip() and not line.strip().startswith("Vmid")]
-    
-    for line in data_lines:
-        parts = line.split()
-        if not parts:
+    match = _VM_ROW_RE.match
+    for line in iter_lines(output):
+        m = match(line)
+        if m is None:
+            continue
+        vmid, name, ds_name, rel_path = m.groups()
+        vms.append({
+            "vmid": vmid,
+            "name": collapse_spaces(name) if name else "",
+            "path": f"/vmfs/volumes/{collapse_spaces(ds_name)}/{collapse_spaces(rel_path)}",
+        })
+    return vms
+
+def _parse_vmx_lines(lines, config):
+    """Thêm các dòng 'key = value' của một file .vmx vào config (giữ giá trị xuất hiện đầu tiên)."""
+    for line in lines:
+        key, sep, raw_val = line.partition("=")
+        if not sep:
+            continue
+        key = key.strip()
+        if key.startswith("#"):
+            continue
+        # Giữ giá trị xuất hiện đầu tiên, giống cách đọc bằng grep trước đây
+        if key not in config:
+            config[key] = raw_val.strip().replace('"', '')
+    return config
+
+
+def parse_vmx(text) -> dict:
+    """Parse nội dung file .vmx (str hoặc iterable các dòng) thành dict {key: value} (bỏ dấu nháy, bỏ comment)."""
+    return _parse_vmx_lines(iter_lines(text), {})
+
+
+def _chunk_quoted_paths(paths):
+    """Chia danh sách path (đã quote) thành các nhóm để mỗi lệnh không vượt giới hạn độ dài."""
+    chunks = []
+    batch = []
+    size = 0
+    for path in paths:
+        quoted = shell_quote(path)
+        if batch and size + len(quoted) + 1 > VMX_DUMP_MAX_COMMAND_BYTES:
+            chunks.append(batch)
+            batch, size = [], 0
+        batch.append(quoted)
+        size += len(quoted) + 1
+    if batch:
+        chunks.append(batch)
+    return chunks
+
+
+def build_vmx_dump_commands(paths):
+    """
+    Tạo các lệnh in nội dung nhiều file .vmx, mỗi file mở đầu bằng dòng '<marker> <path>'.
+
+    Marker luôn được in sau một ký tự xuống dòng (như build_plan_script) nên file .vmx
+    không kết thúc bằng newline không làm dính marker của file sau vào dòng cuối của nó.
+    """
+    return [
+        f'{VMX_DUMP_HEADER}\nfor f in {" ".join(batch)}; do printf \'\\n%s %s\\n\' "{BATCH_MARKER}" "$f"; cat "$f"; done'
+        for batch in _chunk_quoted_paths(paths)
+    ]
+
+
+def build_vmx_stat_commands(paths):
+    """Tạo các lệnh lấy mtime, size (`stat`) và md5 (`md5sum`) của nhiều file .vmx."""
+    return [f"set -- {' '.join(batch)}; stat -c '%Y %s %n' \"$@\"; md5sum \"$@\""
+            for batch in _chunk_quoted_paths(paths)]
+
+
+def parse_vmx_stat(output) -> dict:
+    """
+    Parse output của build_vmx_stat_commands thành dict {path: (mtime, size, md5)}.
+
+    Dòng của stat là '<mtime> <size> <path>', của md5sum là '<md5>  <path>'; file không
+    có dòng md5sum (không đọc được) có md5 rỗng.
+    """
+    stats = {}
+    digests = {}
+    for line in iter_lines(output):
+        parts = line.split(" ", 2)
+        if len(parts) != 3:
+            continue
+        if len(parts[0]) == 32 and not parts[1]:
+            digests[parts[2]] = parts[0]
             continue
-        
         try:
-            vmid = parts[0]
-            int(vmid)
-            
-            path_start_idx = -1
-            for i, p in enumerate(parts):
-                if p.startswith("["):
-                    path_start_idx = i
-                    break
-            
-            if path_start_idx != -1:
-                name = " ".join(parts[1:path_start_idx])
-                line_rest = " ".join(parts[path_start_idx:])
-                
-                if ".vmx" in line_rest:
-                    raw_path = line_rest.split(".vmx")[0] + ".vmx"
-                    path = raw_path
-                    
-                    if raw_path.startswith("["):
-                        ds_end = raw_path.find("]")
-                        if ds_end != -1:
-                            ds_name = raw_path[1:ds_end]
-                            rel_path = raw_path[ds_end+1:].strip()
-                            path = f"/vmfs/volumes/{ds_name}/{rel_path}"
-                            
-                vms.append({"vmid": vmid, "name": name, "path": path})
+            stats[parts[2]] = (int(parts[0]), int(parts[1]))
         except ValueError:
             continue
-            
-    return vms
+    return {path: stat + (digests.get(path, ""),) for path, stat in stats.items()}
 
-def check_vm_setting_in_file(host, username, password, file_path, setting_key, port=22, key_path=None):
-    """Kiểm tra một setting trong file .vmx của VM."""
-    cmd = f'grep "{setting_key}" "{file_path}"'
-    output = run_ssh_command(host, username, password, cmd, port=port, key_path=key_path)
-    
-    val = None
-    for line in output.splitlines():
-        line = line.strip()
-        if not line.startswith("#") and line.startswith(setting_key) and "=" in line:
-            parts = line.split("=", 1)
-            if len(parts) == 2:
-                raw_val = parts[1].strip().replace('"', '')
-                val = raw_val
-                break
-    return val
-
-def _get_failed_vms_for_setting(host, username, password, setting_key, expected_value, port=22, case_insensitive=False, key_path=None):
-    """Helper function để lấy danh sách VMs không đạt yêu cầu cho một setting."""
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], setting_key, port, key_path=key_path)
-        if val is None:
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        else:
-            compare_val = val.lower() if case_insensitive else val
-            compare_expected = expected_value.lower() if case_insensitive else expected_value
-            if compare_val != compare_expected:
-                vm['current_value'] = val
-                failed_vms.append(vm)
-    
-    return vms, failed_vms
 
-def _select_vms_to_fix(host, failed_vms):
-    """Helper function để người dùng chọn VMs cần sửa."""
+def parse_vmx_dump(output) -> dict:
+    """
+    Tách output của lệnh dump thành dict {path: {key: value}}.
+
+    Một lượt qua toàn bộ output: mỗi dòng được parse ngay vào config của file đang đọc
+    (cùng quy tắc với parse_vmx), không gom lại thành chuỗi rồi tách dòng lần nữa.
+    """
+    configs = {}
+    config = None
+    prefix = BATCH_MARKER + " "
+    prefix_len = len(prefix)
+    for line in iter_lines(output):
+        if not line:
+            # Dòng trống trước mỗi marker (xem build_vmx_dump_commands)
+            continue
+        if line.startswith(prefix):
+            config = configs[line[prefix_len:]] = {}
+            continue
+        if config is None:
+            continue
+        key, sep, raw_val = line.partition("=")
+        if not sep:
+            continue
+        key = key.strip()
+        if key.startswith("#") or key in config:
+            continue
+        config[key] = raw_val.strip().replace('"', '')
+    return configs
+
+
+def get_vms(host, username, password, port=22, key_path=None):
+    """Lấy danh sách VM của host (getallvms chạy một lần cho cả lần chạy)."""
+    out = run_ssh_read(host, username, password, VM_LIST_CMD, port=port, key_path=key_path)
+    return parse_vms_list(out)
+
+
+def _fetch_vmx_configs(host, username, password, paths, port=22, key_path=None):
+    """Kéo nội dung các file .vmx về và parse, trả về dict {path: config}."""
+    configs = {}
+    for cmd in build_vmx_dump_commands(paths):
+        out = run_ssh_read(host, username, password, cmd, port=port, key_path=key_path)
+        for path, config in parse_vmx_dump(out).items():
+            if config:
+                configs[path] = config
+    return configs
+
+
+def get_vm_configs(host, username, password, port=22, key_path=None):
+    """
+    Bản chụp cấu hình VM của host: (vms, configs) với configs = {path .vmx: {key: value}}.
+
+    Nếu VMX cache trên đĩa được bật, một lệnh `stat` + `md5sum` cho biết file nào đã
+    đổi (mtime/size/md5); chỉ những file đó được đọc lại, phần còn lại lấy từ cache.
+    File .vmx không đọc được (không tồn tại, không có quyền) sẽ không có trong configs.
+    """
+    vms = get_vms(host, username, password, port=port, key_path=key_path)
+    paths = [vm["path"] for vm in vms]
+
+    cache = get_vmx_cache()
+    if cache is None or not paths:
+        return vms, _fetch_vmx_configs(host, username, password, paths, port=port, key_path=key_path)
+
+    stats = {}
+    for cmd in build_vmx_stat_commands(paths):
+        stats.update(parse_vmx_stat(run_ssh_read(host, username, password, cmd, port=port, key_path=key_path)))
+
+    cache_host = f"{host}:{port}"
+    configs, changed = cache.lookup(cache_host, stats)
+    if changed:
+        fetched = _fetch_vmx_configs(host, username, password, changed, port=port, key_path=key_path)
+        configs.update(fetched)
+        cache.store(cache_host, {path: stats[path] + (fetched[path],) for path in fetched})
+    cache.prune(cache_host, stats)
+    return vms, configs
+
+
+def get_vm_configs_for(host, username, password, vms, port=22, key_path=None):
+    """
+    Bản chụp (vms, configs) chỉ của các VM cho trước (kiểm tra lại sau khi sửa): đọc thẳng
+    các file .vmx đó, không chạy getallvms / stat và không qua VMX cache.
+    """
+    return vms, _fetch_vmx_configs(host, username, password, [vm["path"] for vm in vms],
+                                   port=port, key_path=key_path)
+
+
+def vm_config_reads(vms):
+    """Các lệnh đọc mà get_vm_configs_for dùng cho vms (để read planner gộp trước)."""
+    return build_vmx_dump_commands([vm["path"] for vm in vms])
+
+
+def _select_vms_to_fix(host, failed_vms, selection=None):
+    """
+    Helper function để người dùng chọn VMs cần sửa.
+
+    selection ("all" hoặc list tên VM / vmid) cho phép chọn trước, không hỏi người dùng.
+    """
+    if selection is not None:
+        if selection == "all":
+            return failed_vms
+        wanted = {str(item) for item in selection}
+        return [vm for vm in failed_vms if vm["name"] in wanted or vm["vmid"] in wanted]
+
     print(f"[{host}] Danh sách VM cần sửa:")
     for i, vm in enumerate(failed_vms):
         print(f"  {i+1}. {vm['name']}")
@@ -109,372 +249,262 @@ def _select_vms_to_fix(host, failed_vms):
                     selected_vms.append(failed_vms[i])
         return selected_vms
 
-def fix_vm_setting(host, username, password, vm, setting_key, setting_value, port=22, key_path=None):
-    """Sửa một setting trong file .vmx của VM."""
-    # Xóa setting cũ
-    cmd_del = f'sed -i "/{setting_key}/d" "{vm["path"]}"'
-    run_ssh_command(host, username, password, cmd_del, port=port, key_path=key_path)
-    
-    # Thêm setting mới
-    cmd_add = f'echo \'{setting_key} = "{setting_value}"\' >> "{vm["path"]}"'
-    run_ssh_command(host, username, password, cmd_add, port=port, key_path=key_path)
-    
-    # Reload VM config
-    run_ssh_command(host, username, password, f"vim-cmd vmsvc/reload {vm['vmid']}", port=port, key_path=key_path)
+def _vmx_key_pattern(keys):
+    """Regex (ERE) khớp các dòng gán một trong các key, không phân biệt hoa thường."""
+    alternatives = "|".join(key.replace(".", "\\.") for key in keys)
+    return f"^[[:space:]]*({alternatives})[[:space:]]*="
+
+
+def add_vm_change(changes, vm, setting_key, setting_value):
+    """Thêm một thay đổi (key = value) cho VM vào lô sửa `changes`, gộp theo file .vmx."""
+    entry = changes.setdefault(vm["path"], {"vm": vm, "settings": {}})
+    entry["settings"][setting_key] = setting_value
+    return changes
+
+
+def build_vm_remediation_script(changes):
+    """
+    Tạo MỘT script sửa mọi VM trong lô `changes` ({path: {"vm": vm, "settings": {...}}}).
+
+    Với mỗi VM: chép .vmx sang file tạm (giữ quyền), bỏ các dòng của key cần sửa,
+    thêm giá trị mới, thay file gốc bằng rename nguyên tử rồi reload VM đúng một lần.
+    Mỗi VM in '<marker> ok|fail <vmid>' để biết kết quả.
+    """
+    lines = []
+    for path, entry in changes.items():
+        vm = entry["vm"]
+        settings = entry["settings"]
+        new_lines = " ".join(shell_quote(f'{key} = "{value}"') for key, value in settings.items())
+        lines.append(f"f={shell_quote(path)}; t=\"$f.cis-tmp\"")
+        lines.append(
+            f'if cp -p "$f" "$t" && {{ grep -v -i -E {shell_quote(_vmx_key_pattern(settings))} "$f" > "$t"; [ $? -le 1 ]; }}'
+            f' && printf \'%s\\n\' {new_lines} >> "$t" && mv -f "$t" "$f"'
+            f' && vim-cmd vmsvc/reload {vm["vmid"]} > /dev/null;'
+            f' then echo "{BATCH_MARKER} ok {vm["vmid"]}";'
+            f' else rm -f "$t"; echo "{BATCH_MARKER} fail {vm["vmid"]}"; fi'
+        )
+    return "\n".join(lines)
+
+
+def build_vm_undo_command(vm, settings):
+    """
+    Lệnh hoàn tác các key đã sửa của một VM.
+
+    settings: {key: (giá trị cũ, giá trị ghi khi sửa)}, giá trị cũ None = key không có
+    trước khi sửa. Chỉ key còn đúng giá trị đã ghi mới được trả về giá trị cũ (VM không
+    được chọn sửa, hoặc key đã bị đổi tiếp, thì giữ nguyên); .vmx được thay bằng rename
+    nguyên tử và VM chỉ reload khi có thay đổi.
+    """
+    lines = [f"f={shell_quote(vm['path'])}; t=\"$f.cis-tmp\"; n=0", 'cp -p "$f" "$t" || exit 1']
+    for key, (prior, applied) in settings.items():
+        key_re = _vmx_key_pattern([key])
+        applied_re = f'{key_re}[[:space:]]*"?{re.escape(str(applied))}"?[[:space:]]*$'
+        restore = ""
+        if prior is not None:
+            new_line = shell_quote(f'{key} = "{prior}"')
+            restore = f"printf '%s\\n' {new_line} >> \"$t\"; "
+        lines.append(
+            f'if grep -q -i -E {shell_quote(applied_re)} "$t"; then'
+            f' grep -v -i -E {shell_quote(key_re)} "$t" > "$t.k"; cat "$t.k" > "$t"; rm -f "$t.k";'
+            f' {restore}n=1; fi'
+        )
+    lines.append(f'if [ $n = 1 ]; then mv -f "$t" "$f" && vim-cmd vmsvc/reload {vm["vmid"]} > /dev/null;'
+                 f' else rm -f "$t"; fi')
+    return "\n".join(lines)
+
+
+def undo_vm_sections(failed_vms_by_section):
+    """
+    Các thay đổi mà fix_vm_sections_for_host có thể ghi, gộp theo VM (để ghi journal):
+    [(các mục, path .vmx, {key: giá trị cũ}, lệnh hoàn tác)].
+    """
+    per_vm = {}
+    for sec_id, failed_vms in failed_vms_by_section.items():
+        rule = RULES[sec_id]
+        for vm in failed_vms or ():
+            entry = per_vm.setdefault(vm["path"], {"vm": vm, "sections": [], "settings": {}})
+            entry["sections"].append(sec_id)
+            entry["settings"][rule.key] = (vm.get("current_value"), rule.fix_value)
+    return [
+        (entry["sections"], path, {key: prior for key, (prior, _) in entry["settings"].items()},
+         build_vm_undo_command(entry["vm"], entry["settings"]))
+        for path, entry in per_vm.items()
+    ]
+
+
+def apply_vm_changes(host, username, password, changes, port=22, key_path=None):
+    """Gửi cả lô sửa VM của host trong một lần exec. Trả về dict {vmid: True/False}."""
+    if not changes:
+        return {}
+    out = run_ssh_command(host, username, password, build_vm_remediation_script(changes), port=port, key_path=key_path)
+
+    status = {}
+    prefix = BATCH_MARKER + " "
+    for line in out.splitlines():
+        if line.startswith(prefix):
+            parts = line[len(prefix):].split()
+            if len(parts) == 2:
+                status[parts[1]] = parts[0] == "ok"
+    for entry in changes.values():
+        vm = entry["vm"]
+        if not status.get(vm["vmid"], False):
+            print(f"[{host}] LỖI khi sửa VM {vm['name']} ({vm['path']})")
+    return status
+
+
+# ==================== CIS 7.x ====================
+
+VM_LOG_KEEP_OLD = "10"
+VM_LOG_ROTATE_SIZE = "1000000"
+
+
+def _fix_vm_rule(sec_id, host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
+    """Sửa một mục Section 7 trên các VM không đạt (đánh giá lại rule nếu chưa có failed_vms)."""
+    if failed_vms is None:
+        failed_vms = run_rule(sec_id, host, username, password, port=port, key_path=key_path)["detail"]["failed_vms"]
+    selections = None if selection is None else {sec_id: selection}
+    return fix_vm_sections_for_host(host, username, password, {sec_id: failed_vms}, port=port,
+                                    key_path=key_path, selections=selections)[sec_id]
 
-# ==================== CIS 7.6 ====================
 
 def check_7_6_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.6: Kiểm tra RemoteDisplay.maxConnections
     Yêu cầu: giá trị phải là 1
     """
-    print(f"\n=== Kiểm tra CIS 7.6 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_6_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "RemoteDisplay.maxConnections", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val == "1":
-            print(f"  - {vm['name']}: RemoteDisplay.maxConnections = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: RemoteDisplay.maxConnections = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.6: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_6_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.6", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_6_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_6_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.6: Set RemoteDisplay.maxConnections = 1."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.6...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "RemoteDisplay.maxConnections", "1", port, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.6.")
-        return True
-
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "RemoteDisplay.maxConnections", "1", port, key_path=key_path)
-        
-    return True
+    return _fix_vm_rule("7.6", host, username, password, port, failed_vms, key_path, selection)
 
 
-# ==================== CIS 7.21 ====================
-
 def check_7_21_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.21: Kiểm tra isolation.tools.diskShrink.disable
     Yêu cầu: giá trị phải là TRUE
     """
-    print(f"\n=== Kiểm tra CIS 7.21 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_21_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "isolation.tools.diskShrink.disable", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val.lower() == "true":
-            print(f"  - {vm['name']}: isolation.tools.diskShrink.disable = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: isolation.tools.diskShrink.disable = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.21: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_21_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.21", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_21_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_21_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.21: Set isolation.tools.diskShrink.disable = TRUE."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.21...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "isolation.tools.diskShrink.disable", "true", port, case_insensitive=True, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.21.")
-        return True
+    return _fix_vm_rule("7.21", host, username, password, port, failed_vms, key_path, selection)
 
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "isolation.tools.diskShrink.disable", "TRUE", port, key_path=key_path)
-        
-    return True
-
-
-# ==================== CIS 7.22 ====================
 
 def check_7_22_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.22: Kiểm tra isolation.tools.diskWiper.disable
     Yêu cầu: giá trị phải là TRUE
     """
-    print(f"\n=== Kiểm tra CIS 7.22 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_22_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "isolation.tools.diskWiper.disable", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val.lower() == "true":
-            print(f"  - {vm['name']}: isolation.tools.diskWiper.disable = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: isolation.tools.diskWiper.disable = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.22: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_22_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.22", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_22_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_22_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.22: Set isolation.tools.diskWiper.disable = TRUE."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.22...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "isolation.tools.diskWiper.disable", "true", port, case_insensitive=True, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.22.")
-        return True
-
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "isolation.tools.diskWiper.disable", "TRUE", port, key_path=key_path)
-        
-    return True
-
+    return _fix_vm_rule("7.22", host, username, password, port, failed_vms, key_path, selection)
 
-# ==================== CIS 7.24 ====================
 
 def check_7_24_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.24: Kiểm tra tools.guestlib.enableHostInfo
     Yêu cầu: giá trị phải là FALSE
     """
-    print(f"\n=== Kiểm tra CIS 7.24 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_24_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "tools.guestlib.enableHostInfo", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val.lower() == "false":
-            print(f"  - {vm['name']}: tools.guestlib.enableHostInfo = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: tools.guestlib.enableHostInfo = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.24: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_24_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.24", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_24_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_24_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.24: Set tools.guestlib.enableHostInfo = FALSE."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.24...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "tools.guestlib.enableHostInfo", "false", port, case_insensitive=True, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.24.")
-        return True
-
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "tools.guestlib.enableHostInfo", "FALSE", port, key_path=key_path)
-        
-    return True
+    return _fix_vm_rule("7.24", host, username, password, port, failed_vms, key_path, selection)
 
 
-# ==================== CIS 7.26 ====================
-
-VM_LOG_KEEP_OLD = "10"
-
 def check_7_26_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.26: Kiểm tra log.keepOld
     Yêu cầu: giá trị phải là 10
     """
-    print(f"\n=== Kiểm tra CIS 7.26 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_26_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "log.keepOld", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val == VM_LOG_KEEP_OLD:
-            print(f"  - {vm['name']}: log.keepOld = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: log.keepOld = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.26: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_26_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.26", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_26_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_26_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.26: Set log.keepOld = 10."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.26...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "log.keepOld", VM_LOG_KEEP_OLD, port, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.26.")
-        return True
-
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "log.keepOld", VM_LOG_KEEP_OLD, port, key_path=key_path)
-        
-    return True
-
+    return _fix_vm_rule("7.26", host, username, password, port, failed_vms, key_path, selection)
 
-# ==================== CIS 7.27 ====================
-
-VM_LOG_ROTATE_SIZE = "1000000"
 
 def check_7_27_for_host(host: str, username: str, password: str, port: int = 22, key_path: str = None) -> dict:
     """
     CIS 7.27: Kiểm tra log.rotateSize
     Yêu cầu: giá trị phải là 1000000
     """
-    print(f"\n=== Kiểm tra CIS 7.27 trên host {host} ===")
-    out = run_ssh_command(host, username, password, "vim-cmd vmsvc/getallvms", port=port, key_path=key_path)
-    vms = parse_vms_list(out)
-    
-    if not vms:
-        print(f"[{host}] Không tìm thấy máy ảo nào.")
-        return {"host": host, "cis_7_27_ok": True, "detail": {"vms": []}}
-
-    failed_vms = []
-    for vm in vms:
-        val = check_vm_setting_in_file(host, username, password, vm['path'], "log.rotateSize", port, key_path=key_path)
-        if val is None:
-            print(f"  - {vm['name']}: Không có tham số -> KHÔNG ĐẠT (cần thêm)")
-            vm['current_value'] = None
-            failed_vms.append(vm)
-        elif val == VM_LOG_ROTATE_SIZE:
-            print(f"  - {vm['name']}: log.rotateSize = {val} -> ĐẠT")
-        else:
-            print(f"  - {vm['name']}: log.rotateSize = {val} -> KHÔNG ĐẠT")
-            vm['current_value'] = val
-            failed_vms.append(vm)
-            
-    ok = (len(failed_vms) == 0)
-    print(f"[{host}] KẾT LUẬN CIS 7.27: {'ĐẠT' if ok else 'KHÔNG ĐẠT'}")
-    
-    return {"host": host, "cis_7_27_ok": ok, "detail": {"failed_vms": failed_vms}}
+    return run_rule("7.27", host, username, password, port=port, key_path=key_path)
 
 
-def fix_7_27_for_host(host, username, password, port=22, failed_vms=None, key_path=None):
+def fix_7_27_for_host(host, username, password, port=22, failed_vms=None, key_path=None, selection=None):
     """Sửa lỗi CIS 7.27: Set log.rotateSize = 1000000."""
-    print(f"[{host}] Đang sửa lỗi CIS 7.27...")
-    
-    if failed_vms is None:
-        _, failed_vms = _get_failed_vms_for_setting(host, username, password, "log.rotateSize", VM_LOG_ROTATE_SIZE, port, key_path=key_path)
-    
-    if not failed_vms:
-        print(f"[{host}] Không có VM nào cần sửa lỗi CIS 7.27.")
-        return True
+    return _fix_vm_rule("7.27", host, username, password, port, failed_vms, key_path, selection)
 
-    selected_vms = _select_vms_to_fix(host, failed_vms)
-    
-    if not selected_vms:
-        print("Không có VM nào được chọn.")
-        return False
-        
-    for vm in selected_vms:
-        print(f"   -> Đang sửa VM: {vm['name']}...")
-        fix_vm_setting(host, username, password, vm, "log.rotateSize", VM_LOG_ROTATE_SIZE, port, key_path=key_path)
-        
-    return True
+
+# ==================== Sửa gộp theo host ====================
+
+def fix_vm_sections_for_host(host, username, password, failed_vms_by_section, port=22, key_path=None,
+                             selections=None):
+    """
+    Sửa nhiều mục Section 7 trên một host cùng lúc.
+
+    failed_vms_by_section: {sec_id: failed_vms} lấy từ kết quả check. Mọi thay đổi
+    của cùng một VM được gộp: mỗi .vmx được ghi lại một lần, mỗi VM reload tối đa
+    một lần, và cả lô của host được gửi trong một lần exec.
+    selections: {sec_id: "all" | [tên VM / vmid]} để chọn VM trước, không hỏi người dùng.
+    Trả về dict {sec_id: True/False}.
+    """
+    changes = {}
+    section_vmids = {}
+    for sec_id, failed_vms in failed_vms_by_section.items():
+        setting_key, setting_value = RULES[sec_id].key, RULES[sec_id].fix_value
+        print(f"[{host}] Đang sửa lỗi CIS {sec_id}...")
+        if not failed_vms:
+            print(f"[{host}] Không có VM nào cần sửa lỗi CIS {sec_id}.")
+            section_vmids[sec_id] = []
+            continue
+        selection = (selections or {}).get(sec_id)
+        if selections is not None and selection is None:
+            print(f"[{host}] Không có lựa chọn VM cho {sec_id}, bỏ qua.")
+            continue
+        selected_vms = _select_vms_to_fix(host, failed_vms, selection)
+        if not selected_vms:
+            print("Không có VM nào được chọn.")
+            continue
+        for vm in selected_vms:
+            add_vm_change(changes, vm, setting_key, setting_value)
+        section_vmids[sec_id] = [vm["vmid"] for vm in selected_vms]
+
+    if changes:
+        print(f"[{host}] Đang ghi {len(changes)} file .vmx trong một lần gửi lệnh...")
+    status = apply_vm_changes(host, username, password, changes, port=port, key_path=key_path)
+
+    results = {sec_id: False for sec_id in failed_vms_by_section}
+    for sec_id, vmids in section_vmids.items():
+        results[sec_id] = all(status.get(vmid, False) for vmid in vmids)
+    return results
+
+
+# Chỉ danh sách VM nằm trong script đọc gộp; lệnh stat/dump .vmx phụ thuộc vào danh sách
+# này nên là lần exec thứ hai (VMX bulk read)
+register_source("vmx", get_vm_configs, scope="vm", reads=[VM_LIST_CMD],
+                fetch_vms=get_vm_configs_for, vm_reads=vm_config_reads)
+
+register_rules(
+    Rule("7.6", "vmx", key="RemoteDisplay.maxConnections",
+         expected="1", fix=fix_7_6_for_host, fix_value="1"),
+    Rule("7.21", "vmx", key="isolation.tools.diskShrink.disable",
+         comparator="ieq", expected="true", fix=fix_7_21_for_host, fix_value="TRUE"),
+    Rule("7.22", "vmx", key="isolation.tools.diskWiper.disable",
+         comparator="ieq", expected="true", fix=fix_7_22_for_host, fix_value="TRUE"),
+    Rule("7.24", "vmx", key="tools.guestlib.enableHostInfo",
+         comparator="ieq", expected="false", fix=fix_7_24_for_host, fix_value="FALSE"),
+    Rule("7.26", "vmx", key="log.keepOld",
+         expected=VM_LOG_KEEP_OLD, fix=fix_7_26_for_host, fix_value=VM_LOG_KEEP_OLD),
+    Rule("7.27", "vmx", key="log.rotateSize",
+         expected=VM_LOG_ROTATE_SIZE, fix=fix_7_27_for_host, fix_value=VM_LOG_ROTATE_SIZE),
+)
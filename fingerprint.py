@@ -0,0 +1,213 @@
+"""
+Quét delta theo dấu vân tay cấu hình (--delta)
+
+Phần lớn host không đổi cấu hình giữa hai lần quét. Với --delta, mỗi host chỉ chạy
+MỘT lệnh nhẹ (FINGERPRINT_CMD) lấy md5 của các đầu vào cấu hình:
+
+- esx.conf / configstore: advanced settings, Security.*, syslog, vSwitch / port group
+- hostd config.xml: option của hostd (MOB...)
+- vmsyslog.conf: cấu hình syslog sinh ra từ configstore
+- software: image profile (chứa acceptance level và danh sách VIB) + danh sách VIB trong
+  cơ sở dữ liệu esximg, đọc thẳng từ file thay vì chạy `esxcli software vib list` (chậm)
+- vms: danh sách VM (getallvms) + md5 của đúng các file .vmx mà getallvms trả về (file .vmx
+  ở bất kỳ đâu trên datastore; md5 nội dung, vì mtime chỉ chính xác tới giây). Output của
+  getallvms được trả về kèm và lưu vào FACT_CACHE, nguồn "vmx" không phải chạy lại lệnh này.
+
+Dấu vân tay của một mục = md5(các thành phần mà nguồn dữ liệu của mục phụ thuộc, xem
+SOURCE_INPUTS) + định nghĩa rule (key, comparator, expected). Kết quả của mục được lưu
+kèm dấu vân tay trong SQLite (<cache dir>/delta.sqlite3); lần quét sau, mục có dấu vân
+tay không đổi dùng lại kết quả cũ, chỉ các mục có đầu vào thay đổi mới được đánh giá lại.
+Kết quả lỗi không được lưu, và kết quả cũ hơn DELTA_MAX_AGE_SECONDS luôn bị đánh giá lại.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from sinks import dump_json
+from utils import run_ssh_command, shell_quote, split_plan_output, FACT_CACHE, PLAN_MARKER
+from checks.virtual_machine import VM_LIST_CMD
+from vmx_cache import get_cache_dir
+
+DELTA_CACHE_FILE = "delta.sqlite3"
+
+# Kết quả cũ hơn ngưỡng này luôn được đánh giá lại, kể cả khi dấu vân tay không đổi
+DELTA_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Thành phần dấu vân tay lấy từ file: (tên, đường dẫn trên host)
+FINGERPRINT_FILES = [
+    ("esx.conf", "/etc/vmware/esx.conf"),
+    ("configstore", "/etc/vmware/configstore/current-store-1"),
+    ("hostd", "/etc/vmware/hostd/config.xml"),
+    ("vmsyslog", "/etc/vmsyslog.conf"),
+]
+
+# Cơ sở dữ liệu image của ESXi: profiles/ giữ image profile của host, vibs/ một file mỗi VIB
+ESXIMG_DB = "/var/db/esximg"
+
+# sed lấy đường dẫn file .vmx từ các dòng của getallvms ("[datastore] thư mục/vm.vmx"),
+# cùng cách hiểu với checks.virtual_machine.parse_vms_list
+GETALLVMS_PATHS_SED = r"sed -n 's|^ *[0-9][0-9]* [^[]*\[\([^]]*\)\] *\(.*\.vmx\).*|/vmfs/volumes/\1/\2|p'"
+
+# Thành phần dấu vân tay lấy từ output lệnh: (tên, lệnh, điều kiện `test` phải đúng hoặc None).
+# Điều kiện sai (đường dẫn không tồn tại, lệnh đọc lỗi) thì thành phần có giá trị rỗng (không
+# đọc được), không phải md5 của thông báo lỗi (giá trị không đổi sẽ làm kết quả cũ luôn được
+# dùng lại). Thành phần "vms" dùng $vms / $vms_rc: output của VM_LIST_CMD, đọc một lần ở đầu script.
+FINGERPRINT_COMMANDS = [
+    ("software", f"md5sum {ESXIMG_DB}/profiles/*; ls {ESXIMG_DB}/vibs", f"-e {ESXIMG_DB}/profiles"),
+    ("vms", f'echo "$vms"; echo "$vms" | {GETALLVMS_PATHS_SED}'
+            ' | while IFS= read -r p; do md5sum "$p"; done', '"$vms_rc" = 0'),
+]
+
+# Nguồn dữ liệu (checks/rules.py) -> các thành phần dấu vân tay mà nó phụ thuộc.
+# Nguồn không có ở đây luôn được đánh giá lại.
+SOURCE_INPUTS = {
+    "software": ("software",),
+    "advanced": ("esx.conf", "configstore"),
+    "advopt": ("esx.conf", "configstore", "hostd"),
+    "syslog": ("esx.conf", "configstore", "vmsyslog"),
+    "network": ("esx.conf", "configstore"),
+    "vmx": ("vms",),
+}
+
+
+def _build_fingerprint_cmd():
+    lines = [f"vms=$({VM_LIST_CMD}); vms_rc=$?"]
+    for name, path in FINGERPRINT_FILES:
+        # File không tồn tại: md5sum không chạy, thành phần có giá trị rỗng
+        lines.append(f'echo "{name} $(md5sum 2>/dev/null < {path})"')
+    for name, cmd, condition in FINGERPRINT_COMMANDS:
+        guard = f"[ {condition} ] && " if condition else ""
+        lines.append(f'echo "{name} $({guard}{{ {cmd}; }} 2>&1 | md5sum)"')
+    # Output của getallvms (chỉ khi lệnh thành công) theo định dạng của build_plan_script
+    lines.append(f"[ \"$vms_rc\" = 0 ] && printf '\\n%s\\n%s\\n' {shell_quote(f'{PLAN_MARKER} 0')} \"$vms\"")
+    lines.append(f"printf '\\n%s\\n' {shell_quote(f'{PLAN_MARKER} end')}")
+    return "\n".join(lines)
+
+
+FINGERPRINT_CMD = _build_fingerprint_cmd()
+
+
+def parse_fingerprint(output):
+    """Parse output của FINGERPRINT_CMD thành dict {thành phần: md5} ("" nếu không đọc được)."""
+    components = {}
+    for line in output.partition(f"\n{PLAN_MARKER} ")[0].splitlines():
+        name, _, rest = line.partition(" ")
+        if name:
+            components[name] = rest.split(" ", 1)[0]
+    return components
+
+
+def get_host_fingerprint(host, username, password, port=22, key_path=None):
+    """
+    Đọc dấu vân tay cấu hình của host trong một lần exec (không qua FACT_CACHE); output
+    của getallvms đọc kèm được lưu sẵn vào FACT_CACHE.
+    """
+    out = run_ssh_command(host, username, password, FINGERPRINT_CMD, port=port, key_path=key_path)
+    vm_list = split_plan_output(out).get(0)
+    if vm_list is not None:
+        FACT_CACHE.seed(host, port, VM_LIST_CMD, vm_list)
+    return parse_fingerprint(out)
+
+
+def _rule_signature(rule):
+    """Định nghĩa rule ảnh hưởng tới kết quả; đổi yêu cầu của rule thì kết quả cũ không còn dùng được."""
+    expected = rule.expected
+    if isinstance(expected, (set, frozenset)):
+        expected = sorted(expected)
+    return f"{rule.key!r}|{rule.comparator}|{expected!r}"
+
+
+def section_digests(components, rules, rule_ids):
+    """
+    Dấu vân tay của từng mục: {rule_id: md5}, None nếu không tính được (nguồn không có
+    trong SOURCE_INPUTS, thiếu thành phần, hoặc không đọc được thành phần nào của nguồn
+    thì không thể biết cấu hình có đổi hay không).
+    """
+    digests = {}
+    for rule_id in rule_ids:
+        rule = rules[rule_id]
+        inputs = SOURCE_INPUTS.get(rule.source)
+        if (inputs is None or any(name not in components for name in inputs)
+                or not any(components[name] for name in inputs)):
+            digests[rule_id] = None
+            continue
+        text = "|".join(f"{name}={components[name]}" for name in inputs)
+        digests[rule_id] = hashlib.md5(f"{text}|{_rule_signature(rule)}".encode()).hexdigest()
+    return digests
+
+
+class DeltaStore:
+    """Kết quả lần quét trước của từng (host, mục), kèm dấu vân tay đầu vào lúc đánh giá."""
+
+    def __init__(self, db_path, max_age=DELTA_MAX_AGE_SECONDS):
+        self.db_path = db_path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " host TEXT NOT NULL,"
+                " section TEXT NOT NULL,"
+                " digest TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " ts REAL NOT NULL,"
+                " PRIMARY KEY (host, section))"
+            )
+
+    def lookup(self, host, digests):
+        """
+        So digests {rule_id: md5} với kết quả đã lưu của host.
+
+        Trả về (reused, changed): reused = {rule_id: kết quả cũ} của các mục không đổi,
+        changed = list rule_id cần đánh giá lại (giữ thứ tự của digests).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT section, digest, result, ts FROM results WHERE host = ?", (host,)
+            ).fetchall()
+        stored = {section: (digest, result, ts) for section, digest, result, ts in rows}
+
+        oldest = time.time() - self.max_age
+        reused = {}
+        changed = []
+        for rule_id, digest in digests.items():
+            entry = stored.get(rule_id)
+            if digest is not None and entry is not None and entry[0] == digest and entry[2] >= oldest:
+                reused[rule_id] = json.loads(entry[1])
+            else:
+                changed.append(rule_id)
+        return reused, changed
+
+    def store(self, host, digests, results):
+        """Lưu kết quả vừa đánh giá; mục lỗi hoặc không có dấu vân tay thì bỏ bản ghi cũ."""
+        now = time.time()
+        rows = []
+        stale = []
+        for rule_id, result in results.items():
+            digest = digests.get(rule_id)
+            if digest is None or result.get("error"):
+                stale.append((host, rule_id))
+            else:
+                rows.append((host, rule_id, digest, dump_json(result), now))
+        with self._lock, self._conn:
+            if rows:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO results (host, section, digest, result, ts) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            if stale:
+                self._conn.executemany("DELETE FROM results WHERE host = ? AND section = ?", stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_delta_store(max_age=DELTA_MAX_AGE_SECONDS):
+    """DeltaStore trong thư mục cache (CIS_CACHE_DIR, mặc định ~/.cache/cis-esxi)."""
+    return DeltaStore(os.path.join(get_cache_dir(), DELTA_CACHE_FILE), max_age=max_age)
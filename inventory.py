@@ -0,0 +1,178 @@
+"""
+Inventory cho chế độ quét fleet không tương tác
+
+Đọc danh sách host từ file JSON / YAML / CSV thay vì nhập tay từng host.
+
+JSON / YAML:
+
+    {
+        "credential_groups": {
+            "prod": {"username": "root", "password_env": "ESXI_PROD_PASSWORD"},
+            "lab": {"username": "root", "key_path": "~/.ssh/id_ed25519", "passphrase_env": "LAB_KEY_PASS"}
+        },
+        "groups": [
+            {
+                "name": "prod-core",
+                "credentials": "prod",
+                "sections": ["3.3", "3.7", "5.6"],
+                "hosts": ["10.0.0.1", {"host": "10.0.0.2", "port": 2222, "site": "dc2"}]
+            }
+        ],
+        "hosts": [{"host": "10.0.9.9", "credentials": "lab", "sections": "all"}]
+    }
+
+CSV (dòng đầu là header; sections cách nhau bởi dấu chấm phẩy hoặc khoảng trắng):
+
+    host,port,username,password_env,key_path,passphrase_env,sections,site,group
+    10.0.0.1,22,root,ESXI_PROD_PASSWORD,,,3.3;3.7,dc1,prod-core
+
+Mật khẩu nên được truyền qua biến môi trường (password_env / passphrase_env);
+khóa "password" / "passphrase" viết thẳng trong file vẫn được chấp nhận.
+"""
+
+import csv
+import json
+import os
+
+CREDENTIAL_FIELDS = ("username", "password", "password_env", "key_path", "passphrase", "passphrase_env")
+
+
+class InventoryError(ValueError):
+    """File inventory không hợp lệ."""
+
+
+def _load_document(path):
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yml", ".yaml")):
+            try:
+                import yaml
+            except ImportError:
+                raise InventoryError("Cần cài PyYAML để đọc inventory dạng YAML (pip install pyyaml)")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def _load_csv(path):
+    hosts = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+            if not row.get("host"):
+                continue
+            entry = {k: v for k, v in row.items() if v}
+            if "sections" in entry:
+                entry["sections"] = entry["sections"].replace(";", " ").replace(",", " ").split()
+            hosts.append(entry)
+    return {"hosts": hosts}
+
+
+def _parse_sections(value, available_sections, where):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if value.strip().lower() == "all":
+            return list(available_sections)
+        value = value.replace(";", " ").replace(",", " ").split()
+    sections = [str(s).strip() for s in value]
+    invalid = [s for s in sections if s not in available_sections]
+    if invalid:
+        raise InventoryError(f"{where}: section không hợp lệ: {', '.join(invalid)}")
+    return sections
+
+
+def _resolve_secret(entry, field, where):
+    """Lấy password/passphrase từ biến môi trường (<field>_env) hoặc giá trị trực tiếp."""
+    env_name = entry.get(f"{field}_env")
+    if env_name:
+        value = os.environ.get(env_name)
+        if value is None:
+            raise InventoryError(f"{where}: biến môi trường {env_name} chưa được đặt")
+        return value
+    return entry.get(field) or None
+
+
+def _build_host(entry, defaults, credential_groups, available_sections, default_sections):
+    if isinstance(entry, str):
+        entry = {"host": entry}
+    host = str(entry.get("host", "")).strip()
+    if not host:
+        raise InventoryError(f"Thiếu địa chỉ host: {entry}")
+
+    merged = dict(defaults)
+    cred_name = entry.get("credentials") or defaults.get("credentials")
+    if cred_name:
+        if cred_name not in credential_groups:
+            raise InventoryError(f"{host}: không có credential group '{cred_name}'")
+        merged.update(credential_groups[cred_name])
+    merged.update({k: v for k, v in entry.items() if v not in (None, "")})
+
+    where = f"host {host}"
+    key_path = merged.get("key_path") or None
+    if key_path:
+        # Với SSH key, 'password' của run_ssh_command là passphrase của key
+        secret = _resolve_secret(merged, "passphrase", where)
+    else:
+        secret = _resolve_secret(merged, "password", where)
+        if secret is None:
+            raise InventoryError(f"{where}: cần password / password_env hoặc key_path")
+
+    sections = _parse_sections(merged.get("sections"), available_sections, where)
+    return {
+        "host": host,
+        "port": int(merged.get("port") or 22),
+        "username": merged.get("username") or "root",
+        "password": secret,
+        "key_path": key_path,
+        "sections": sections if sections is not None else default_sections,
+        "site": merged.get("site"),
+        "group": merged.get("group"),
+    }
+
+
+def load_inventory(path, available_sections, default_sections=None):
+    """
+    Đọc inventory, trả về list host info dùng được cho run_checks / run_fixes.
+
+    Mỗi host có thêm "sections" (danh sách section riêng của host hoặc default_sections),
+    "port", "site" và "group". Host trùng lặp chỉ giữ lần xuất hiện đầu tiên.
+    """
+    path = os.path.expanduser(path)
+    try:
+        if path.endswith(".csv"):
+            doc = _load_csv(path)
+        else:
+            doc = _load_document(path)
+    except (OSError, json.JSONDecodeError) as e:
+        raise InventoryError(f"Không đọc được inventory {path}: {e}")
+
+    if isinstance(doc, list):
+        doc = {"hosts": doc}
+    if not isinstance(doc, dict):
+        raise InventoryError(f"Inventory không hợp lệ: {path}")
+
+    default_sections = list(default_sections or available_sections)
+    credential_groups = doc.get("credential_groups") or {}
+    hosts = []
+    seen = set()
+
+    def add(entry, defaults):
+        if isinstance(entry, str):
+            entry = {"host": entry}
+        key = (str(entry.get("host", "")).strip(), int(entry.get("port") or defaults.get("port") or 22))
+        if key in seen:
+            return
+        seen.add(key)
+        hosts.append(_build_host(entry, defaults, credential_groups, available_sections, default_sections))
+
+    for group in doc.get("groups") or []:
+        defaults = {k: v for k, v in group.items() if k in CREDENTIAL_FIELDS + ("credentials", "sections", "site", "port")}
+        defaults["group"] = group.get("name")
+        for entry in group.get("hosts") or []:
+            add(entry, defaults)
+
+    for entry in doc.get("hosts") or []:
+        add(entry, {})
+
+    if not hosts:
+        raise InventoryError(f"Inventory không có host nào: {path}")
+    return hosts
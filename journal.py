@@ -0,0 +1,137 @@
+"""
+Journal sửa lỗi và hoàn tác (--rollback)
+
+Trước khi gửi lệnh sửa một mục, giá trị cũ của mọi đối tượng mà lệnh đó có thể ghi
+(lấy từ detail của kết quả kiểm tra, xem Rule.undo) được ghi vào journal cùng lệnh
+hoàn tác, mỗi thay đổi một dòng JSON:
+
+    {"run_id", "ts", "host", "sections", "target", "prior", "undo"}
+
+Journal của mỗi lần chạy nằm ở <cache dir>/journal/<run_id>.jsonl. `--rollback RUN_ID`
+gom các lệnh hoàn tác của từng host (theo thứ tự ngược lại) thành MỘT script, chạy
+song song trên các host; mỗi thay đổi in '<marker> ok|fail <số thứ tự>' để báo kết quả.
+"""
+
+import json
+import os
+import threading
+import time
+
+from sinks import dump_json
+from vmx_cache import get_cache_dir
+
+JOURNAL_DIR = "journal"
+JOURNAL_SUFFIX = ".jsonl"
+
+# Dòng kết quả của từng thay đổi trong script hoàn tác (giống BATCH_MARKER trong utils)
+ROLLBACK_MARKER = "@@CIS@@"
+
+
+def get_journal_dir():
+    """Thư mục chứa journal (trong thư mục cache, đổi bằng CIS_CACHE_DIR)."""
+    return os.path.join(get_cache_dir(), JOURNAL_DIR)
+
+
+def journal_path(run_id):
+    return os.path.join(get_journal_dir(), f"{run_id}{JOURNAL_SUFFIX}")
+
+
+def list_runs():
+    """Các run_id có journal, cũ nhất trước."""
+    try:
+        names = os.listdir(get_journal_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len(JOURNAL_SUFFIX)] for name in names if name.endswith(JOURNAL_SUFFIX))
+
+
+class RemediationJournal:
+    """
+    Ghi các thay đổi của một lần sửa lỗi; mỗi dòng được flush trước khi lệnh sửa được gửi.
+
+    File được tạo mới ("x"): journal của run_id đã tồn tại thì báo lỗi (FileExistsError)
+    thay vì ghi nối, để --rollback không hoàn tác lẫn thay đổi của hai lần chạy.
+    """
+
+    def __init__(self, run_id, path=None):
+        self.run_id = run_id
+        self.path = path or journal_path(run_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.entries = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, "x", encoding="utf-8")
+
+    def record(self, host, sections, target, prior, undo):
+        """Ghi một thay đổi sắp được thực hiện trên host (host_label)."""
+        line = {
+            "run_id": self.run_id, "ts": round(time.time(), 3), "host": host,
+            "sections": list(sections), "target": target, "prior": prior, "undo": undo,
+        }
+        with self._lock:
+            self._file.write(dump_json(line) + "\n")
+            self._file.flush()
+            self.entries += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load_journal(run_id):
+    """
+    Đọc journal của run_id ("latest" = lần chạy gần nhất), trả về (run_id, {host: [entry]}).
+
+    Dòng cuối bị cắt dở (lần chạy bị dừng giữa lúc ghi) được bỏ qua.
+    """
+    if run_id == "latest":
+        runs = list_runs()
+        if not runs:
+            raise FileNotFoundError(f"Chưa có journal nào trong {get_journal_dir()}")
+        run_id = runs[-1]
+    entries = {}
+    with open(journal_path(run_id), encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries.setdefault(entry["host"], []).append(entry)
+    return run_id, entries
+
+
+def build_rollback_script(entries):
+    """
+    Script hoàn tác các thay đổi của một host: lệnh hoàn tác chạy theo thứ tự ngược với
+    lúc sửa, mỗi lệnh trong subshell riêng; lệnh lỗi không dừng các lệnh sau.
+    """
+    lines = []
+    for i in reversed(range(len(entries))):
+        lines.append(f"if (\n{entries[i]['undo']}\n) > /dev/null 2>&1;"
+                     f" then echo '{ROLLBACK_MARKER} ok {i}'; else echo '{ROLLBACK_MARKER} fail {i}'; fi")
+    return "\n".join(lines)
+
+
+def parse_rollback_output(output, count):
+    """{số thứ tự thay đổi: True/False}; thay đổi không có dòng kết quả coi như lỗi."""
+    status = {i: False for i in range(count)}
+    prefix = ROLLBACK_MARKER + " "
+    for line in output.splitlines():
+        if line.startswith(prefix):
+            parts = line[len(prefix):].split()
+            if len(parts) == 2 and parts[1].isdigit() and int(parts[1]) in status:
+                status[int(parts[1])] = parts[0] == "ok"
+    return status
+
+
+def rollback_host(creds, entries):
+    """Hoàn tác các thay đổi của một host trong một lần exec, trả về {số thứ tự: True/False}."""
+    from utils import run_ssh_command, invalidate_ssh_reads
+
+    port = creds.get("port", 22)
+    try:
+        out = run_ssh_command(creds["host"], creds["username"], creds["password"], build_rollback_script(entries),
+                              port=port, key_path=creds.get("key_path"))
+    finally:
+        # Script hoàn tác ghi qua các lệnh không có trong bảng topic của FACT_CACHE
+        invalidate_ssh_reads(creds["host"], port)
+    return parse_rollback_output(out, len(entries))
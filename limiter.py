@@ -0,0 +1,230 @@
+"""
+Giới hạn đồng thời thích ứng (AIMD) cho lệnh SSH
+
+Mỗi lệnh SSH (utils._exec_ssh_command) phải lấy slot ở các giới hạn sau, từ hẹp tới rộng
+(thứ tự cố định nên không deadlock):
+
+- hostd của host: chỉ lệnh đi qua hostd (`vim-cmd`: advopt, getallvms, reload...)
+- host: mọi lệnh của host
+- site: mọi lệnh của các host cùng `site` trong inventory (host không có site thì bỏ qua)
+- toàn cục: trần cố định cho lệnh hostd và cho mọi lệnh của cả lần chạy (--max-inflight)
+
+Giới hạn hostd / host / site tự điều chỉnh kiểu AIMD theo độ trễ:
+- lệnh xong bình thường: giới hạn += AIMD_INCREASE / giới hạn (~ +1 sau mỗi "cửa sổ" lệnh)
+- lệnh chậm bất thường hoặc lỗi: giới hạn *= AIMD_DECREASE, tối đa một lần cho mỗi lớp
+  lệnh đang chạy (lệnh bắt đầu trước lần giảm gần nhất không làm giảm tiếp); lệnh vim-cmd
+  chậm chỉ làm giảm giới hạn hostd
+
+"Chậm bất thường" được so với baseline của chính host và loại lệnh đó (utils.command_kind):
+baseline bám theo độ trễ nhỏ nhất, trôi lên chậm để theo kịp thay đổi thật; lệnh chậm hơn
+baseline * LATENCY_TOLERANCE + LATENCY_SLACK_SECONDS là dấu hiệu host (hoặc hostd) đang quá tải.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+# Giới hạn lệnh đồng thời: (ban đầu, nhỏ nhất, lớn nhất).
+# Host không vượt MAX_CHANNELS_PER_HOST của utils (sshd của ESXi: MaxSessions = 10).
+HOST_LIMITS = (4, 1, 8)
+HOSTD_LIMITS = (2, 1, 4)
+SITE_LIMITS = (32, 4, 256)
+
+# Trần cố định cho cả lần chạy
+GLOBAL_MAX_INFLIGHT = 256
+GLOBAL_MAX_HOSTD_INFLIGHT = 128
+
+AIMD_INCREASE = 1.0
+AIMD_DECREASE = 0.5
+
+LATENCY_TOLERANCE = 2.0
+LATENCY_SLACK_SECONDS = 0.05
+# Baseline tăng tối đa chừng này (tỉ lệ) sau mỗi lệnh chậm hơn nó
+BASELINE_DRIFT = 0.02
+
+
+def uses_hostd(command):
+    """Lệnh có đi qua hostd không (vim-cmd)."""
+    return "vim-cmd" in command
+
+
+class AIMDLimiter:
+    """Giới hạn số lệnh đồng thời của một phạm vi; adaptive=False thì giữ cố định ở maximum."""
+
+    def __init__(self, scope, initial, minimum, maximum, adaptive=True):
+        self.scope = scope
+        self.minimum = minimum
+        self.maximum = maximum
+        self.adaptive = adaptive
+        self.limit = float(initial if adaptive else maximum)
+        self.inflight = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Chờ tới khi có slot; trả về số giây đã chờ."""
+        started = time.monotonic()
+        with self._cond:
+            while self.inflight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.inflight += 1
+        return time.monotonic() - started
+
+    def release(self, started=None, congested=False):
+        """
+        Trả slot của lệnh bắt đầu lúc started (time.monotonic) và điều chỉnh giới hạn theo
+        congested; started=None (lệnh không chạy) thì không điều chỉnh.
+        """
+        with self._cond:
+            self.inflight -= 1
+            if self.adaptive and started is not None:
+                if not congested:
+                    self.limit = min(self.maximum, self.limit + AIMD_INCREASE / self.limit)
+                elif started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * AIMD_DECREASE)
+                    self._last_decrease = time.monotonic()
+                    self.decreases += 1
+                    METRICS.inc("cis_limiter_decreases_total", scope=self.scope)
+            self._cond.notify_all()
+
+    def set_fixed(self, maximum):
+        with self._cond:
+            self.maximum = maximum
+            self.limit = float(maximum)
+            self.adaptive = False
+            self._cond.notify_all()
+
+
+class ConcurrencyLimiter:
+    """Registry các giới hạn theo host / hostd / site và trần toàn cục (xem đầu module)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.adaptive = True
+        self._hosts = {}
+        self._hostd = {}
+        self._sites = {}
+        self._site_of = {}
+        self._baselines = {}
+        self.global_limit = AIMDLimiter("global", GLOBAL_MAX_INFLIGHT, GLOBAL_MAX_INFLIGHT,
+                                        GLOBAL_MAX_INFLIGHT, adaptive=False)
+        self.global_hostd = AIMDLimiter("global_hostd", GLOBAL_MAX_HOSTD_INFLIGHT, GLOBAL_MAX_HOSTD_INFLIGHT,
+                                        GLOBAL_MAX_HOSTD_INFLIGHT, adaptive=False)
+
+    def configure(self, max_inflight=None, max_hostd_inflight=None, adaptive=None):
+        """Đổi trần toàn cục; adaptive=False giữ mọi giới hạn ở mức lớn nhất (không tự điều chỉnh)."""
+        if max_inflight is not None:
+            self.global_limit.set_fixed(max_inflight)
+        if max_hostd_inflight is not None:
+            self.global_hostd.set_fixed(max_hostd_inflight)
+        if adaptive is not None:
+            with self._lock:
+                self.adaptive = adaptive
+                limiters = [*self._hosts.values(), *self._hostd.values(), *self._sites.values()]
+            if not adaptive:
+                for limiter in limiters:
+                    limiter.set_fixed(limiter.maximum)
+
+    def assign_site(self, host, port, site):
+        """Gắn host vào site (từ inventory) để dùng chung giới hạn của site."""
+        with self._lock:
+            if site:
+                self._site_of[(host, port)] = site
+            else:
+                self._site_of.pop((host, port), None)
+
+    def _limiter(self, table, key, scope, limits):
+        with self._lock:
+            limiter = table.get(key)
+            if limiter is None:
+                limiter = table[key] = AIMDLimiter(scope, *limits, adaptive=self.adaptive)
+            return limiter
+
+    def limiters_for(self, host, port, command):
+        """Các giới hạn mà lệnh phải qua, từ hẹp tới rộng."""
+        chain = []
+        hostd = uses_hostd(command)
+        if hostd:
+            chain.append(self._limiter(self._hostd, (host, port), "hostd", HOSTD_LIMITS))
+        chain.append(self._limiter(self._hosts, (host, port), "host", HOST_LIMITS))
+        site = self._site_of.get((host, port))
+        if site is not None:
+            chain.append(self._limiter(self._sites, site, "site", SITE_LIMITS))
+        if hostd:
+            chain.append(self.global_hostd)
+        chain.append(self.global_limit)
+        return chain
+
+    def is_congested(self, host, port, kind, latency):
+        """So độ trễ với baseline của (host, loại lệnh), cập nhật baseline."""
+        key = (host, port, kind)
+        with self._lock:
+            baseline = self._baselines.get(key)
+            if baseline is None or latency < baseline:
+                self._baselines[key] = latency
+                return False
+            self._baselines[key] = min(latency, baseline * (1 + BASELINE_DRIFT))
+        return latency > baseline * LATENCY_TOLERANCE + LATENCY_SLACK_SECONDS
+
+    @contextmanager
+    def command(self, host, port, command, kind):
+        """Giữ slot ở mọi giới hạn của lệnh trong khi chạy; lỗi hoặc độ trễ bất thường làm giảm giới hạn."""
+        chain = self.limiters_for(host, port, command)
+        acquired = []
+        waited = 0.0
+        try:
+            for limiter in chain:
+                waited += limiter.acquire()
+                acquired.append(limiter)
+            METRICS.observe("cis_limiter_wait_seconds", waited, scope="hostd" if uses_hostd(command) else "host")
+            started = time.monotonic()
+            ok = False
+            try:
+                yield
+                ok = True
+            finally:
+                latency = time.monotonic() - started
+                slow = ok and self.is_congested(host, port, kind, latency)
+                for limiter in acquired:
+                    if slow and chain[0].scope == "hostd" and limiter is not chain[0]:
+                        # Lệnh vim-cmd chậm là do hostd: chỉ giảm giới hạn hostd, các giới hạn
+                        # rộng hơn giữ nguyên để lệnh esxcli / đọc file không bị chậm theo
+                        limiter.release()
+                    else:
+                        limiter.release(started, slow or not ok)
+                acquired = []
+        finally:
+            # Lỗi khi đang chờ slot (ví dụ KeyboardInterrupt): trả các slot đã lấy
+            for limiter in acquired:
+                limiter.release()
+
+    def stats(self):
+        """Giới hạn hiện tại và số lần giảm theo phạm vi: {scope: {count, decreases, min_limit, max_limit}}."""
+        with self._lock:
+            groups = {"host": list(self._hosts.values()), "hostd": list(self._hostd.values()),
+                      "site": list(self._sites.values())}
+        stats = {}
+        for scope, limiters in groups.items():
+            if not limiters:
+                continue
+            limits = [limiter.limit for limiter in limiters]
+            stats[scope] = {
+                "count": len(limiters),
+                "decreases": sum(limiter.decreases for limiter in limiters),
+                "min_limit": round(min(limits), 2),
+                "max_limit": round(max(limits), 2),
+            }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+            self._hostd.clear()
+            self._sites.clear()
+            self._baselines.clear()
+
+
+LIMITER = ConcurrencyLimiter()
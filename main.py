@@ -5,118 +5,55 @@ Main entry point - kết nối tất cả các module kiểm tra
 
 import sys
 import os
+import argparse
 import getpass
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # Thêm thư mục gốc vào path để import được các module
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-AVAILABLE_SECTIONS = [
-    "2.4", "2.10",                          # Base
-    "3.3", "3.7", "3.8", "3.9", "3.12", "3.13",  # Management
-    "4.2",                                   # Logging
-    "5.6", "5.7", "5.8", "5.9", "5.10",      # Network
-    "7.6", "7.21", "7.22", "7.24", "7.26", "7.27"  # Virtual Machine
-]
-
-from checks import (
-    # Base checks (Section 2)
-    check_2_4_for_host, fix_2_4_for_host,
-    check_2_10_for_host, fix_2_10_for_host,
-    # Management checks (Section 3)
-    check_3_3_for_host, fix_3_3_for_host,
-    check_3_7_for_host, fix_3_7_for_host,
-    check_3_8_for_host, fix_3_8_for_host,
-    check_3_9_for_host, fix_3_9_for_host,
-    check_3_12_for_host, fix_3_12_for_host,
-    check_3_13_for_host, fix_3_13_for_host,
-    # Logging checks (Section 4)
-    check_4_2_for_host, fix_4_2_for_host,
-    # Network checks (Section 5)
-    check_5_6_for_host, fix_5_6_for_host,
-    check_5_7_for_host, fix_5_7_for_host,
-    check_5_8_for_host, fix_5_8_for_host,
-    check_5_9_and_5_10_for_host, fix_5_9_and_5_10_for_host,
-    # Virtual Machine checks (Section 7)
-    check_7_6_for_host, fix_7_6_for_host,
-    check_7_21_for_host, fix_7_21_for_host,
-    check_7_22_for_host, fix_7_22_for_host,
-    check_7_24_for_host, fix_7_24_for_host,
-    check_7_26_for_host, fix_7_26_for_host,
-    check_7_27_for_host, fix_7_27_for_host,
+import checks
+from limiter import LIMITER, GLOBAL_MAX_INFLIGHT
+from metrics import METRICS
+from answers import (
+    load_answers, parse_vlan_args, merge_answers, answers_for_host, vm_selection, missing_answers,
 )
+from inventory import load_inventory
+from results import ResultMatrix
+from sinks import SummarySink, MultiSink, open_sinks, new_run_id
 
+# Số host được kiểm tra song song tối đa
+DEFAULT_MAX_WORKERS = 10
 
-# Mapping từ section ID sang check function
-CHECK_FUNCS = {
-    "2.4": check_2_4_for_host,
-    "2.10": check_2_10_for_host,
-    "3.3": check_3_3_for_host,
-    "3.7": check_3_7_for_host,
-    "3.8": check_3_8_for_host,
-    "3.9": check_3_9_for_host,
-    "3.12": check_3_12_for_host,
-    "3.13": check_3_13_for_host,
-    "4.2": check_4_2_for_host,
-    "5.6": check_5_6_for_host,
-    "5.7": check_5_7_for_host,
-    "5.8": check_5_8_for_host,
-    "5.9": check_5_9_and_5_10_for_host,
-    "5.10": check_5_9_and_5_10_for_host,
-    "7.6": check_7_6_for_host,
-    "7.21": check_7_21_for_host,
-    "7.22": check_7_22_for_host,
-    "7.24": check_7_24_for_host,
-    "7.26": check_7_26_for_host,
-    "7.27": check_7_27_for_host,
-}
-
-# Mapping từ section ID sang fix function
-FIX_FUNCS = {
-    "2.4": fix_2_4_for_host,
-    "2.10": fix_2_10_for_host,
-    "3.3": fix_3_3_for_host,
-    "3.7": fix_3_7_for_host,
-    "3.8": fix_3_8_for_host,
-    "3.9": fix_3_9_for_host,
-    "3.12": fix_3_12_for_host,
-    "3.13": fix_3_13_for_host,
-    "4.2": fix_4_2_for_host,
-    "5.6": fix_5_6_for_host,
-    "5.7": fix_5_7_for_host,
-    "5.8": fix_5_8_for_host,
-    "5.9": fix_5_9_and_5_10_for_host,
-    "5.10": fix_5_9_and_5_10_for_host,
-    "7.6": fix_7_6_for_host,
-    "7.21": fix_7_21_for_host,
-    "7.22": fix_7_22_for_host,
-    "7.24": fix_7_24_for_host,
-    "7.26": fix_7_26_for_host,
-    "7.27": fix_7_27_for_host,
-}
-
-# Mapping từ section ID sang result key
-RESULT_KEYS = {
-    "2.4": "cis_2_4_ok",
-    "2.10": "cis_2_10_ok",
-    "3.3": "cis_3_3_ok",
-    "3.7": "cis_3_7_ok",
-    "3.8": "cis_3_8_ok",
-    "3.9": "cis_3_9_ok",
-    "3.12": "cis_3_12_ok",
-    "3.13": "cis_3_13_ok",
-    "4.2": "cis_4_2_ok",
-    "5.6": "cis_5_6_ok",
-    "5.7": "cis_5_7_ok",
-    "5.8": "cis_5_8_ok",
-    "5.9": "cis_5_9_and_5_10_ok",
-    "5.10": "cis_5_9_and_5_10_ok",
-    "7.6": "cis_7_6_ok",
-    "7.21": "cis_7_21_ok",
-    "7.22": "cis_7_22_ok",
-    "7.24": "cis_7_24_ok",
-    "7.26": "cis_7_26_ok",
-    "7.27": "cis_7_27_ok",
-}
+# Mã thoát cho chế độ không tương tác
+EXIT_OK = 0          # mọi mục đều ĐẠT
+EXIT_FAILED = 1      # có mục KHÔNG ĐẠT
+EXIT_ERROR = 2       # có host/mục không kiểm tra được, hoặc lỗi tham số/inventory
+
+# Chỉ nạp danh mục (không import paramiko / code kiểm tra); module của một mục chỉ
+# được import khi mục đó được chạy (checks.load_rules)
+from checks.catalog import CATALOG, section_sort_key, result_keys, load_rules, format_section_menu
+
+# Các mục được hỗ trợ, theo thứ tự trong danh mục (checks/catalog.py)
+AVAILABLE_SECTIONS = list(CATALOG)
+
+# Trạng thái trong báo cáo sửa lỗi cho biết lệnh sửa đã được gửi tới host (cần kiểm tra lại)
+FIX_ATTEMPTED = ("ĐÃ SỬA", "CHƯA SỬA HẾT", "LỖI")
+
+
+def parse_sections(text, available_sections):
+    """Tách chuỗi section (cách nhau bởi dấu phẩy/khoảng trắng), bỏ qua mục không hợp lệ."""
+    sections = set()
+    for c in text.replace(",", " ").split():
+        c = c.strip()
+        if c in available_sections:
+            sections.add(c)
+        else:
+            print(f"Bỏ qua lựa chọn không hợp lệ: {c}")
+    return sections
 
 
 def get_user_sections(available_sections):
@@ -124,31 +61,8 @@ def get_user_sections(available_sections):
     print("\n" + "=" * 60)
     print("CÁC PHẦN KIỂM TRA KHẢ DỤNG:")
     print("=" * 60)
-    print("\n[BASE - Phần 2]")
-    print("  2.4  - Host image profile acceptance level")
-    print("  2.10 - Mem.ShareForceSalting")
-    print("\n[MANAGEMENT - Phần 3]")
-    print("  3.3  - Disable Managed Object Browser (MOB)")
-    print("  3.7  - DCUI timeout")
-    print("  3.8  - ESXi Shell Interactive Timeout")
-    print("  3.9  - ESXi Shell Timeout")
-    print("  3.12 - Account Lock Failures")
-    print("  3.13 - Account Unlock Time")
-    print("\n[LOGGING - Phần 4]")
-    print("  4.2  - Remote Syslog")
-    print("\n[NETWORK - Phần 5]")
-    print("  5.6  - Reject Forged Transmits")
-    print("  5.7  - Reject MAC Address Changes")
-    print("  5.8  - Reject Promiscuous Mode")
-    print("  5.9  - VLAN Configuration (không dùng VLAN 1)")
-    print("  5.10 - VLAN Configuration (không dùng VLAN 4095)")
-    print("\n[VIRTUAL MACHINE - Phần 7]")
-    print("  7.6  - RemoteDisplay.maxConnections")
-    print("  7.21 - Disable disk shrinking")
-    print("  7.22 - Disable disk wiping")
-    print("  7.24 - Disable host info to guest")
-    print("  7.26 - Log keepOld")
-    print("  7.27 - Log rotateSize")
+    print()
+    print("\n".join(format_section_menu(available_sections)))
     print("=" * 60)
     
     print("\nChọn các phần kiểm tra (cách nhau bởi dấu phẩy/khoảng trắng)")
@@ -158,15 +72,7 @@ def get_user_sections(available_sections):
     if not choice_input:
         return available_sections.copy()
     
-    choices = choice_input.replace(",", " ").split()
-    sections_to_run = set()
-    
-    for c in choices:
-        c = c.strip()
-        if c in available_sections:
-            sections_to_run.add(c)
-        else:
-            print(f"Bỏ qua lựa chọn không hợp lệ: {c}")
+    sections_to_run = parse_sections(choice_input, available_sections)
             
     if not sections_to_run:
         print("Không có lựa chọn hợp lệ. Mặc định chạy tất cả.")
@@ -175,28 +81,150 @@ def get_user_sections(available_sections):
     return sections_to_run
 
 
-def run_checks(hosts, sections_to_run):
-    """Chạy kiểm tra trên tất cả các hosts."""
-    all_results = {}
-    
+def host_label(info):
+    """Tên host dùng làm khóa kết quả; kèm port nếu không phải 22 để các host cùng IP không trùng."""
+    port = info.get("port", 22)
+    return info["host"] if port == 22 else f"{info['host']}:{port}"
+
+
+def assign_sites(hosts):
+    """Gắn các host có `site` (inventory) vào giới hạn đồng thời chung của site."""
     for info in hosts:
-        host = info["host"]
-        all_results[host] = {}
-        
-        print(f"\n{'=' * 60}")
-        print(f"KIỂM TRA HOST: {host}")
-        print('=' * 60)
-        
-        for sec_id in sorted(sections_to_run, key=lambda x: [int(n) for n in x.split('.')]):
-            if sec_id in CHECK_FUNCS:
-                # Với 5.9 và 5.10, chúng dùng chung 1 function
-                if sec_id == "5.10" and "5.9" in all_results[host]:
-                    all_results[host]["5.10"] = all_results[host]["5.9"]
-                    continue
-                    
-                res = CHECK_FUNCS[sec_id](host, info["username"], info["password"], key_path=info.get("key_path"))
-                all_results[host][sec_id] = res
-    
+        LIMITER.assign_site(info["host"], info.get("port", 22), info.get("site"))
+
+
+def run_checks_for_host(info, sections_to_run, max_channels=None, delta=None):
+    """
+    Chạy các section cần kiểm tra trên một host, trả về dict {sec_id: result}.
+    Nếu info có "sections" (từ inventory) thì dùng danh sách đó thay cho sections_to_run.
+
+    Các rule được gom theo nguồn dữ liệu: mỗi nguồn đọc một lần, các nguồn độc lập
+    đọc đồng thời trên các exec channel của cùng một kết nối SSH (tối đa max_channels),
+    rồi mọi rule của nguồn được đánh giá trên cùng bản chụp.
+
+    delta (fingerprint.DeltaStore, --delta): mục có dấu vân tay đầu vào không đổi so với
+    lần quét trước dùng lại kết quả đã lưu, chỉ các mục còn lại được đánh giá.
+    """
+    host = host_label(info)
+    sections_to_run = info.get("sections") or sections_to_run
+
+    print(f"\n{'=' * 60}")
+    print(f"KIỂM TRA HOST: {host}")
+    print('=' * 60)
+
+    rule_ids = [sec_id for sec_id in sections_to_run if sec_id in CATALOG]
+    if max_channels is None:
+        from utils import MAX_CHANNELS_PER_HOST
+        max_channels = MAX_CHANNELS_PER_HOST
+    started = time.perf_counter()
+    try:
+        rules = load_rules(rule_ids)
+        digests, reused = None, {}
+        if delta is not None:
+            digests, reused, rule_ids = plan_delta(delta, info, rules, rule_ids)
+        results = {}
+        if rule_ids:
+            results = checks.evaluate_rules(info["host"], info["username"], info["password"], rule_ids,
+                                            port=info.get("port", 22), key_path=info.get("key_path"),
+                                            max_workers=max_channels)
+        if digests is not None:
+            delta.store(host, digests, results)
+        if not reused:
+            return results
+        results.update(reused)
+        return {sec_id: results[sec_id] for sec_id in sorted(results, key=section_sort_key)}
+    finally:
+        METRICS.set("cis_host_check_seconds", time.perf_counter() - started, host=host)
+
+
+def plan_delta(delta, info, rules, rule_ids):
+    """
+    Đọc dấu vân tay cấu hình của host và so với lần quét trước.
+
+    Trả về (digests, reused, changed): digests để lưu kết quả mới, reused = kết quả cũ
+    của các mục không đổi, changed = các mục cần đánh giá. Không đọc được dấu vân tay
+    thì kiểm tra toàn bộ (digests = None).
+    """
+    from fingerprint import get_host_fingerprint, section_digests
+
+    host = host_label(info)
+    try:
+        components = get_host_fingerprint(info["host"], info["username"], info["password"],
+                                          port=info.get("port", 22), key_path=info.get("key_path"))
+    except Exception as e:
+        print(f"[{host}] CẢNH BÁO: không đọc được dấu vân tay cấu hình, kiểm tra toàn bộ: {e}")
+        return None, {}, rule_ids
+
+    digests = section_digests(components, rules, rule_ids)
+    reused, changed = delta.lookup(host, digests)
+    METRICS.inc("cis_delta_sections_total", len(reused), state="reused")
+    METRICS.inc("cis_delta_sections_total", len(changed), state="evaluated")
+    if not changed:
+        METRICS.inc("cis_delta_hosts_unchanged_total")
+    print(f"[{host}] Delta: {len(reused)} mục không đổi (dùng lại kết quả trước), {len(changed)} mục đánh giá lại")
+    return digests, reused, changed
+
+
+def new_result_matrix():
+    """ResultMatrix rỗng với một cột cho mỗi mục được hỗ trợ."""
+    return ResultMatrix(AVAILABLE_SECTIONS, result_keys())
+
+
+def run_checks(hosts, sections_to_run, max_workers=DEFAULT_MAX_WORKERS, sink=None, keep_results=True,
+               delta=None):
+    """
+    Chạy kiểm tra trên tất cả các hosts, trả về ResultMatrix ({host: {sec_id: result}}).
+
+    Mỗi host là một job độc lập, chạy song song với tối đa max_workers host cùng lúc.
+    Lỗi của một host không ảnh hưởng các host khác. Kết quả của host được nén vào
+    ma trận ngay khi host xong, nên bộ nhớ không phụ thuộc số VM của từng host.
+
+    sink (xem sinks.py) nhận kết quả của từng host ngay khi host đó xong. Với
+    keep_results=False kết quả chỉ đi vào sink, ma trận trả về rỗng, và chỉ có tối đa
+    2 * max_workers host đang chờ cùng lúc nên bộ nhớ không tăng theo số host.
+
+    delta: xem run_checks_for_host.
+    """
+    all_results = new_result_matrix()
+    if keep_results:
+        for info in hosts:
+            all_results.add_host(host_label(info))
+    max_workers = max(1, min(max_workers, len(hosts) or 1))
+
+    def host_done(future, info):
+        host = host_label(info)
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"[{host}] LỖI khi kiểm tra host: {e}")
+            results = {
+                sec_id: checks.error_result(info["host"], sec_id, e)
+                for sec_id in (info.get("sections") or sections_to_run) if sec_id in CATALOG
+            }
+        if sink is not None:
+            sink.write_host(host, results)
+        if keep_results:
+            all_results[host] = results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if keep_results:
+            futures = {
+                executor.submit(run_checks_for_host, info, sections_to_run, delta=delta): info
+                for info in hosts
+            }
+            for future in as_completed(futures):
+                host_done(future, futures[future])
+        else:
+            pending = {}
+            for info in hosts:
+                pending[executor.submit(run_checks_for_host, info, sections_to_run, delta=delta)] = info
+                if len(pending) >= 2 * max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        host_done(future, pending.pop(future))
+            for future in as_completed(pending):
+                host_done(future, pending[future])
+
     return all_results
 
 
@@ -210,12 +238,16 @@ def display_summary(all_results):
     
     for host, sections in all_results.items():
         print(f"\nHOST: {host}")
-        sorted_sections = sorted(sections.keys(), key=lambda x: [int(n) for n in x.split('.')])
+        sorted_sections = sorted(sections.keys(), key=section_sort_key)
         
         for sec_id in sorted_sections:
             data = sections[sec_id]
-            result_key = RESULT_KEYS.get(sec_id)
+            result_key = CATALOG[sec_id].result_key
             
+            if data.get("error"):
+                print(f"  - {sec_id}: LỖI ({data['error']})")
+                continue
+
             if result_key and result_key in data:
                 is_ok = data[result_key]
                 status_str = "ĐẠT" if is_ok else "KHÔNG ĐẠT"
@@ -223,34 +255,452 @@ def display_summary(all_results):
                 
                 if not is_ok:
                     failed_checks.append((host, sec_id))
+
+    if isinstance(all_results, ResultMatrix) and len(all_results) > 1:
+        display_fleet_summary(all_results)
     
     return failed_checks
 
 
-def run_fixes(hosts, all_results, failed_checks, sections_to_fix):
-    """Chạy sửa lỗi cho các mục không đạt."""
+def display_fleet_summary(matrix, top=10):
+    """Tổng hợp toàn fleet: tỉ lệ KHÔNG ĐẠT theo mục và các host tệ nhất."""
+    print("\n" + "-" * 60)
+    print(f"TỔNG HỢP FLEET ({len(matrix)} host)")
+    print("-" * 60)
+    for sec_id, rate in matrix.section_failure_rates().items():
+        print(f"  - {sec_id}: {rate['failed']}/{rate['checked']} KHÔNG ĐẠT "
+              f"({rate['failure_rate']:.1%}), {rate['error']} LỖI")
+    worst = matrix.worst_hosts(top)
+    if worst:
+        print("\nHost nhiều mục KHÔNG ĐẠT nhất:")
+        for host, failed, error in worst:
+            print(f"  - {host}: {failed} KHÔNG ĐẠT, {error} LỖI")
+
+
+def record_undo(journal, host, sec_ids, changes):
+    """Ghi các thay đổi sắp thực hiện vào journal (trước khi gửi lệnh sửa)."""
+    if not changes:
+        print(f"[{host}] CẢNH BÁO: không có giá trị cũ của {', '.join(sec_ids)}, thay đổi sẽ không hoàn tác được.")
+    for target, prior, undo in changes:
+        journal.record(host, sec_ids, target, prior, undo)
+
+
+def fix_host(creds, sec_ids, all_results, host_answers=None, journal=None):
+    """
+    Sửa các mục sec_ids trên một host, trả về báo cáo {sec_id: trạng thái}.
+
+    host_answers (xem answers.py) cung cấp trước mọi quyết định; khi đó không có
+    bước nào hỏi người dùng và mục nào thiếu câu trả lời sẽ bị bỏ qua.
+    journal (journal.RemediationJournal): giá trị cũ và lệnh hoàn tác của mỗi thay đổi
+    được ghi vào đó trước khi lệnh sửa được gửi.
+    """
+    host = host_label(creds)
+    port = creds.get("port", 22)
+    report = {}
+    done = {}
+    vm_sections = {}
+    rules = load_rules(sec_ids)
+
+    for sec_id in sorted(sec_ids, key=section_sort_key):
+        rule = rules.get(sec_id)
+        if rule is None or rule.fix is None:
+            print(f"[{host}] Mục {sec_id} chưa có script tự động sửa.")
+            report[sec_id] = "CHƯA HỖ TRỢ"
+            continue
+
+        detail = all_results.get(host, {}).get(sec_id, {}).get("detail", {})
+        if host_answers is not None:
+            missing = missing_answers(host_answers, sec_id, detail)
+            if missing:
+                print(f"[{host}] Bỏ qua {sec_id}: {missing}.")
+                report[sec_id] = f"BỎ QUA ({missing})"
+                continue
+
+        # Với các mục 7.x, gom danh sách failed_vms để sửa gộp theo host
+        if rule.per_vm:
+            vm_sections[sec_id] = detail.get("failed_vms")
+            continue
+
+        # Các mục dùng chung hàm sửa chỉ sửa một lần
+        func = rule.fix
+        if func in done:
+            report[sec_id] = report[done[func]]
+            continue
+        done[func] = sec_id
+
+        kwargs = {}
+        if host_answers is not None:
+            if sec_id == "4.2":
+                kwargs["loghost"] = host_answers["syslog_host"]
+            elif sec_id in ("5.9", "5.10"):
+                kwargs["vlan_map"] = host_answers.get("vlan") or {}
+        if journal is not None:
+            record_undo(journal, host, [sec_id], rule.undo(rule, detail) if rule.undo else [])
+        try:
+            ok = func(creds["host"], creds["username"], creds["password"], port=port,
+                      key_path=creds.get("key_path"), **kwargs)
+            report[sec_id] = "ĐÃ SỬA" if ok is not False else "CHƯA SỬA HẾT"
+            print(f"   -> Đã gửi lệnh sửa cho {sec_id} trên {host}.")
+        except Exception as e:
+            print(f"   -> LỖI khi sửa {sec_id} trên {host}: {e}")
+            report[sec_id] = f"LỖI ({e})"
+
+    if vm_sections:
+        selections = None
+        if host_answers is not None:
+            selections = {sec_id: vm_selection(host_answers, sec_id) for sec_id in vm_sections}
+        if journal is not None:
+            for vm_sec_ids, target, prior, undo in checks.undo_vm_sections(vm_sections):
+                journal.record(host, vm_sec_ids, target, prior, undo)
+        try:
+            results = checks.fix_vm_sections_for_host(creds["host"], creds["username"], creds["password"], vm_sections,
+                                               port=port, key_path=creds.get("key_path"), selections=selections)
+            for sec_id, ok in results.items():
+                if ok:
+                    print(f"   -> Đã gửi lệnh sửa cho {sec_id} trên {host}.")
+                else:
+                    print(f"   -> Chưa sửa được {sec_id} trên {host}.")
+                report[sec_id] = "ĐÃ SỬA" if ok else "CHƯA SỬA HẾT"
+        except Exception as e:
+            print(f"   -> LỖI khi sửa {', '.join(vm_sections)} trên {host}: {e}")
+            for sec_id in vm_sections:
+                report[sec_id] = f"LỖI ({e})"
+
+    return {sec_id: report[sec_id] for sec_id in sorted(report, key=section_sort_key)}
+
+
+def run_fixes(hosts, all_results, failed_checks, sections_to_fix, answers=None, max_workers=DEFAULT_MAX_WORKERS,
+              journal=None):
+    """
+    Chạy sửa lỗi cho các mục không đạt, trả về báo cáo {host: {sec_id: trạng thái}}.
+
+    - Không có answers: sửa lần lượt từng host, hỏi người dùng khi cần.
+    - Có answers: mọi quyết định đã có sẵn nên các host được sửa song song
+      (tối đa max_workers host cùng lúc).
+    Các mục 7.x của cùng một host được gộp lại: mỗi VM chỉ ghi .vmx và reload một lần.
+    journal: xem fix_host.
+    """
     print("\n>>> TIẾN HÀNH SỬA LỖI...\n")
-    
+
+    creds_by_host = {host_label(h): h for h in hosts}
+    work = {}
     for host, sec_id in failed_checks:
-        if sec_id in sections_to_fix:
-            if sec_id in FIX_FUNCS:
-                func = FIX_FUNCS[sec_id]
-                creds = next((h for h in hosts if h["host"] == host), None)
-                
-                if creds:
-                    try:
-                        key_path = creds.get("key_path")
-                        # Với các mục 7.x, truyền thêm danh sách failed_vms
-                        if sec_id.startswith("7.") and host in all_results and sec_id in all_results[host]:
-                            failed_vms = all_results[host][sec_id].get("detail", {}).get("failed_vms", None)
-                            func(host, creds["username"], creds["password"], failed_vms=failed_vms, key_path=key_path)
-                        else:
-                            func(host, creds["username"], creds["password"], key_path=key_path)
-                        print(f"   -> Đã gửi lệnh sửa cho {sec_id} trên {host}.")
-                    except Exception as e:
-                        print(f"   -> LỖI khi sửa {sec_id} trên {host}: {e}")
+        if sec_id in sections_to_fix and host in creds_by_host:
+            work.setdefault(host, []).append(sec_id)
+
+    reports = {}
+    if answers is None:
+        for host, sec_ids in work.items():
+            reports[host] = fix_host(creds_by_host[host], sec_ids, all_results, journal=journal)
+        return reports
+
+    max_workers = max(1, min(max_workers, len(work) or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fix_host, creds_by_host[host], sec_ids, all_results,
+                            answers_for_host(answers, creds_by_host[host]["host"]), journal): host
+            for host, sec_ids in work.items()
+        }
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                reports[host] = future.result()
+            except Exception as e:
+                print(f"[{host}] LỖI khi sửa host: {e}")
+                reports[host] = {sec_id: f"LỖI ({e})" for sec_id in work[host]}
+
+    display_fix_report(reports)
+    return reports
+
+
+def display_fix_report(reports):
+    """Hiển thị báo cáo sửa lỗi theo từng host."""
+    print("\n" + "=" * 60)
+    print("                   BÁO CÁO SỬA LỖI")
+    print("=" * 60)
+    for host in sorted(reports):
+        print(f"\nHOST: {host}")
+        for sec_id, status in reports[host].items():
+            print(f"  - {sec_id}: {status}")
+
+
+def verification_targets(reports):
+    """{host: [sec_id]} các mục đã được gửi lệnh sửa (kể cả sửa chưa hết hoặc lỗi giữa chừng)."""
+    targets = {}
+    for host, report in reports.items():
+        sec_ids = [sec_id for sec_id, status in report.items() if status.startswith(FIX_ATTEMPTED)]
+        if sec_ids:
+            targets[host] = sec_ids
+    return targets
+
+
+def verify_host(creds, sec_ids, all_results, max_channels=None):
+    """Kiểm tra lại các mục sec_ids vừa sửa trên một host, trả về {sec_id: kết quả mới}."""
+    host = host_label(creds)
+    if max_channels is None:
+        from utils import MAX_CHANNELS_PER_HOST
+        max_channels = MAX_CHANNELS_PER_HOST
+    load_rules(sec_ids)
+    previous = {sec_id: all_results[host][sec_id] for sec_id in sec_ids}
+    return checks.verify_rules(creds["host"], creds["username"], creds["password"], previous,
+                               port=creds.get("port", 22), key_path=creds.get("key_path"),
+                               max_workers=max_channels)
+
+
+def run_verification(hosts, all_results, reports, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Kiểm tra lại các mục vừa sửa và ghi kết quả mới vào all_results tại chỗ.
+
+    Chỉ các mục có trong báo cáo sửa lỗi được đọc lại; mỗi host một lần đọc gộp, với
+    7.x chỉ đọc lại .vmx của các VM KHÔNG ĐẠT trước đó. Các host chạy song song (không
+    có bước nào hỏi người dùng). Mục không kiểm tra lại được giữ kết quả cũ trong
+    all_results. Trả về {host: {sec_id: kết quả mới}}.
+    """
+    targets = verification_targets(reports)
+    if not targets:
+        return {}
+    print("\n>>> KIỂM TRA LẠI CÁC MỤC VỪA SỬA...\n")
+
+    creds_by_host = {host_label(h): h for h in hosts}
+    verified = {}
+    max_workers = max(1, min(max_workers, len(targets)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(verify_host, creds_by_host[host], sec_ids, all_results): host
+            for host, sec_ids in targets.items()
+        }
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"[{host}] LỖI khi kiểm tra lại host: {e}")
+                results = {sec_id: checks.error_result(creds_by_host[host]["host"], sec_id, e)
+                           for sec_id in targets[host]}
+            # Không kiểm tra lại được thì giữ kết quả trước khi sửa
+            all_results[host] = {sec_id: r for sec_id, r in results.items() if not r.get("error")}
+            verified[host] = results
+
+    display_verification_report(verified)
+    return verified
+
+
+def display_verification_report(verified):
+    """Hiển thị kết quả kiểm tra lại sau khi sửa theo từng host."""
+    print("\n" + "=" * 60)
+    print("                KẾT QUẢ KIỂM TRA LẠI SAU KHI SỬA")
+    print("=" * 60)
+    fixed = total = 0
+    for host in sorted(verified):
+        print(f"\nHOST: {host}")
+        for sec_id in sorted(verified[host], key=section_sort_key):
+            data = verified[host][sec_id]
+            total += 1
+            if data.get("error"):
+                print(f"  - {sec_id}: LỖI ({data['error']})")
+            elif data.get(CATALOG[sec_id].result_key):
+                fixed += 1
+                print(f"  - {sec_id}: ĐẠT")
             else:
-                print(f"[{host}] Mục {sec_id} chưa có script tự động sửa.")
+                failed_vms = data.get("detail", {}).get("failed_vms")
+                suffix = f" ({len(failed_vms)} VM)" if failed_vms else ""
+                print(f"  - {sec_id}: VẪN KHÔNG ĐẠT{suffix}")
+    print(f"\n>>> {fixed}/{total} mục đã sửa được xác nhận ĐẠT.")
+
+
+def run_rollback(hosts, entries_by_host, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Hoàn tác các thay đổi trong journal ({host: [entry]}), mỗi host một script, các host
+    chạy song song. Trả về {host: {số thứ tự thay đổi: True/False}}; host không có thông
+    tin đăng nhập có giá trị None.
+    """
+    from journal import rollback_host
+
+    creds_by_host = {host_label(h): h for h in hosts}
+    reports = {}
+    work = {}
+    for host, entries in entries_by_host.items():
+        if host in creds_by_host:
+            work[host] = entries
+        else:
+            print(f"[{host}] LỖI: không có thông tin đăng nhập của host, bỏ qua {len(entries)} thay đổi.")
+            reports[host] = None
+    if not work:
+        return reports
+
+    max_workers = max(1, min(max_workers, len(work)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(rollback_host, creds_by_host[host], entries): host
+                   for host, entries in work.items()}
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                reports[host] = future.result()
+            except Exception as e:
+                print(f"[{host}] LỖI khi hoàn tác: {e}")
+                reports[host] = {i: False for i in range(len(work[host]))}
+    return reports
+
+
+def display_rollback_report(run_id, entries_by_host, reports):
+    """Hiển thị kết quả hoàn tác theo từng host; trả về True nếu mọi thay đổi đã được hoàn tác."""
+    print("\n" + "=" * 60)
+    print(f"                BÁO CÁO HOÀN TÁC ({run_id})")
+    print("=" * 60)
+    all_ok = True
+    for host in sorted(entries_by_host):
+        entries = entries_by_host[host]
+        status = reports.get(host)
+        if status is None:
+            print(f"\nHOST: {host}: KHÔNG HOÀN TÁC ĐƯỢC (thiếu thông tin đăng nhập)")
+            all_ok = False
+            continue
+        ok = sum(1 for i in status if status[i])
+        print(f"\nHOST: {host}: {ok}/{len(entries)} thay đổi đã hoàn tác")
+        for i, entry in enumerate(entries):
+            if not status[i]:
+                all_ok = False
+                print(f"  - LỖI {', '.join(entry['sections'])}: {entry['target']} (giá trị cũ: {entry['prior']})")
+    return all_ok
+
+
+def rollback_main(args):
+    """--rollback: hoàn tác một lần sửa lỗi theo journal, trả về mã thoát."""
+    from journal import load_journal
+
+    try:
+        run_id, entries_by_host = load_journal(args.rollback)
+        hosts = load_inventory(args.inventory, AVAILABLE_SECTIONS) if args.inventory else None
+    except (OSError, ValueError) as e:
+        print(f"LỖI: {e}")
+        return EXIT_ERROR
+    if not entries_by_host:
+        print(f"Journal {run_id} không có thay đổi nào.")
+        return EXIT_OK
+
+    total = sum(len(entries) for entries in entries_by_host.values())
+    print(f"\n>>> Hoàn tác lần sửa {run_id}: {total} thay đổi trên {len(entries_by_host)} host")
+    if hosts is None:
+        hosts = get_esxi_hosts()
+    assign_sites(hosts)
+    reports = run_rollback(hosts, entries_by_host, max_workers=args.workers)
+    return EXIT_OK if display_rollback_report(run_id, entries_by_host, reports) else EXIT_ERROR
+
+
+def collect_status(all_results):
+    """
+    Tổng hợp kết quả thành trạng thái máy đọc được cho scheduler.
+
+    Trả về (exit_code, status): exit_code là EXIT_ERROR nếu có mục không kiểm tra được,
+    EXIT_FAILED nếu có mục KHÔNG ĐẠT, ngược lại EXIT_OK.
+    """
+    failed = []
+    errors = []
+    passed = 0
+    for host, sections in all_results.items():
+        for sec_id in sorted(sections, key=section_sort_key):
+            data = sections[sec_id]
+            if data.get("error"):
+                errors.append({"host": host, "section": sec_id, "error": data["error"]})
+            elif data.get(CATALOG[sec_id].result_key):
+                passed += 1
+            else:
+                failed.append({"host": host, "section": sec_id})
+
+    if errors:
+        exit_code, state = EXIT_ERROR, "error"
+    elif failed:
+        exit_code, state = EXIT_FAILED, "failed"
+    else:
+        exit_code, state = EXIT_OK, "ok"
+
+    status = {
+        "status": state,
+        "exit_code": exit_code,
+        "hosts": len(all_results),
+        "hosts_failed": len({f["host"] for f in failed}),
+        "hosts_error": len({e["host"] for e in errors}),
+        "passed": passed,
+        "failed": failed,
+        "errors": errors,
+    }
+    if isinstance(all_results, ResultMatrix):
+        status["sections"] = all_results.section_failure_rates()
+        status["worst_hosts"] = [
+            {"host": host, "failed": n_failed, "error": n_error}
+            for host, n_failed, n_error in all_results.worst_hosts()
+        ]
+    return exit_code, status
+
+
+def write_status(path, status):
+    """Ghi trạng thái JSON ra file, hoặc stdout nếu path là '-'."""
+    text = json.dumps(status, ensure_ascii=False, indent=2)
+    if path == "-":
+        print(text)
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+    os.replace(tmp_path, path)
+
+
+def collect_stream_status(summary):
+    """Như collect_status nhưng tính từ SummarySink (chế độ --stream-only, không có danh sách chi tiết)."""
+    if summary.counts["error"]:
+        exit_code, state = EXIT_ERROR, "error"
+    elif summary.counts["fail"]:
+        exit_code, state = EXIT_FAILED, "failed"
+    else:
+        exit_code, state = EXIT_OK, "ok"
+
+    status = {
+        "status": state,
+        "exit_code": exit_code,
+        "hosts": summary.hosts,
+        "hosts_failed": summary.hosts_failed,
+        "hosts_error": summary.hosts_error,
+        "passed": summary.counts["pass"],
+        "failed_count": summary.counts["fail"],
+        "error_count": summary.counts["error"],
+        "sections": summary.section_failure_rates(),
+        "worst_hosts": [
+            {"host": host, "failed": n_failed, "error": n_error}
+            for host, n_failed, n_error in summary.worst_hosts()
+        ],
+    }
+    return exit_code, status
+
+
+def display_stream_summary(summary):
+    """Tổng hợp fleet từ SummarySink khi kết quả không được giữ trong bộ nhớ."""
+    print("\n\n" + "=" * 60)
+    print("                   TỔNG HỢP KẾT QUẢ")
+    print("=" * 60)
+    print(f"{summary.hosts} host: {summary.counts['pass']} ĐẠT, {summary.counts['fail']} KHÔNG ĐẠT, "
+          f"{summary.counts['error']} LỖI ({summary.hosts_failed} host có mục KHÔNG ĐẠT, "
+          f"{summary.hosts_error} host có LỖI)")
+    for sec_id, rate in summary.section_failure_rates().items():
+        print(f"  - {sec_id}: {rate['failed']}/{rate['checked']} KHÔNG ĐẠT "
+              f"({rate['failure_rate']:.1%}), {rate['error']} LỖI")
+    worst = summary.worst_hosts()
+    if worst:
+        print("\nHost nhiều mục KHÔNG ĐẠT nhất:")
+        for host, failed, error in worst:
+            print(f"  - {host}: {failed} KHÔNG ĐẠT, {error} LỖI")
+
+
+def write_metrics(args):
+    """Xuất metrics theo --metrics-prom / --metrics-json; trả về False nếu ghi lỗi."""
+    try:
+        if args.metrics_prom:
+            METRICS.write_prometheus(args.metrics_prom)
+        if args.metrics_json:
+            METRICS.write_json(args.metrics_json)
+    except OSError as e:
+        print(f"LỖI: không ghi được metrics: {e}")
+        return False
+    return True
 
 
 def get_esxi_hosts():
@@ -324,60 +774,270 @@ def get_esxi_hosts():
     return hosts
 
 
-def main():
-    """Entry point chính của chương trình."""
-    # Cho người dùng nhập thông tin ESXi hosts
-    ESXI_HOSTS = get_esxi_hosts()
-    
-    if not ESXI_HOSTS:
-        print("Không có host nào được cấu hình. Thoát chương trình.")
-        return
-    
-    # Cho người dùng chọn sections cần kiểm tra
-    sections_to_run = get_user_sections(AVAILABLE_SECTIONS)
+def parse_args(argv=None):
+    """Tham số dòng lệnh."""
+    parser = argparse.ArgumentParser(description="CIS VMware ESXi 8 Benchmark Checker")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Số host xử lý song song (mặc định {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--max-inflight", type=int, default=GLOBAL_MAX_INFLIGHT,
+                        help=f"Số lệnh SSH chạy đồng thời tối đa trên cả fleet (mặc định {GLOBAL_MAX_INFLIGHT})")
+    parser.add_argument("--no-adaptive-limit", action="store_true",
+                        help="Tắt giới hạn đồng thời thích ứng theo host / hostd / site (giữ ở mức tối đa)")
+    parser.add_argument("--list", action="store_true",
+                        help="Liệt kê các mục CIS được hỗ trợ rồi thoát (không kết nối host nào)")
+
+    batch_group = parser.add_argument_group("Quét fleet không tương tác")
+    batch_group.add_argument("--inventory", metavar="FILE",
+                             help="File inventory (JSON/YAML/CSV), xem inventory.py; bỏ qua mọi bước nhập tay")
+    batch_group.add_argument("--sections", metavar="SECTIONS",
+                             help="Các mục kiểm tra mặc định cho host không khai báo sections (mặc định: tất cả)")
+    batch_group.add_argument("--status-json", metavar="FILE",
+                             help="Ghi trạng thái kết quả dạng JSON ra FILE ('-' = stdout)")
+    batch_group.add_argument("--delta", action="store_true",
+                             help="Chỉ đánh giá lại các mục có cấu hình đầu vào thay đổi so với lần quét trước "
+                                  "(dấu vân tay và kết quả lưu trong thư mục cache, xem fingerprint.py)")
+
+    metrics_group = parser.add_argument_group("Metrics")
+    metrics_group.add_argument("--metrics-prom", metavar="FILE",
+                               help="Ghi metrics dạng Prometheus textfile ra FILE (node_exporter textfile collector)")
+    metrics_group.add_argument("--metrics-json", metavar="FILE",
+                               help="Ghi tóm tắt metrics (histogram p50/p90/p99, byte, retry...) dạng JSON ('-' = stdout)")
+
+    output_group = parser.add_argument_group("Ghi kết quả theo luồng (mỗi host ghi ngay khi xong)")
+    output_group.add_argument("--jsonl", metavar="FILE", help="Ghi kết quả ra FILE dạng JSON Lines, mỗi host một dòng")
+    output_group.add_argument("--csv", metavar="FILE", help="Ghi kết quả ra FILE dạng CSV, mỗi (host, mục) một dòng")
+    output_group.add_argument("--sqlite", metavar="FILE", help="Ghi kết quả vào bảng results của database SQLite FILE")
+    output_group.add_argument("--stream-only", action="store_true",
+                              help="Không giữ kết quả trong bộ nhớ: chỉ ghi ra sink và in tổng hợp fleet "
+                                   "(dùng cho fleet rất lớn, không dùng được với --fix)")
+
+    fix_group = parser.add_argument_group("Sửa lỗi không tương tác")
+    fix_group.add_argument("--fix", metavar="SECTIONS",
+                           help="Sửa các mục này sau khi kiểm tra mà không hỏi ('all' = mọi mục KHÔNG ĐẠT)")
+    fix_group.add_argument("--answers", metavar="FILE", help="File answers (JSON/YAML), xem answers.py")
+    fix_group.add_argument("--rollback", metavar="RUN_ID",
+                           help="Hoàn tác mọi thay đổi của lần sửa RUN_ID theo journal ('latest' = lần gần nhất); "
+                                "host lấy từ --inventory hoặc nhập tay")
+    fix_group.add_argument("--no-verify", action="store_true",
+                           help="Không tự kiểm tra lại các mục vừa sửa (mã thoát theo kết quả trước khi sửa)")
+    fix_group.add_argument("--syslog-host", help="Remote syslog cho 4.2, ví dụ tcp://192.168.1.10:514")
+    fix_group.add_argument("--vlan", action="append", metavar="PORTGROUP=ID",
+                           help="VLAN mới cho port group ở 5.9/5.10 (lặp lại được, '*=ID' cho mọi port group)")
+    fix_group.add_argument("--vms", help="VM được sửa ở 7.x: 'all' hoặc danh sách tên/vmid cách nhau bởi dấu phẩy")
+    return parser.parse_args(argv)
+
+
+def build_answers(args):
+    """Answers từ file và tham số dòng lệnh; None nếu không dùng chế độ không tương tác."""
+    if not (args.answers or args.syslog_host or args.vlan or args.vms or args.fix):
+        return None
+
+    answers = load_answers(args.answers) if args.answers else {}
+    cli = {}
+    if args.syslog_host:
+        cli["syslog_host"] = args.syslog_host
+    if args.vlan:
+        cli["vlan"] = parse_vlan_args(args.vlan)
+    if args.vms:
+        cli["vms"] = "all" if args.vms == "all" else [v.strip() for v in args.vms.split(",") if v.strip()]
+    return merge_answers(answers, cli)
+
+
+def main(argv=None):
+    """
+    Entry point chính của chương trình, trả về mã thoát (EXIT_OK/EXIT_FAILED/EXIT_ERROR).
+
+    Với --inventory chương trình chạy hoàn toàn không tương tác: host và sections lấy từ
+    inventory, chỉ sửa lỗi khi có --fix. Sau khi sửa, các mục vừa sửa được kiểm tra lại
+    (trừ khi có --no-verify) và mã thoát / trạng thái JSON phản ánh kết quả đã kiểm tra lại;
+    với --no-verify mã thoát phản ánh kết quả kiểm tra trước khi sửa.
+    """
+    args = parse_args(argv)
+    if args.list:
+        print("\n".join(format_section_menu()))
+        return EXIT_OK
+    LIMITER.configure(max_inflight=max(1, args.max_inflight), adaptive=not args.no_adaptive_limit)
+    if args.rollback:
+        return rollback_main(args)
+    started = time.time()
+    try:
+        answers = build_answers(args)
+        default_sections = AVAILABLE_SECTIONS.copy()
+        if args.sections:
+            default_sections = sorted(parse_sections(args.sections, AVAILABLE_SECTIONS), key=section_sort_key)
+            if not default_sections:
+                raise ValueError(f"--sections không có mục hợp lệ: {args.sections}")
+        if args.stream_only and args.fix:
+            raise ValueError("--stream-only không dùng được với --fix (kết quả không được giữ để sửa lỗi)")
+        ESXI_HOSTS = None
+        if args.inventory:
+            ESXI_HOSTS = load_inventory(args.inventory, AVAILABLE_SECTIONS, default_sections)
+    except (OSError, ValueError) as e:
+        # inventory.InventoryError là ValueError
+        print(f"LỖI: {e}")
+        return EXIT_ERROR
+
+    headless = ESXI_HOSTS is not None
+    if headless:
+        assign_sites(ESXI_HOSTS)
+        sections_to_run = sorted({s for h in ESXI_HOSTS for s in h["sections"]}, key=section_sort_key)
+        print(f"\n>>> Inventory {args.inventory}: {len(ESXI_HOSTS)} host")
+    else:
+        # Cho người dùng nhập thông tin ESXi hosts
+        ESXI_HOSTS = get_esxi_hosts()
+
+        if not ESXI_HOSTS:
+            print("Không có host nào được cấu hình. Thoát chương trình.")
+            return EXIT_ERROR
+
+        # Cho người dùng chọn sections cần kiểm tra
+        sections_to_run = default_sections if args.sections else get_user_sections(AVAILABLE_SECTIONS)
     
-    print(f"\n>>> BẮT ĐẦU KIỂM TRA: {', '.join(sorted(sections_to_run))}\n")
+    print(f"\n>>> BẮT ĐẦU KIỂM TRA: {', '.join(sorted(sections_to_run, key=section_sort_key))}\n")
     
+    outputs = [(kind, getattr(args, kind)) for kind in ("jsonl", "csv", "sqlite") if getattr(args, kind)]
+    keys = result_keys()
+    run_id = new_run_id()
+    try:
+        sinks = open_sinks(outputs, keys, run_id=run_id)
+    except (OSError, sqlite3.Error) as e:
+        print(f"LỖI: không mở được file kết quả: {e}")
+        return EXIT_ERROR
+    summary = SummarySink(keys) if args.stream_only else None
+    if summary is not None:
+        sinks.append(summary)
+    sink = MultiSink(sinks) if sinks else None
+
+    delta = None
+    if args.delta:
+        from fingerprint import open_delta_store
+        try:
+            delta = open_delta_store()
+        except (OSError, sqlite3.Error) as e:
+            print(f"CẢNH BÁO: không mở được kho kết quả delta, kiểm tra toàn bộ: {e}")
+
     # Chạy kiểm tra
-    all_results = run_checks(ESXI_HOSTS, sections_to_run)
+    try:
+        all_results = run_checks(ESXI_HOSTS, sections_to_run, max_workers=args.workers,
+                                 sink=sink, keep_results=not args.stream_only, delta=delta)
+    finally:
+        if sink is not None:
+            sink.close()
+        if delta is not None:
+            delta.close()
     
     # Hiển thị tổng hợp
-    failed_checks = display_summary(all_results)
+    if summary is not None:
+        display_stream_summary(summary)
+        failed_checks = []
+    else:
+        failed_checks = display_summary(all_results)
+
+    from utils import fact_cache_stats
+    stats = fact_cache_stats()
+    print(f"\n[Fact cache] {stats['hits']} hit, {stats['misses']} miss, "
+          f"{stats['invalidations']} invalidation, {stats['seeded']} lệnh đọc gộp")
+    print(f"[Metrics] kết nối {METRICS.histogram_total('cis_ssh_connect_seconds'):.2f}s, "
+          f"exec {METRICS.histogram_total('cis_ssh_exec_seconds'):.2f}s, "
+          f"đọc output {METRICS.histogram_total('cis_ssh_read_seconds'):.2f}s, "
+          f"{METRICS.counter_total('cis_ssh_bytes_received_total')} byte nhận, "
+          f"{METRICS.counter_total('cis_ssh_retries_total')} lần thử lại")
+    limiter_stats = LIMITER.stats()
+    if limiter_stats:
+        print("[Limiter] chờ slot {:.2f}s; ".format(METRICS.histogram_total("cis_limiter_wait_seconds")) + "; ".join(
+            f"{scope}: giới hạn {st['min_limit']:g}-{st['max_limit']:g}, giảm {st['decreases']} lần"
+            for scope, st in limiter_stats.items()))
+    if delta is not None:
+        print(f"[Delta] {METRICS.counter_total('cis_delta_sections_total', state='reused')} mục dùng lại kết quả trước, "
+              f"{METRICS.counter_total('cis_delta_sections_total', state='evaluated')} mục đánh giá lại, "
+              f"{METRICS.counter_total('cis_delta_hosts_unchanged_total')} host không đổi")
+
+    if summary is not None:
+        exit_code, status = collect_stream_status(summary)
+    else:
+        exit_code, status = collect_status(all_results)
+    status["duration_s"] = round(time.time() - started, 3)
+    if args.status_json:
+        try:
+            write_status(args.status_json, status)
+        except OSError as e:
+            print(f"LỖI: không ghi được trạng thái JSON: {e}")
+            exit_code = EXIT_ERROR
+    METRICS.set("cis_run_duration_seconds", time.time() - started)
+    if not write_metrics(args):
+        exit_code = EXIT_ERROR
     
+    if summary is not None:
+        return exit_code
+
     if not failed_checks:
         print("\n>>> TẤT CẢ CÁC MỤC KIỂM TRA ĐỀU ĐẠT! Không cần sửa lỗi.")
-        return
-    
-    # Hỏi người dùng có muốn sửa lỗi không
-    print("\n" + "=" * 60)
-    ask_fix = input("Bạn có muốn sửa các mục KHÔNG ĐẠT không? (y/n): ").strip().lower()
-    
-    if ask_fix != 'y':
-        print("Đã kết thúc chương trình. Không thực hiện sửa đổi.")
-        return
-    
-    print("\nNhập các phần muốn sửa (ví dụ: 3.8, 3.9)")
-    print("Hoặc nhấn Enter để sửa TẤT CẢ các lỗi tìm thấy:")
-    fix_choice = input(">> Lựa chọn: ").strip()
+        return exit_code
+
+    if headless and not args.fix:
+        return exit_code
     
-    sections_to_fix = set()
-    if not fix_choice:
-        sections_to_fix = set([x[1] for x in failed_checks])
+    if args.fix:
+        # Chế độ không tương tác: các mục cần sửa đã chọn trước
+        if args.fix.strip().lower() == "all":
+            sections_to_fix = set(x[1] for x in failed_checks)
+        else:
+            sections_to_fix = parse_sections(args.fix, AVAILABLE_SECTIONS)
     else:
-        choices = fix_choice.replace(",", " ").split()
-        for c in choices:
-            c = c.strip()
-            if c in AVAILABLE_SECTIONS:
-                sections_to_fix.add(c)
-            else:
-                print(f"Bỏ qua lựa chọn không hợp lệ: {c}")
+        # Hỏi người dùng có muốn sửa lỗi không
+        print("\n" + "=" * 60)
+        ask_fix = input("Bạn có muốn sửa các mục KHÔNG ĐẠT không? (y/n): ").strip().lower()
+        
+        if ask_fix != 'y':
+            print("Đã kết thúc chương trình. Không thực hiện sửa đổi.")
+            return exit_code
+        
+        print("\nNhập các phần muốn sửa (ví dụ: 3.8, 3.9)")
+        print("Hoặc nhấn Enter để sửa TẤT CẢ các lỗi tìm thấy:")
+        fix_choice = input(">> Lựa chọn: ").strip()
+        
+        if not fix_choice:
+            sections_to_fix = set([x[1] for x in failed_checks])
+        else:
+            sections_to_fix = parse_sections(fix_choice, AVAILABLE_SECTIONS)
     
+    # Journal giá trị cũ để có thể hoàn tác (--rollback)
+    from journal import RemediationJournal
+    try:
+        journal = RemediationJournal(run_id)
+    except OSError as e:
+        print(f"LỖI: không tạo được journal sửa lỗi, không thực hiện sửa đổi: {e}")
+        return EXIT_ERROR
+
     # Chạy sửa lỗi
-    run_fixes(ESXI_HOSTS, all_results, failed_checks, sections_to_fix)
-    
-    print("\n>>> Đã hoàn tất quá trình sửa lỗi. Vui lòng chạy lại kiểm tra để xác nhận.")
+    try:
+        reports = run_fixes(ESXI_HOSTS, all_results, failed_checks, sections_to_fix, answers=answers,
+                            max_workers=args.workers, journal=journal)
+    finally:
+        journal.close()
+    if journal.entries:
+        print(f"\n>>> Đã ghi {journal.entries} thay đổi vào journal {journal.path}")
+        print(f"    Hoàn tác: python main.py --rollback {run_id}")
+
+    if args.no_verify:
+        print("\n>>> Đã hoàn tất quá trình sửa lỗi. Vui lòng chạy lại kiểm tra để xác nhận.")
+    elif run_verification(ESXI_HOSTS, all_results, reports, max_workers=args.workers):
+        exit_code, status = collect_status(all_results)
+        status["duration_s"] = round(time.time() - started, 3)
+        status["verified"] = True
+        if args.status_json:
+            try:
+                write_status(args.status_json, status)
+            except OSError as e:
+                print(f"LỖI: không ghi được trạng thái JSON: {e}")
+                exit_code = EXIT_ERROR
+    # Ghi lại metrics để gồm cả các lệnh SSH của bước sửa lỗi
+    METRICS.set("cis_run_duration_seconds", time.time() - started)
+    if not write_metrics(args):
+        exit_code = EXIT_ERROR
+    return exit_code
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -0,0 +1,230 @@
+"""
+Đo đạc (metrics) của lần chạy
+
+METRICS ghi lại thời gian và số liệu ở các đường nóng:
+
+- SSH (utils.py): thời gian kết nối, thời gian mở exec channel, thời gian đọc output,
+  tổng thời gian mỗi lệnh (histogram theo loại lệnh), byte gửi / nhận, số lần thử lại,
+  thời gian chờ và số lần giảm của giới hạn đồng thời (limiter.py)
+- Kiểm tra (checks/rules.py, main.py): thời gian đọc từng nguồn dữ liệu, thời gian mỗi
+  mục CIS trên mỗi host (histogram theo section) và tổng thời gian kiểm tra từng host
+
+Cuối lần chạy có thể xuất ra Prometheus textfile (cho node_exporter textfile collector)
+và JSON tóm tắt (count / sum / mean / p50 / p90 / p99 / max của mỗi histogram).
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Bucket (giây) cho các histogram thời gian, từ vài ms (exec trong LAN) tới vài phút
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRIC_HELP = {
+    "cis_ssh_connect_seconds": ("histogram", "Thời gian mở và xác thực một kết nối SSH"),
+    "cis_ssh_exec_seconds": ("histogram", "Thời gian mở exec channel và gửi lệnh"),
+    "cis_ssh_read_seconds": ("histogram", "Thời gian đọc stdout/stderr của lệnh"),
+    "cis_ssh_command_seconds": ("histogram", "Tổng thời gian một lệnh SSH (exec + read, gồm cả thử lại)"),
+    "cis_ssh_bytes_sent_total": ("counter", "Số byte lệnh đã gửi"),
+    "cis_ssh_bytes_received_total": ("counter", "Số byte output đã nhận"),
+    "cis_ssh_retries_total": ("counter", "Số lần kết nối lại và chạy lại lệnh"),
+    "cis_ssh_errors_total": ("counter", "Số lệnh SSH lỗi sau khi đã thử lại"),
+    "cis_source_fetch_seconds": ("histogram", "Thời gian đọc một nguồn dữ liệu của rule trên một host"),
+    "cis_section_seconds": ("histogram", "Thời gian một mục CIS trên một host (đọc nguồn + đánh giá)"),
+    "cis_host_check_seconds": ("gauge", "Tổng thời gian kiểm tra của từng host"),
+    "cis_delta_sections_total": ("counter", "Số mục dùng lại kết quả trước (reused) / đánh giá lại (evaluated) khi --delta"),
+    "cis_delta_hosts_unchanged_total": ("counter", "Số host không có mục nào cần đánh giá lại khi --delta"),
+    "cis_limiter_wait_seconds": ("histogram", "Thời gian một lệnh SSH chờ slot của giới hạn đồng thời (scope hostd / host)"),
+    "cis_limiter_decreases_total": ("counter", "Số lần giới hạn đồng thời thích ứng bị giảm do lệnh chậm / lỗi (theo scope)"),
+    "cis_run_duration_seconds": ("gauge", "Tổng thời gian lần chạy"),
+}
+
+
+class Histogram:
+    """Histogram bucket cố định kiểu Prometheus (đếm theo bucket, sum, count, max)."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "max")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # phần tử cuối: > bucket lớn nhất (+Inf)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Ước lượng phân vị q (0..1) bằng nội suy tuyến tính trong bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(low + (high - low) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p90": round(self.quantile(0.9), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "max": round(self.max, 6),
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    escaped = (
+        k + '="' + v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Registry metrics thread-safe: histogram, counter và gauge có nhãn."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Đo thời gian của một khối lệnh vào histogram `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def histogram_total(self, name):
+        """Tổng (sum) của mọi series của một histogram."""
+        with self._lock:
+            return sum(h.sum for h in self._histograms.get(name, {}).values())
+
+    def counter_total(self, name, **labels):
+        """Tổng mọi series của một counter, hoặc chỉ các series có đủ các nhãn `labels`."""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(v for k, v in self._counters.get(name, {}).items() if wanted.issubset(k))
+
+    # ---------- xuất ----------
+
+    def to_prometheus(self):
+        """Nội dung Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            families = [(n, "histogram", s) for n, s in self._histograms.items()]
+            families += [(n, "counter", s) for n, s in self._counters.items()]
+            families += [(n, "gauge", s) for n, s in self._gauges.items()]
+            for name, kind, series in sorted(families):
+                help_text = METRIC_HELP.get(name, (kind, name))[1]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, n in zip(value.buckets + (float("inf"),), value.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_number(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_number(value.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Tóm tắt dạng dict: {"histograms": {name: {nhãn: thống kê}}, "counters": ..., "gauges": ...}."""
+        def label_text(key):
+            return ",".join(f"{k}={v}" for k, v in key) or "_"
+
+        with self._lock:
+            return {
+                "histograms": {
+                    name: {label_text(k): h.summary() for k, h in sorted(series.items())}
+                    for name, series in sorted(self._histograms.items())
+                },
+                "counters": {
+                    name: {label_text(k): v for k, v in sorted(series.items())}
+                    for name, series in sorted(self._counters.items())
+                },
+                "gauges": {
+                    name: {label_text(k): round(v, 6) for k, v in sorted(series.items())}
+                    for name, series in sorted(self._gauges.items())
+                },
+            }
+
+    def write_prometheus(self, path):
+        """Ghi textfile Prometheus (ghi file tạm rồi rename để collector không đọc file dở)."""
+        _atomic_write(path, self.to_prometheus())
+
+    def write_json(self, path):
+        """Ghi tóm tắt JSON ra file, hoặc stdout nếu path là '-'."""
+        text = json.dumps(self.summary(), ensure_ascii=False, indent=2)
+        if path == "-":
+            print(text)
+        else:
+            _atomic_write(path, text + "\n")
+
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
@@ -0,0 +1,256 @@
+"""
+Ma trận kết quả gọn cho fleet lớn
+
+Thay cho all_results dạng dict lồng dict ({host: {sec_id: {"host", result_key, "detail"}}}):
+
+- Trạng thái host x section nằm trong một bytearray (1 byte mỗi ô), các tổng hợp
+  fleet (tỉ lệ KHÔNG ĐẠT theo mục, host tệ nhất) đếm trực tiếp trên mảng này.
+- VM trong failed_vms là VmRecord có __slots__, được intern: cùng một VM với cùng
+  giá trị hiện tại chỉ có MỘT object dù xuất hiện ở nhiều mục 7.x.
+- Detail giống nhau giữa các host (ví dụ {"current_value": 600}) dùng chung một object;
+  vì vậy detail lấy ra từ ma trận phải được coi là chỉ đọc.
+
+ResultMatrix vẫn dùng được như dict cũ: all_results[host][sec_id]["detail"],
+.items(), .get(host, {}) ... đều trả về dữ liệu tương đương (dựng lại khi truy cập).
+"""
+
+import heapq
+from collections.abc import Mapping
+
+# Trạng thái của một ô host x section
+RESULT_NONE = 0     # chưa kiểm tra
+RESULT_PASS = 1
+RESULT_FAIL = 2
+RESULT_ERROR = 3
+
+
+class VmRecord:
+    """Thông tin một VM trong failed_vms; truy cập như dict (vm["name"]) để tương thích code cũ."""
+
+    __slots__ = ("vmid", "name", "path", "current_value")
+
+    def __init__(self, vmid, name, path, current_value=None):
+        self.vmid = vmid
+        self.name = name
+        self.path = path
+        self.current_value = current_value
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"VmRecord({self.vmid!r}, {self.name!r}, {self.path!r}, {self.current_value!r})"
+
+
+def _freeze(value):
+    """Khóa hashable cho một detail để intern (dict/list -> tuple)."""
+    if isinstance(value, dict):
+        return ("d",) + tuple((k, _freeze(v)) for k, v in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("l",) + tuple(_freeze(v) for v in value)
+    if isinstance(value, set):
+        return ("s",) + tuple(sorted(_freeze(v) for v in value))
+    return value
+
+
+class _HostView(Mapping):
+    """Kết quả của một host dạng {sec_id: result} dựng lại từ ma trận."""
+
+    __slots__ = ("_matrix", "_row")
+
+    def __init__(self, matrix, row):
+        self._matrix = matrix
+        self._row = row
+
+    def __getitem__(self, sec_id):
+        col = self._matrix._section_index.get(sec_id)
+        if col is None or self._matrix.status_at(self._row, col) == RESULT_NONE:
+            raise KeyError(sec_id)
+        return self._matrix._result(self._row, col)
+
+    def __iter__(self):
+        matrix = self._matrix
+        for col, sec_id in enumerate(matrix.sections):
+            if matrix.status_at(self._row, col) != RESULT_NONE:
+                yield sec_id
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultMatrix(Mapping):
+    """
+    Kết quả kiểm tra của cả fleet: {host: {sec_id: result}} lưu dạng ma trận.
+
+    sections: danh sách section (cột) theo thứ tự; result_keys: {sec_id: result_key}.
+    """
+
+    def __init__(self, sections, result_keys):
+        self.sections = list(sections)
+        self.result_keys = dict(result_keys)
+        self._section_index = {sec_id: i for i, sec_id in enumerate(self.sections)}
+        self.hosts = []
+        self._host_index = {}
+        self._host_names = {}
+        self.status = bytearray()
+        self._details = {}
+        self._errors = {}
+        self._vm_records = {}
+        self._shared = {}
+
+    # ---------- ghi ----------
+
+    def add_host(self, host, name=None):
+        """Thêm một hàng cho host (nếu chưa có), trả về chỉ số hàng."""
+        row = self._host_index.get(host)
+        if row is None:
+            row = self._host_index[host] = len(self.hosts)
+            self.hosts.append(host)
+            self.status.extend(bytes(len(self.sections)))
+        if name is not None and name != host:
+            self._host_names[row] = name
+        return row
+
+    def intern_vm(self, vm):
+        """VmRecord dùng chung cho một VM (dict hoặc VmRecord) và giá trị hiện tại của nó."""
+        key = (vm["vmid"], vm["name"], vm["path"], vm.get("current_value"))
+        record = self._vm_records.get(key)
+        if record is None:
+            record = self._vm_records[key] = VmRecord(*key)
+        return record
+
+    def _intern(self, value):
+        try:
+            key = _freeze(value)
+            return self._shared.setdefault(key, value)
+        except TypeError:
+            return value
+
+    def _compact_detail(self, detail):
+        if not detail:
+            return None
+        detail = dict(detail)
+        if "failed_vms" in detail:
+            detail["failed_vms"] = tuple(self.intern_vm(vm) for vm in detail["failed_vms"] or ())
+        return self._intern(detail)
+
+    def set_result(self, host, sec_id, result):
+        """Ghi kết quả của một section (dict như check trả về) vào ma trận."""
+        row = self.add_host(host, result.get("host"))
+        col = self._section_index[sec_id]
+        cell = row * len(self.sections) + col
+        if result.get("error"):
+            self.status[cell] = RESULT_ERROR
+            self._errors[cell] = self._intern(str(result["error"]))
+        else:
+            self.status[cell] = RESULT_PASS if result.get(self.result_keys[sec_id]) else RESULT_FAIL
+            self._errors.pop(cell, None)
+        detail = self._compact_detail(result.get("detail"))
+        if detail is None:
+            self._details.pop(cell, None)
+        else:
+            self._details[cell] = detail
+
+    def __setitem__(self, host, results):
+        """all_results[host] = {sec_id: result}: ghi đè các section có trong results."""
+        self.add_host(host)
+        for sec_id, result in results.items():
+            self.set_result(host, sec_id, result)
+
+    # ---------- đọc ----------
+
+    def status_at(self, row, col):
+        return self.status[row * len(self.sections) + col]
+
+    def get_status(self, host, sec_id):
+        return self.status_at(self._host_index[host], self._section_index[sec_id])
+
+    def _result(self, row, col):
+        cell = row * len(self.sections) + col
+        sec_id = self.sections[col]
+        state = self.status[cell]
+        result = {
+            "host": self._host_names.get(row, self.hosts[row]),
+            self.result_keys[sec_id]: state == RESULT_PASS,
+            "detail": self._details.get(cell) or {},
+        }
+        if state == RESULT_ERROR:
+            result["error"] = self._errors.get(cell, "")
+        return result
+
+    def __getitem__(self, host):
+        return _HostView(self, self._host_index[host])
+
+    def __iter__(self):
+        return iter(self.hosts)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __contains__(self, host):
+        return host in self._host_index
+
+    # ---------- tổng hợp ----------
+
+    def _column(self, col):
+        return self.status[col::len(self.sections)] if self.sections else bytearray()
+
+    def _row(self, row):
+        width = len(self.sections)
+        return self.status[row * width:(row + 1) * width]
+
+    def counts(self):
+        """Tổng số ô ĐẠT / KHÔNG ĐẠT / LỖI của cả fleet."""
+        return {
+            "passed": self.status.count(RESULT_PASS),
+            "failed": self.status.count(RESULT_FAIL),
+            "error": self.status.count(RESULT_ERROR),
+        }
+
+    def section_failure_rates(self):
+        """{sec_id: {checked, failed, error, failure_rate}} cho các section đã chạy."""
+        rates = {}
+        for col, sec_id in enumerate(self.sections):
+            column = self._column(col)
+            failed = column.count(RESULT_FAIL)
+            error = column.count(RESULT_ERROR)
+            checked = failed + error + column.count(RESULT_PASS)
+            if checked:
+                rates[sec_id] = {
+                    "checked": checked,
+                    "failed": failed,
+                    "error": error,
+                    "failure_rate": round(failed / checked, 4),
+                }
+        return rates
+
+    def worst_hosts(self, n=10):
+        """n host có nhiều mục KHÔNG ĐẠT nhất: [(host, số mục KHÔNG ĐẠT, số mục LỖI)]."""
+        scored = (
+            (row.count(RESULT_FAIL), row.count(RESULT_ERROR), host)
+            for host, row in ((host, self._row(i)) for i, host in enumerate(self.hosts))
+        )
+        return [(host, failed, error) for failed, error, host in heapq.nlargest(n, scored) if failed or error]
+
+    def failed_checks(self):
+        """Danh sách (host, sec_id) KHÔNG ĐẠT theo thứ tự host, section."""
+        width = len(self.sections)
+        return [
+            (self.hosts[cell // width], self.sections[cell % width])
+            for cell, state in enumerate(self.status) if state == RESULT_FAIL
+        ]
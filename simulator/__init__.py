@@ -0,0 +1,17 @@
+"""
+ESXi SSH simulator
+
+Chạy nhiều ESXi host giả lập (mỗi host một port) trên máy local để thử checker và
+benchmark mà không cần host thật:
+
+    python -m simulator --hosts 20 --vms 400 --latency-ms 20 --inventory sim.json
+    python main.py --inventory sim.json --workers 20
+
+- state.py: trạng thái host (settings, mạng, VM) và cây /vmfs/volumes trên đĩa
+- shim.py: esxcli / vim-cmd đọc và ghi trạng thái đó (lệnh sửa lỗi thay đổi trạng thái thật)
+- server.py: SSH server (paramiko) chạy lệnh exec bằng /bin/sh với shim trong PATH
+
+Package này không import server (paramiko) khi import, để shim khởi động nhanh.
+"""
+
+from .state import create_host_state, generate_state, load_state
@@ -0,0 +1,72 @@
+"""
+Chạy fleet ESXi giả lập: python -m simulator --hosts N [--inventory FILE] ...
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+
+from simulator.server import start_fleet, stop_fleet, fleet_inventory
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulator", description="ESXi SSH simulator")
+    parser.add_argument("--hosts", type=int, default=1, help="Số host giả lập (mặc định 1)")
+    parser.add_argument("--base-port", type=int, default=2201, help="Port của host đầu tiên (mặc định 2201)")
+    parser.add_argument("--bind", default="127.0.0.1", help="Địa chỉ lắng nghe (mặc định 127.0.0.1)")
+    parser.add_argument("--state-dir", default="esxsim-state", help="Thư mục trạng thái (mặc định ./esxsim-state)")
+    parser.add_argument("--vms", type=int, default=10, help="Số VM mỗi host (mặc định 10)")
+    parser.add_argument("--failure-rate", type=float, default=0.3,
+                        help="Xác suất mỗi setting mang giá trị KHÔNG ĐẠT (0 = host đạt toàn bộ, mặc định 0.3)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Độ trễ mỗi lần exec (ms)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Dao động ngẫu nhiên của độ trễ (ms)")
+    parser.add_argument("--hostd-ms", type=float, default=0.0,
+                        help="Độ trễ thêm của lệnh vim-cmd (ms), nhân với bình phương số lệnh vim-cmd đồng thời")
+    parser.add_argument("--username", default="root")
+    parser.add_argument("--password", default="simulator")
+    parser.add_argument("--reset", action="store_true", help="Tạo lại trạng thái của các host đã có")
+    parser.add_argument("--inventory", metavar="FILE", help="Ghi inventory (JSON) trỏ tới các host giả lập")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        hosts = start_fleet(
+            args.state_dir, args.hosts, base_port=args.base_port, vm_count=args.vms,
+            failure_rate=args.failure_rate, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+            bind=args.bind, username=args.username, password=args.password, reset=args.reset,
+            hostd_latency=args.hostd_ms / 1000,
+        )
+    except OSError as e:
+        print(f"LỖI: không khởi động được simulator: {e}")
+        return 1
+
+    if args.inventory:
+        address = "127.0.0.1" if args.bind in ("0.0.0.0", "") else args.bind
+        with open(args.inventory, "w", encoding="utf-8") as f:
+            json.dump(fleet_inventory(hosts, address), f, indent=2)
+        print(f"Đã ghi inventory: {args.inventory}")
+
+    print(f"{len(hosts)} host giả lập trên {args.bind}:{args.base_port}-{args.base_port + len(hosts) - 1}, "
+          f"trạng thái ở {os.path.abspath(args.state_dir)} (Ctrl+C để dừng)")
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        while not stopped.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    stop_fleet(hosts)
+    for host in hosts:
+        print(f"  port {host.port}: {host.stats['connections']} kết nối, {host.stats['execs']} exec, "
+              f"{host.stats['bytes_out']} byte")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+SSH server giả lập ESXi (paramiko ServerInterface)
+
+Mỗi SimulatedHost nghe trên một port riêng và có thư mục trạng thái riêng (state.py).
+Lệnh exec được chạy bằng /bin/sh thật với:
+
+- thư mục bin của simulator đầu PATH: esxcli / vim-cmd chạy vào shim.py
+- mọi đường dẫn /vmfs/volumes, /etc/vmware, /etc/vmsyslog.conf và /var/db/esximg trong lệnh được trỏ vào
+  thư mục trạng thái, và đổi ngược lại trong output, nên grep / sed / cat / stat / cp / mv
+  chạy trên file .vmx thật và md5sum chạy trên file cấu hình sinh từ state.json
+
+Độ trễ mạng được mô phỏng bằng cách chờ `latency` giây (± jitter) trước khi trả kết quả
+mỗi lần exec và 2 * latency khi bắt tay SSH. Với hostd_latency, lệnh có `vim-cmd` chờ thêm
+hostd_latency * n^2 giây (n = số lệnh vim-cmd đang chạy đồng thời trên host), mô phỏng
+hostd chậm dần khi bị gọi dồn dập.
+"""
+
+import contextlib
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import paramiko
+
+from simulator.state import create_host_state
+
+VMFS_ROOT = "/vmfs/volumes"
+# Các đường dẫn trên host được trỏ vào thư mục trạng thái
+SIMULATED_PATHS = (VMFS_ROOT, "/etc/vmware", "/etc/vmsyslog.conf", "/var/db/esximg")
+SHIM_TOOLS = ("esxcli", "vim-cmd")
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# vmsvc/reload được gọi một lần cho mỗi VM khi sửa 7.x; xử lý ngay trong shell để
+# không tốn một lần khởi động Python cho mỗi VM (chỉ kiểm tra vmid có tồn tại)
+VIM_CMD_FAST_PATH = """if [ "$1" = vmsvc/reload ] && [ -n "$2" ]; then
+  grep -q "\\"vmid\\": $2," "$ESXSIM_STATE/state.json" && exit 0
+  echo "Unable to find a VM corresponding to \\"$2\\"" >&2; exit 1
+fi
+"""
+
+
+def install_shims(bin_dir):
+    """Tạo các script esxcli / vim-cmd gọi vào simulator.shim."""
+    os.makedirs(bin_dir, exist_ok=True)
+    for tool in SHIM_TOOLS:
+        path = os.path.join(bin_dir, tool)
+        fast_path = VIM_CMD_FAST_PATH if tool == "vim-cmd" else ""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f'#!/bin/sh\n{fast_path}exec "{sys.executable}" -m simulator.shim {tool} "$@"\n')
+        os.chmod(path, 0o755)
+    return bin_dir
+
+
+def load_host_key(path):
+    """Host key RSA của simulator; tạo mới và lưu lại nếu chưa có."""
+    if os.path.exists(path):
+        return paramiko.RSAKey(filename=path)
+    key = paramiko.RSAKey.generate(2048)
+    key.write_private_key_file(path)
+    return key
+
+
+class _EsxiServerInterface(paramiko.ServerInterface):
+    """Xác thực và mở channel exec cho một kết nối tới SimulatedHost."""
+
+    def __init__(self, host):
+        self.host = host
+
+    def get_allowed_auths(self, username):
+        return "password,publickey"
+
+    def check_auth_password(self, username, password):
+        if username == self.host.username and password == self.host.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        if username == self.host.username and self.host.accept_any_key:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        command = command.decode("utf-8", errors="replace") if isinstance(command, bytes) else command
+        threading.Thread(target=self.host.handle_exec, args=(channel, command), daemon=True).start()
+        return True
+
+
+class SimulatedHost:
+    """
+    Một ESXi host giả lập.
+
+    state_dir: thư mục trạng thái (tạo bằng create_host_state nếu chưa có)
+    latency / jitter: độ trễ (giây) cho mỗi lần exec
+    hostd_latency: độ trễ thêm của lệnh vim-cmd, tăng theo bình phương số lệnh vim-cmd đồng thời
+    stats: số kết nối, số lần exec và số byte gửi đi, để benchmark đối chiếu
+    """
+
+    def __init__(self, state_dir, port, host_key, bin_dir, bind="127.0.0.1",
+                 username="root", password="simulator", latency=0.0, jitter=0.0, accept_any_key=True,
+                 hostd_latency=0.0):
+        self.state_dir = os.path.abspath(state_dir)
+        self.port = port
+        self.host_key = host_key
+        self.bin_dir = bin_dir
+        self.bind = bind
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.hostd_latency = hostd_latency
+        self._hostd_inflight = 0
+        self.accept_any_key = accept_any_key
+        self.stats = {"connections": 0, "execs": 0, "bytes_out": 0}
+        self._stats_lock = threading.Lock()
+        self._sock = None
+        self._transports = []
+        self._closed = threading.Event()
+        self._env = {
+            **os.environ,
+            "PATH": f"{bin_dir}:{os.environ.get('PATH', '/usr/bin:/bin')}",
+            "PYTHONPATH": os.pathsep.join(p for p in (PACKAGE_PARENT, os.environ.get("PYTHONPATH")) if p),
+            "ESXSIM_STATE": self.state_dir,
+        }
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for name, n in deltas.items():
+                self.stats[name] += n
+
+    def _delay(self, rounds=1):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, rounds * self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    @contextlib.contextmanager
+    def _hostd_call(self, command):
+        """Giữ một "lời gọi hostd" trong khi chạy lệnh vim-cmd, chờ thêm theo số lời gọi đồng thời."""
+        if not self.hostd_latency or "vim-cmd" not in command:
+            yield
+            return
+        with self._stats_lock:
+            self._hostd_inflight += 1
+            inflight = self._hostd_inflight
+        try:
+            time.sleep(self.hostd_latency * inflight * inflight)
+            yield
+        finally:
+            with self._stats_lock:
+                self._hostd_inflight -= 1
+
+    def handle_exec(self, channel, command):
+        """Chạy một lệnh exec và gửi stdout / stderr / exit status về channel."""
+        self._count(execs=1)
+        try:
+            for path in SIMULATED_PATHS:
+                command = command.replace(path, self.state_dir + path)
+            with self._hostd_call(command):
+                proc = subprocess.run(["/bin/sh", "-c", command], capture_output=True, env=self._env,
+                                      cwd=self.state_dir)
+            out, err = proc.stdout, proc.stderr
+            for path in SIMULATED_PATHS:
+                local = (self.state_dir + path).encode()
+                out = out.replace(local, path.encode())
+                err = err.replace(local, path.encode())
+            self._delay()
+            channel.sendall(out)
+            if err:
+                channel.sendall_stderr(err)
+            channel.send_exit_status(proc.returncode)
+            self._count(bytes_out=len(out) + len(err))
+        except (OSError, EOFError, paramiko.SSHException):
+            pass
+        finally:
+            channel.close()
+
+    def _handle_connection(self, client):
+        self._count(connections=1)
+        self._delay(2)
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        self._transports.append(transport)
+        try:
+            transport.start_server(server=_EsxiServerInterface(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+            return
+        # Giữ tham chiếu tới các channel đang mở: Channel bị thu gom sẽ tự đóng (__del__)
+        channels = []
+        while transport.is_active() and not self._closed.is_set():
+            channel = transport.accept(timeout=1)
+            channels = [c for c in channels if not c.closed]
+            if channel is not None:
+                channels.append(channel)
+        transport.close()
+        self._transports.remove(transport)
+
+    def _serve(self):
+        while not self._closed.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle_connection, args=(client,), daemon=True).start()
+
+    def start(self):
+        """Mở socket và bắt đầu nhận kết nối trong thread nền."""
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.bind, self.port))
+        self._sock.listen(128)
+        threading.Thread(target=self._serve, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._closed.set()
+        if self._sock is not None:
+            self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+
+def start_fleet(state_dir, count, base_port=2201, vm_count=10, failure_rate=0.3, latency=0.0, jitter=0.0,
+                bind="127.0.0.1", username="root", password="simulator", reset=False, hostd_latency=0.0):
+    """
+    Khởi động `count` host giả lập trên các port base_port, base_port + 1, ...
+
+    Trạng thái của host trên port P nằm ở <state_dir>/host-P (giữ lại giữa các lần chạy
+    để kiểm tra kết quả sửa lỗi, trừ khi reset). Trả về danh sách SimulatedHost đã start.
+    """
+    state_dir = os.path.abspath(state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    bin_dir = install_shims(os.path.join(state_dir, "bin"))
+    host_key = load_host_key(os.path.join(state_dir, "host_key"))
+
+    hosts = []
+    try:
+        for i in range(count):
+            port = base_port + i
+            root = create_host_state(os.path.join(state_dir, f"host-{port}"), f"esx-{port}",
+                                     vm_count=vm_count, failure_rate=failure_rate, seed=port, reset=reset)
+            hosts.append(SimulatedHost(root, port, host_key, bin_dir, bind=bind, username=username,
+                                       password=password, latency=latency, jitter=jitter,
+                                       hostd_latency=hostd_latency).start())
+    except OSError:
+        stop_fleet(hosts)
+        raise
+    return hosts
+
+
+def stop_fleet(hosts):
+    for host in hosts:
+        host.stop()
+
+
+def fleet_inventory(hosts, host="127.0.0.1"):
+    """Inventory (định dạng của inventory.py) trỏ tới các host giả lập."""
+    first = hosts[0] if hosts else None
+    return {
+        "credential_groups": {
+            "simulator": {
+                "username": first.username if first else "root",
+                "password": first.password if first else "simulator",
+            }
+        },
+        "groups": [
+            {
+                "name": "simulator",
+                "credentials": "simulator",
+                "hosts": [{"host": host, "port": h.port, "site": "sim"} for h in hosts],
+            }
+        ],
+    }
@@ -0,0 +1,399 @@
+"""
+Shim esxcli / vim-cmd cho host giả lập
+
+Server đặt thư mục bin của simulator lên đầu PATH, nên mọi lệnh esxcli / vim-cmd
+trong script của checker (kể cả trong vòng lặp shell) đều chạy vào đây:
+
+    python -m simulator.shim esxcli system settings advanced list
+    python -m simulator.shim vim-cmd hostsvc/advopt/view Security.AccountLockFailures
+
+Trạng thái host lấy từ thư mục $ESXSIM_STATE (xem state.py). Output mô phỏng định dạng
+của ESXi 8 đủ cho các parser trong checks/.
+"""
+
+import os
+import sys
+
+from simulator.state import SECURITY_FIELDS, locked_state
+
+SECURITY_LABELS = {
+    "allow_promiscuous": ("Allow Promiscuous", "--allow-promiscuous"),
+    "allow_mac_change": ("Allow MAC Address Change", "--allow-mac-change"),
+    "allow_forged_transmits": ("Allow Forged Transmits", "--allow-forged-transmits"),
+}
+
+
+class ShimError(Exception):
+    """Lệnh không hợp lệ; in ra stderr và thoát với mã 1 như esxcli."""
+
+
+def parse_options(args):
+    """Tách ['-o', '/A/B', '--level=X', ...] thành dict {'-o': '/A/B', '--level': 'X'}."""
+    options = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("-"):
+            if "=" in arg:
+                name, value = arg.split("=", 1)
+            elif i + 1 < len(args):
+                name, value = arg, args[i + 1]
+                i += 1
+            else:
+                name, value = arg, ""
+            options[name] = value
+        i += 1
+    return options
+
+
+def _option(options, *names):
+    for name in names:
+        if name in options:
+            return options[name]
+    raise ShimError(f"Error: Missing required parameter {names[-1]}")
+
+
+def _bool(value):
+    value = str(value).strip().lower()
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("false", "0", "no"):
+        return False
+    raise ShimError(f"Error: Invalid boolean value {value}")
+
+
+def _fmt_bool(value):
+    return "true" if value else "false"
+
+
+def _find(items, name, kind):
+    for item in items:
+        if item["name"] == name:
+            return item
+    raise ShimError(f"Error: {kind} {name} not found")
+
+
+# ==================== esxcli ====================
+
+def esxcli_acceptance_get(root, options):
+    with locked_state(root) as state:
+        return state["acceptance"] + "\n"
+
+
+def esxcli_acceptance_set(root, options):
+    level = _option(options, "--level")
+    with locked_state(root, write=True) as state:
+        state["acceptance"] = level
+    return f"Host acceptance level changed to '{level}'.\n"
+
+
+def esxcli_vib_list(root, options):
+    with locked_state(root) as state:
+        vibs = state["vibs"]
+    rows = [("Name", "Version", "Vendor", "Acceptance Level", "Install Date", "Platforms")]
+    rows += [(name, version, vendor, level, "2024-01-15", "host") for name, version, vendor, level in vibs]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = ["  ".join(cell.ljust(w) for cell, w in zip(rows[0], widths)).rstrip()]
+    lines.append("  ".join("-" * w for w in widths))
+    lines += ["  ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip() for row in rows[1:]]
+    return "\n".join(lines) + "\n"
+
+
+def _advanced_block(path, setting):
+    return (
+        f"   Path: {path}\n"
+        f"   Type: integer\n"
+        f"   Int Value: {setting['value']}\n"
+        f"   Default Int Value: {setting['default']}\n"
+        f"   Min Value: {setting['min']}\n"
+        f"   Max Value: {setting['max']}\n"
+        f"   String Value: \n"
+        f"   Default String Value: \n"
+        f"   Valid Characters: \n"
+        f"   Description: {setting['description']}\n"
+    )
+
+
+def esxcli_advanced_list(root, options):
+    with locked_state(root) as state:
+        settings = state["advanced"]
+    path = options.get("-o") or options.get("--option")
+    if path:
+        if path not in settings:
+            raise ShimError(f"Error: Unable to find option {path.rsplit('/', 1)[-1]}")
+        return _advanced_block(path, settings[path])
+    return "\n".join(_advanced_block(p, s) for p, s in sorted(settings.items()))
+
+
+def esxcli_advanced_set(root, options):
+    path = _option(options, "--option", "-o")
+    raw = _option(options, "--int-value", "-i")
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ShimError(f"Error: Invalid integer value {raw}")
+    with locked_state(root, write=True) as state:
+        setting = state["advanced"].get(path)
+        if setting is None:
+            raise ShimError(f"Error: Unable to find option {path.rsplit('/', 1)[-1]}")
+        if not setting["min"] <= value <= setting["max"]:
+            raise ShimError(f"Error: Value {value} out of range [{setting['min']}, {setting['max']}]")
+        setting["value"] = value
+    return ""
+
+
+def esxcli_syslog_get(root, options):
+    with locked_state(root) as state:
+        loghost = state["syslog"]["loghost"]
+    return (
+        "   Check Certificate Revocation: false\n"
+        "   Default Network Retry Timeout: 180\n"
+        "   Dropped Log File Rotation Size: 100\n"
+        "   Dropped Log File Rotations: 10\n"
+        "   Local Log Output: /scratch/log\n"
+        "   Local Log Output Is Configured: false\n"
+        "   Log Level: error\n"
+        f"   Remote Host: {loghost}\n"
+        "   Strict X509 Compliance: false\n"
+    )
+
+
+def esxcli_syslog_set(root, options):
+    loghost = _option(options, "--loghost")
+    with locked_state(root, write=True) as state:
+        state["syslog"]["loghost"] = loghost or "<none>"
+    return ""
+
+
+def esxcli_syslog_reload(root, options):
+    return ""
+
+
+def esxcli_vswitch_list(root, options):
+    with locked_state(root) as state:
+        vswitches = state["vswitches"]
+        portgroups = state["portgroups"]
+    blocks = []
+    for vs in vswitches:
+        pgs = [pg["name"] for pg in portgroups if pg["vswitch"] == vs["name"]]
+        blocks.append(
+            f"{vs['name']}\n"
+            f"   Name: {vs['name']}\n"
+            f"   Class: cswitch\n"
+            f"   Num Ports: 2560\n"
+            f"   Used Ports: {len(pgs) + 2}\n"
+            f"   MTU: 1500\n"
+            f"   Portgroups: {', '.join(pgs)}\n"
+            f"   Uplinks: {', '.join(vs['uplinks'])}\n"
+        )
+    return "\n".join(blocks)
+
+
+def esxcli_portgroup_list(root, options):
+    with locked_state(root) as state:
+        portgroups = state["portgroups"]
+    rows = [("Name", "Virtual Switch", "Active Clients", "VLAN ID")]
+    rows += [(pg["name"], pg["vswitch"], "1", str(pg["vlan"])) for pg in portgroups]
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    lines = []
+    for n, row in enumerate(rows):
+        lines.append(f"{row[0].ljust(widths[0])}  {row[1].ljust(widths[1])}  "
+                     f"{row[2].rjust(widths[2])}  {row[3].rjust(widths[3])}")
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines) + "\n"
+
+
+def _effective_policy(state, pg):
+    vswitch = _find(state["vswitches"], pg["vswitch"], "Virtual switch")
+    return {
+        field: pg["policy"][field] if pg["override"][field] else vswitch["policy"][field]
+        for field in SECURITY_FIELDS
+    }
+
+
+def esxcli_vswitch_policy_get(root, options):
+    name = _option(options, "--vswitch-name", "-v")
+    with locked_state(root) as state:
+        policy = _find(state["vswitches"], name, "Virtual switch")["policy"]
+    return "".join(f"   {SECURITY_LABELS[f][0]}: {_fmt_bool(policy[f])}\n" for f in SECURITY_FIELDS)
+
+
+def _policy_updates(options):
+    updates = {}
+    for field in SECURITY_FIELDS:
+        flag = SECURITY_LABELS[field][1]
+        if flag in options:
+            updates[field] = _bool(options[flag])
+    if not updates:
+        raise ShimError("Error: At least one policy option is required")
+    return updates
+
+
+def esxcli_vswitch_policy_set(root, options):
+    name = _option(options, "--vswitch-name", "-v")
+    updates = _policy_updates(options)
+    with locked_state(root, write=True) as state:
+        _find(state["vswitches"], name, "Virtual switch")["policy"].update(updates)
+    return ""
+
+
+def esxcli_portgroup_policy_get(root, options):
+    name = _option(options, "--portgroup-name", "-p")
+    with locked_state(root) as state:
+        pg = _find(state["portgroups"], name, "Portgroup")
+        policy = _effective_policy(state, pg)
+    out = "".join(f"   {SECURITY_LABELS[f][0]}: {_fmt_bool(policy[f])}\n" for f in SECURITY_FIELDS)
+    out += "".join(f"   Override Vswitch {SECURITY_LABELS[f][0]}: {_fmt_bool(pg['override'][f])}\n"
+                   for f in SECURITY_FIELDS)
+    return out
+
+
+def esxcli_portgroup_policy_set(root, options):
+    name = _option(options, "--portgroup-name", "-p")
+    updates = _policy_updates(options)
+    with locked_state(root, write=True) as state:
+        pg = _find(state["portgroups"], name, "Portgroup")
+        for field, value in updates.items():
+            pg["policy"][field] = value
+            pg["override"][field] = True
+    return ""
+
+
+def esxcli_portgroup_set(root, options):
+    name = _option(options, "--portgroup-name", "-p")
+    raw = _option(options, "--vlan-id", "-v")
+    try:
+        vlan = int(raw)
+    except ValueError:
+        raise ShimError(f"Error: Invalid VLAN ID {raw}")
+    if not 0 <= vlan <= 4095:
+        raise ShimError(f"Error: VLAN ID {vlan} out of range [0, 4095]")
+    with locked_state(root, write=True) as state:
+        _find(state["portgroups"], name, "Portgroup")["vlan"] = vlan
+    return ""
+
+
+ESXCLI_COMMANDS = {
+    "software acceptance get": esxcli_acceptance_get,
+    "software acceptance set": esxcli_acceptance_set,
+    "software vib list": esxcli_vib_list,
+    "system settings advanced list": esxcli_advanced_list,
+    "system settings advanced set": esxcli_advanced_set,
+    "system syslog config get": esxcli_syslog_get,
+    "system syslog config set": esxcli_syslog_set,
+    "system syslog reload": esxcli_syslog_reload,
+    "network vswitch standard list": esxcli_vswitch_list,
+    "network vswitch standard portgroup list": esxcli_portgroup_list,
+    "network vswitch standard policy security get": esxcli_vswitch_policy_get,
+    "network vswitch standard policy security set": esxcli_vswitch_policy_set,
+    "network vswitch standard portgroup policy security get": esxcli_portgroup_policy_get,
+    "network vswitch standard portgroup policy security set": esxcli_portgroup_policy_set,
+    "network vswitch standard portgroup set": esxcli_portgroup_set,
+}
+
+
+def run_esxcli(root, args):
+    words = []
+    for arg in args:
+        if arg.startswith("-"):
+            break
+        words.append(arg)
+    handler = ESXCLI_COMMANDS.get(" ".join(words))
+    if handler is None:
+        raise ShimError(f"Error: Unknown command or namespace {' '.join(words)}")
+    return handler(root, parse_options(args[len(words):]))
+
+
+# ==================== vim-cmd ====================
+
+def vim_getallvms(root, args):
+    with locked_state(root) as state:
+        vms = state["vms"]
+    lines = ["Vmid      Name                   File                             Guest OS          Version   Annotation"]
+    for vm in vms:
+        lines.append(f"{str(vm['vmid']).ljust(9)} {vm['name'].ljust(22)} "
+                     f"[{vm['datastore']}] {vm['dir']}/{vm['dir']}.vmx   otherLinux64Guest   vmx-19")
+    return "\n".join(lines) + "\n"
+
+
+def vim_reload(root, args):
+    if not args:
+        raise ShimError("Insufficient arguments.")
+    with locked_state(root) as state:
+        if not any(str(vm["vmid"]) == args[0] for vm in state["vms"]):
+            raise ShimError(f"Unable to find a VM corresponding to \"{args[0]}\"")
+    return ""
+
+
+def vim_advopt_view(root, args):
+    if not args:
+        raise ShimError("Insufficient arguments.")
+    key = args[0]
+    with locked_state(root) as state:
+        opt = state["advopts"].get(key)
+    if opt is None:
+        raise ShimError(f"(vim.fault.InvalidName) {{\n   name = \"{key}\",\n   msg = \"\"\n}}")
+    value = _fmt_bool(opt["value"]) if opt["type"] == "bool" else opt["value"]
+    return (
+        "(vim.option.OptionValue) [\n"
+        "   (vim.option.OptionValue) {\n"
+        f"      key = \"{key}\",\n"
+        f"      value = {value}\n"
+        "   }\n"
+        "]\n"
+    )
+
+
+def vim_advopt_update(root, args):
+    if len(args) < 3:
+        raise ShimError("Insufficient arguments.")
+    key, kind, raw = args[0], args[1], args[2]
+    with locked_state(root, write=True) as state:
+        opt = state["advopts"].get(key)
+        if opt is None:
+            raise ShimError(f"(vim.fault.InvalidName) {{\n   name = \"{key}\",\n   msg = \"\"\n}}")
+        if kind != opt["type"]:
+            raise ShimError(f"(vmodl.fault.InvalidArgument) type mismatch for {key}")
+        if kind == "bool":
+            opt["value"] = _bool(raw)
+        else:
+            try:
+                opt["value"] = int(raw)
+            except ValueError:
+                raise ShimError(f"(vmodl.fault.InvalidArgument) invalid value {raw}")
+    return ""
+
+
+VIM_COMMANDS = {
+    "vmsvc/getallvms": vim_getallvms,
+    "vmsvc/reload": vim_reload,
+    "hostsvc/advopt/view": vim_advopt_view,
+    "hostsvc/advopt/update": vim_advopt_update,
+}
+
+
+def run_vim_cmd(root, args):
+    if not args or args[0] not in VIM_COMMANDS:
+        raise ShimError(f"Unknown command: '{args[0] if args else ''}'")
+    return VIM_COMMANDS[args[0]](root, args[1:])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    root = os.environ.get("ESXSIM_STATE")
+    if not root or not argv:
+        print("usage: ESXSIM_STATE=<dir> python -m simulator.shim esxcli|vim-cmd ...", file=sys.stderr)
+        return 2
+    tool, args = argv[0], argv[1:]
+    try:
+        out = run_esxcli(root, args) if tool == "esxcli" else run_vim_cmd(root, args)
+    except ShimError as e:
+        print(e, file=sys.stderr)
+        return 1
+    sys.stdout.write(out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
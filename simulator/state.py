@@ -0,0 +1,231 @@
+"""
+Trạng thái của một ESXi host giả lập
+
+Mỗi host có một thư mục trạng thái:
+
+    <root>/state.json             # acceptance, VIB, advanced settings, advopt, syslog, mạng, VM
+    <root>/state.lock             # khóa khi shim đọc/ghi state.json (nhiều channel chạy song song)
+    <root>/vmfs/volumes/<ds>/...  # file .vmx thật của các VM, lệnh grep/sed/cat/stat chạy trên đây
+    <root>/etc/...                # esx.conf, hostd/config.xml, vmsyslog.conf sinh lại từ state.json
+                                  # mỗi lần ghi (để dấu vân tay cấu hình của --delta thay đổi theo)
+    <root>/var/db/esximg/...      # image profile và một file mỗi VIB, cũng sinh lại mỗi lần ghi
+
+Module này chỉ dùng thư viện chuẩn (không import paramiko) vì shim esxcli / vim-cmd
+import nó ở mỗi lần gọi lệnh.
+"""
+
+import fcntl
+import json
+import os
+import random
+from contextlib import contextmanager
+
+STATE_FILE = "state.json"
+LOCK_FILE = "state.lock"
+DATASTORE = "datastore1"
+ESXIMG_DIR = os.path.join("var", "db", "esximg")
+
+# Giá trị đạt yêu cầu (compliant) và giá trị mặc định "chưa hardening" của host
+ADVANCED_SETTINGS = {
+    # path: (giá trị đạt, giá trị chưa đạt, min, max, mô tả)
+    "/UserVars/DcuiTimeOut": (600, 0, 0, 86400, "Idle time in seconds before DCUI is automatically logged out"),
+    "/UserVars/ESXiShellInteractiveTimeOut": (300, 0, 0, 86400, "Idle time before an interactive shell is automatically logged out"),
+    "/UserVars/ESXiShellTimeOut": (3600, 0, 0, 86400, "Time before automatically disabling local and remote shell access"),
+    "/Mem/ShareForceSalting": (2, 0, 0, 2, "Extra salting for page sharing"),
+}
+
+HOST_ADVOPTS = {
+    # key: (kiểu, giá trị đạt, giá trị chưa đạt)
+    "Config.HostAgent.plugins.solo.enableMob": ("bool", False, True),
+    "Security.AccountLockFailures": ("int", 5, 10),
+    "Security.AccountUnlockTime": ("int", 900, 120),
+}
+
+VMX_SETTINGS = {
+    # key: (giá trị đạt, giá trị chưa đạt)
+    "RemoteDisplay.maxConnections": ("1", "4"),
+    "isolation.tools.diskShrink.disable": ("TRUE", "FALSE"),
+    "isolation.tools.diskWiper.disable": ("TRUE", "FALSE"),
+    "tools.guestlib.enableHostInfo": ("FALSE", "TRUE"),
+    "log.keepOld": ("10", "20"),
+    "log.rotateSize": ("1000000", "0"),
+}
+
+BASE_VIBS = [
+    ("esx-base", "8.0.2-0.0.22380479", "VMware", "VMwareCertified"),
+    ("esx-ui", "2.13.0-22040009", "VMware", "VMwareCertified"),
+    ("vmkusb", "0.1-19vmw.802.0.0.22380479", "VMW", "VMwareCertified"),
+    ("nmlx5-core", "4.23.0.66-1vmw.802.0.0.22380479", "VMW", "VMwareCertified"),
+    ("lsi-mr3", "7.727.02.00-1vmw.802.0.0.22380479", "VMW", "VMwareCertified"),
+]
+COMMUNITY_VIB = ("net-community", "1.2.0.0-1", "community", "CommunitySupported")
+
+SECURITY_FIELDS = ("allow_promiscuous", "allow_mac_change", "allow_forged_transmits")
+
+
+def _policy(rng, failure_rate):
+    return {field: rng.random() < failure_rate for field in SECURITY_FIELDS}
+
+
+def generate_state(name, vm_count=10, failure_rate=0.3, seed=None):
+    """
+    Tạo trạng thái ngẫu nhiên (theo seed) cho một host.
+
+    failure_rate là xác suất mỗi setting của host / mỗi key của từng VM mang giá trị
+    KHÔNG ĐẠT; 0 cho host đạt toàn bộ. Trả về (state, {tên VM: nội dung .vmx}).
+    """
+    rng = random.Random(seed if seed is not None else name)
+
+    def bad():
+        return rng.random() < failure_rate
+
+    state = {
+        "hostname": name,
+        "acceptance": "CommunitySupported" if bad() else "PartnerSupported",
+        "vibs": [list(v) for v in BASE_VIBS] + ([list(COMMUNITY_VIB)] if bad() else []),
+        "advanced": {
+            path: {"value": bad_value if bad() else good, "default": bad_value, "min": low, "max": high,
+                   "description": desc}
+            for path, (good, bad_value, low, high, desc) in ADVANCED_SETTINGS.items()
+        },
+        "advopts": {
+            key: {"type": kind, "value": bad_value if bad() else good}
+            for key, (kind, good, bad_value) in HOST_ADVOPTS.items()
+        },
+        "syslog": {"loghost": "<none>" if bad() else "udp://10.0.0.10:514"},
+        "vswitches": [
+            {"name": "vSwitch0", "uplinks": ["vmnic0"], "policy": _policy(rng, failure_rate)},
+            {"name": "vSwitch1", "uplinks": ["vmnic1", "vmnic2"], "policy": _policy(rng, failure_rate)},
+        ],
+        "portgroups": [
+            {"name": "Management Network", "vswitch": "vSwitch0", "vlan": 0},
+            {"name": "VM Network", "vswitch": "vSwitch0", "vlan": 1 if bad() else 20},
+            {"name": "DMZ Net", "vswitch": "vSwitch1", "vlan": 4095 if bad() else 30},
+        ],
+        "vms": [],
+    }
+    for pg in state["portgroups"]:
+        override = {field: bad() for field in SECURITY_FIELDS}
+        pg["policy"] = {field: override[field] for field in SECURITY_FIELDS}
+        pg["override"] = override
+
+    vmx_files = {}
+    for i in range(1, vm_count + 1):
+        vm_name = f"vm-{i:04d}"
+        state["vms"].append({"vmid": i, "name": vm_name, "datastore": DATASTORE, "dir": vm_name})
+        lines = [
+            '.encoding = "UTF-8"',
+            'config.version = "8"',
+            'virtualHW.version = "19"',
+            f'displayName = "{vm_name}"',
+            'guestOS = "otherlinux-64"',
+            'memSize = "2048"',
+            'numvcpus = "2"',
+        ]
+        for key, (good, bad_value) in VMX_SETTINGS.items():
+            r = rng.random()
+            if r < failure_rate / 2:
+                continue  # thiếu key -> KHÔNG ĐẠT
+            lines.append(f'{key} = "{bad_value if r < failure_rate else good}"')
+        # Một phần file .vmx không kết thúc bằng newline (như file sửa tay), để lệnh dump /
+        # sửa lỗi được thử với cả hai dạng
+        vmx_files[vm_name] = "\n".join(lines) + ("" if i % 3 == 0 else "\n")
+    return state, vmx_files
+
+
+def vmx_path(root, vm):
+    return os.path.join(root, "vmfs", "volumes", vm["datastore"], vm["dir"], f"{vm['dir']}.vmx")
+
+
+def create_host_state(root, name, vm_count=10, failure_rate=0.3, seed=None, reset=False):
+    """Tạo thư mục trạng thái cho host (giữ nguyên nếu đã có, trừ khi reset)."""
+    if os.path.exists(os.path.join(root, STATE_FILE)) and not reset:
+        return root
+    state, vmx_files = generate_state(name, vm_count=vm_count, failure_rate=failure_rate, seed=seed)
+    for vm in state["vms"]:
+        path = vmx_path(root, vm)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(vmx_files[vm["name"]])
+    save_state(root, state)
+    return root
+
+
+def load_state(root):
+    with open(os.path.join(root, STATE_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def render_config_files(state):
+    """Nội dung các file cấu hình của host ({đường dẫn tương đối: nội dung}), theo bố cục của ESXi."""
+    esx_conf = [f'/system/acceptance = "{state["acceptance"]}"']
+    for path, setting in sorted(state["advanced"].items()):
+        esx_conf.append(f'/adv{path} = "{setting["value"]}"')
+    for key, opt in sorted(state["advopts"].items()):
+        if key.startswith("Security."):
+            esx_conf.append(f'/adv/{key.replace(".", "/")} = "{opt["value"]}"')
+    esx_conf.append(f'/adv/Syslog/global/logHost = "{state["syslog"]["loghost"]}"')
+    for i, vs in enumerate(state["vswitches"]):
+        base = f"/net/vswitch/child[{i:04d}]"
+        esx_conf.append(f'{base}/name = "{vs["name"]}"')
+        esx_conf.extend(f'{base}/secPolicy/{field} = "{str(value).lower()}"' for field, value in sorted(vs["policy"].items()))
+    for i, pg in enumerate(state["portgroups"]):
+        base = f"/net/portgroup/child[{i:04d}]"
+        esx_conf.append(f'{base}/name = "{pg["name"]}"')
+        esx_conf.append(f'{base}/vswitch = "{pg["vswitch"]}"')
+        esx_conf.append(f'{base}/vlanId = "{pg["vlan"]}"')
+        esx_conf.extend(f'{base}/secPolicy/{field} = "{str(value).lower()}"'
+                        for field, value in sorted(pg["policy"].items()) if pg["override"].get(field))
+
+    mob = state["advopts"]["Config.HostAgent.plugins.solo.enableMob"]["value"]
+    hostd = f"<config>\n  <plugins>\n    <solo>\n      <enableMob>{str(mob).lower()}</enableMob>\n" \
+            f"    </solo>\n  </plugins>\n</config>\n"
+    vibs = [f'  <vib name="{name}" version="{version}" vendor="{vendor}" acceptance="{level}"/>'
+            for name, version, vendor, level in state["vibs"]]
+    profile = f'<imageprofile name="{state["hostname"]}-profile" acceptancelevel="{state["acceptance"]}">\n' \
+              + "".join(line + "\n" for line in vibs) + "</imageprofile>\n"
+    files = {
+        os.path.join("etc", "vmware", "esx.conf"): "\n".join(esx_conf) + "\n",
+        os.path.join("etc", "vmware", "hostd", "config.xml"): hostd,
+        os.path.join("etc", "vmsyslog.conf"): f"[DEFAULT]\nloghost = {state['syslog']['loghost']}\n",
+        os.path.join(ESXIMG_DIR, "profiles", "host-profile"): profile,
+    }
+    for vib, line in zip(state["vibs"], vibs):
+        files[os.path.join(ESXIMG_DIR, "vibs", f"{vib[0]}.xml")] = line + "\n"
+    return files
+
+
+def _atomic_write(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def save_state(root, state):
+    """Ghi state.json và sinh lại các file cấu hình trong <root>/etc và <root>/var/db/esximg."""
+    files = render_config_files(state)
+    for rel_path, text in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, text)
+    # VIB đã bị gỡ: bỏ file của nó
+    vib_dir = os.path.join(ESXIMG_DIR, "vibs")
+    for name in os.listdir(os.path.join(root, vib_dir)):
+        if os.path.join(vib_dir, name) not in files:
+            os.remove(os.path.join(root, vib_dir, name))
+    _atomic_write(os.path.join(root, STATE_FILE), json.dumps(state, indent=1))
+
+
+@contextmanager
+def locked_state(root, write=False):
+    """Đọc state.json trong khóa; với write=True, state được ghi lại khi thoát khối."""
+    with open(os.path.join(root, LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+        try:
+            state = load_state(root)
+            yield state
+            if write:
+                save_state(root, state)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,255 @@
+"""
+Sink ghi kết quả theo luồng
+
+Kết quả của mỗi host được ghi ra (và flush) ngay khi host đó kiểm tra xong, nên một
+lần quét bị dừng giữa chừng vẫn giữ được mọi host đã xong, và bộ nhớ không tăng theo
+số host khi chạy với --stream-only.
+
+- JsonlSink: mỗi host một dòng JSON {"host", "sections": {sec_id: {...}}}
+- CsvSink: mỗi (host, section) một dòng
+- SqliteSink: bảng results(run_id, host, section, status, error, detail), commit theo host
+- SummarySink: tổng hợp (đếm theo mục, host tệ nhất) tính dần từ luồng, bộ nhớ cố định
+"""
+
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+
+STATUS_PASS = "pass"
+STATUS_FAIL = "fail"
+STATUS_ERROR = "error"
+
+CSV_FIELDS = ["host", "section", "status", "error", "detail"]
+
+
+def _json_default(value):
+    """Chuyển các kiểu không phải JSON (VmRecord, set, tuple...) khi ghi detail."""
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def dump_json(value):
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
+
+
+def new_run_id():
+    """
+    Mã của một lần chạy: thời điểm tới micro giây + pid, để hai lần chạy trong cùng một
+    giây (hai người vận hành, cron và chạy tay) không dùng chung journal / bản ghi kết quả.
+    Sắp xếp theo chuỗi vẫn đúng thứ tự thời gian.
+    """
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now % 1 * 1_000_000):06d}-{os.getpid()}"
+
+
+class ResultSink:
+    """Sink cơ sở: write_host được gọi một lần cho mỗi host khi host đó xong."""
+
+    def __init__(self, result_keys):
+        self.result_keys = result_keys
+
+    def section_status(self, sec_id, result):
+        if result.get("error"):
+            return STATUS_ERROR
+        return STATUS_PASS if result.get(self.result_keys[sec_id]) else STATUS_FAIL
+
+    def records(self, host, results):
+        """Các bản ghi (sec_id, status, error, detail) của một host."""
+        for sec_id, result in results.items():
+            yield sec_id, self.section_status(sec_id, result), result.get("error") or "", result.get("detail") or {}
+
+    def write_host(self, host, results):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonlSink(ResultSink):
+    """JSON Lines: một dòng cho mỗi host."""
+
+    def __init__(self, path, result_keys, run_id=None):
+        super().__init__(result_keys)
+        self.path = path
+        self.run_id = run_id
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write_host(self, host, results):
+        sections = {}
+        for sec_id, status, error, detail in self.records(host, results):
+            entry = {"status": status, "detail": detail}
+            if error:
+                entry["error"] = error
+            sections[sec_id] = entry
+        line = {"host": host, "run_id": self.run_id, "ts": round(time.time(), 3), "sections": sections}
+        self._file.write(dump_json(line) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvSink(ResultSink):
+    """CSV: một dòng cho mỗi (host, section), detail ghi dạng JSON."""
+
+    def __init__(self, path, result_keys, run_id=None):
+        super().__init__(result_keys)
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_FIELDS)
+        self._file.flush()
+
+    def write_host(self, host, results):
+        for sec_id, status, error, detail in self.records(host, results):
+            self._writer.writerow([host, sec_id, status, error, dump_json(detail)])
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink(ResultSink):
+    """SQLite: mỗi host được commit trong một transaction; nhiều lần chạy phân biệt bằng run_id."""
+
+    def __init__(self, path, result_keys, run_id=None):
+        super().__init__(result_keys)
+        self.path = path
+        self.run_id = run_id or new_run_id()
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " run_id TEXT NOT NULL,"
+                " host TEXT NOT NULL,"
+                " section TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " error TEXT,"
+                " detail TEXT,"
+                " ts REAL NOT NULL,"
+                " PRIMARY KEY (run_id, host, section))"
+            )
+
+    def write_host(self, host, results):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (run_id, host, section, status, error, detail, ts)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(self.run_id, host, sec_id, status, error, dump_json(detail), now)
+                 for sec_id, status, error, detail in self.records(host, results)],
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+class SummarySink(ResultSink):
+    """
+    Tổng hợp tính dần từ luồng kết quả: số ô ĐẠT / KHÔNG ĐẠT / LỖI, đếm theo mục và
+    top host tệ nhất (heap kích thước cố định), nên bộ nhớ không phụ thuộc số host.
+    """
+
+    def __init__(self, result_keys, top=10):
+        super().__init__(result_keys)
+        self.top = top
+        self.hosts = 0
+        self.hosts_failed = 0
+        self.hosts_error = 0
+        self.counts = {STATUS_PASS: 0, STATUS_FAIL: 0, STATUS_ERROR: 0}
+        self.sections = {}
+        self._worst = []
+
+    def write_host(self, host, results):
+        host_counts = {STATUS_PASS: 0, STATUS_FAIL: 0, STATUS_ERROR: 0}
+        for sec_id, status, _, _ in self.records(host, results):
+            host_counts[status] += 1
+            sec = self.sections.setdefault(sec_id, {STATUS_PASS: 0, STATUS_FAIL: 0, STATUS_ERROR: 0})
+            sec[status] += 1
+        for status, n in host_counts.items():
+            self.counts[status] += n
+        self.hosts += 1
+        self.hosts_failed += bool(host_counts[STATUS_FAIL])
+        self.hosts_error += bool(host_counts[STATUS_ERROR])
+
+        if host_counts[STATUS_FAIL] or host_counts[STATUS_ERROR]:
+            item = (host_counts[STATUS_FAIL], host_counts[STATUS_ERROR], host)
+            if len(self._worst) < self.top:
+                heapq.heappush(self._worst, item)
+            else:
+                heapq.heappushpop(self._worst, item)
+
+    def section_failure_rates(self):
+        rates = {}
+        for sec_id in sorted(self.sections, key=lambda s: [int(n) for n in s.split(".")]):
+            sec = self.sections[sec_id]
+            checked = sum(sec.values())
+            rates[sec_id] = {
+                "checked": checked,
+                "failed": sec[STATUS_FAIL],
+                "error": sec[STATUS_ERROR],
+                "failure_rate": round(sec[STATUS_FAIL] / checked, 4) if checked else 0.0,
+            }
+        return rates
+
+    def worst_hosts(self):
+        return [(host, failed, error) for failed, error, host in sorted(self._worst, reverse=True)]
+
+
+class MultiSink(ResultSink):
+    """Gửi kết quả của mỗi host tới nhiều sink; sink lỗi bị bỏ qua, không dừng lần quét."""
+
+    def __init__(self, sinks):
+        super().__init__(None)
+        self.sinks = list(sinks)
+        self._lock = threading.Lock()
+
+    def write_host(self, host, results):
+        with self._lock:
+            for sink in self.sinks:
+                try:
+                    sink.write_host(host, results)
+                except (OSError, sqlite3.Error, ValueError) as e:
+                    print(f"CẢNH BÁO: không ghi được kết quả của {host} vào {type(sink).__name__}: {e}")
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+SINK_TYPES = {
+    "jsonl": JsonlSink,
+    "csv": CsvSink,
+    "sqlite": SqliteSink,
+}
+
+
+def open_sinks(outputs, result_keys, run_id=None):
+    """
+    Mở các sink từ danh sách (loại, đường dẫn), ví dụ [("jsonl", "scan.jsonl")].
+
+    Sink nào không mở được thì sink đã mở trước đó được đóng lại và lỗi được raise.
+    """
+    sinks = []
+    try:
+        for kind, path in outputs:
+            path = os.path.expanduser(path)
+            sinks.append(SINK_TYPES[kind](path, result_keys, run_id=run_id))
+    except (OSError, sqlite3.Error):
+        for sink in sinks:
+            sink.close()
+        raise
+    return sinks
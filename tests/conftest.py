@@ -0,0 +1,8 @@
+"""Cấu hình chung cho pytest: cho phép import các module ở gốc repo (utils, checks, simulator...)."""
+
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
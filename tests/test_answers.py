@@ -0,0 +1,36 @@
+"""Kiểm tra answers trước khi sửa lỗi không tương tác (answers.py)."""
+
+import pytest
+
+from answers import is_valid_syslog_host, missing_answers, parse_vlan_args
+
+
+@pytest.mark.parametrize("value, valid", [
+    ("tcp://192.168.1.10:514", True),
+    ("udp://syslog.example.com:514, ssl://[fd00::10]:6514", True),
+    ("tcp://10.0.0.1:514'; reboot; '", False),
+    ("tcp://10.0.0.1:514 && reboot", False),
+    ("10.0.0.1:514", False),
+    ("tcp://10.0.0.1", False),
+    ("tcp://10.0.0.1:70000", False),
+])
+def test_syslog_host_format(value, valid):
+    assert is_valid_syslog_host(value) is valid
+    missing = missing_answers({"syslog_host": value}, "4.2", {})
+    if valid:
+        assert missing is None
+    else:
+        assert "không hợp lệ" in missing
+
+
+def test_vlan_args_range():
+    assert parse_vlan_args(["VM Network=20", "*=0"]) == {"VM Network": 20, "*": 0}
+    for item in ("VM Network=4095", "VM Network=99999", "VM Network=x"):
+        with pytest.raises(ValueError, match="Tham số --vlan không hợp lệ"):
+            parse_vlan_args([item])
+
+
+def test_invalid_vlan_in_answers_file_is_skipped():
+    detail = {"bad_pgs": [{"name": "VM Network", "vlan": 1}]}
+    assert "VLAN không hợp lệ" in missing_answers({"vlan": {"*": "4095"}}, "5.9", detail)
+    assert missing_answers({"vlan": {"VM Network": 20}}, "5.9", detail) is None
@@ -0,0 +1,43 @@
+"""FACT_CACHE: output đọc trong lúc host bị invalidate không được lưu lại."""
+
+from utils import FactCache
+
+HOST, PORT = "10.0.0.5", 22
+COMMAND = "esxcli system syslog config get"
+
+
+def test_invalidate_during_load_skips_store():
+    cache = FactCache()
+
+    def loader():
+        # Một lệnh ghi chạy xong trong lúc lệnh đọc còn đang chờ output
+        cache.invalidate(HOST, PORT)
+        return "stale"
+
+    assert cache.get(HOST, PORT, COMMAND, loader) == "stale"
+    assert not cache.contains(HOST, PORT, COMMAND)
+    assert cache.get(HOST, PORT, COMMAND, lambda: "fresh") == "fresh"
+    assert cache.get(HOST, PORT, COMMAND, lambda: "unused") == "fresh"
+
+
+def test_invalidate_other_host_keeps_store():
+    cache = FactCache()
+
+    def loader():
+        cache.invalidate("10.0.0.6")
+        cache.invalidate(HOST, PORT + 1)
+        return "value"
+
+    cache.get(HOST, PORT, COMMAND, loader)
+    assert cache.contains(HOST, PORT, COMMAND)
+
+
+def test_clear_during_load_skips_store():
+    cache = FactCache()
+
+    def loader():
+        cache.clear()
+        return "stale"
+
+    cache.get(HOST, PORT, COMMAND, loader)
+    assert not cache.contains(HOST, PORT, COMMAND)
@@ -0,0 +1,91 @@
+"""
+Parser output ESXi trên golden corpus (benchmarks/corpus/)
+
+Kết quả mong đợi của mỗi file corpus nằm ở tests/golden/<tên file>.json. Khi đổi định
+dạng kết quả của một parser có chủ đích, sinh lại file golden tương ứng và xem lại diff.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_ROOT
+from sinks import dump_json
+from checks.virtual_machine import build_vmx_dump_commands, parse_vmx_dump, parse_vmx_stat
+
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+import bench_parsers  # noqa: E402
+
+GOLDEN_DIR = os.path.join(REPO_ROOT, "tests", "golden")
+
+
+def _read_corpus(name):
+    with open(os.path.join(bench_parsers.CORPUS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def _as_json(value):
+    """Kết quả parser ở dạng JSON (tuple -> list, VmRecord -> dict) để so với golden."""
+    return json.loads(dump_json(value))
+
+
+@pytest.mark.parametrize("name", sorted(bench_parsers.CORPUS_FILES))
+def test_corpus_matches_golden(name):
+    legacy, parser = bench_parsers.PARSERS[bench_parsers.CORPUS_FILES[name]]
+    text = _read_corpus(name)
+    with open(os.path.join(GOLDEN_DIR, os.path.splitext(name)[0] + ".json"), encoding="utf-8") as f:
+        golden = json.load(f)
+
+    assert _as_json(parser(text)) == golden
+    # Parser nhận cả iterable các dòng (file, stream) và cho cùng kết quả
+    assert _as_json(parser(text.splitlines(keepends=True))) == golden
+    # Parser cũ (trước khi viết lại) cho cùng kết quả
+    assert _as_json(legacy(text)) == golden
+
+
+def test_synthetic_outputs_match_legacy():
+    cases = {
+        "getallvms": bench_parsers.synth_getallvms(500),
+        "vmx_dump": bench_parsers.synth_vmx_dump(200),
+        "vib_list": bench_parsers.synth_vib_list(500),
+        "network_inventory": bench_parsers.synth_network_inventory(100),
+        "advanced_list": bench_parsers.synth_advanced_list(300),
+    }
+    for case, text in cases.items():
+        legacy, parser = bench_parsers.PARSERS[case]
+        assert _as_json(parser(text)) == _as_json(legacy(text)), case
+
+
+def test_vmx_dump_without_trailing_newline(tmp_path):
+    """File .vmx không kết thúc bằng newline không được làm dính marker của file sau."""
+    first = tmp_path / "a b" / "first.vmx"
+    second = tmp_path / "second.vmx"
+    first.parent.mkdir()
+    first.write_text('displayName = "first"\nlog.keepOld = "10"', encoding="utf-8")
+    second.write_text('displayName = "second"\nlog.keepOld = "3"\n', encoding="utf-8")
+    paths = [str(first), str(second)]
+
+    output = "".join(subprocess.run(["/bin/sh", "-c", cmd], capture_output=True, text=True, check=True).stdout
+                     for cmd in build_vmx_dump_commands(paths))
+
+    assert parse_vmx_dump(output) == {
+        str(first): {"displayName": "first", "log.keepOld": "10"},
+        str(second): {"displayName": "second", "log.keepOld": "3"},
+    }
+
+
+def test_parse_vmx_stat_with_digest():
+    output = "\n".join([
+        "1700000000 355 /vmfs/volumes/datastore1/vm one/vm one.vmx",
+        "1700000001 289 /vmfs/volumes/datastore1/vm-2/vm-2.vmx",
+        "de225b672e0f3c26ee648f9fcac0207b  /vmfs/volumes/datastore1/vm one/vm one.vmx",
+        "md5sum: /vmfs/volumes/datastore1/vm-2/vm-2.vmx: Permission denied",
+    ])
+    assert parse_vmx_stat(output) == {
+        "/vmfs/volumes/datastore1/vm one/vm one.vmx": (1700000000, 355, "de225b672e0f3c26ee648f9fcac0207b"),
+        # Không đọc được nội dung: md5 rỗng, VMX cache luôn đọc lại file này
+        "/vmfs/volumes/datastore1/vm-2/vm-2.vmx": (1700000001, 289, ""),
+    }
@@ -0,0 +1,115 @@
+"""
+Vòng quét -> sửa -> kiểm tra lại -> hoàn tác trên simulator (simulator/)
+
+Chạy main.main như người vận hành: quét fleet giả lập, sửa mọi mục KHÔNG ĐẠT với answers
+đầy đủ, kiểm tra lại các mục vừa sửa, rồi `--rollback latest` phải đưa trạng thái của mọi
+host (state.json và key / value của các file .vmx) về đúng như trước khi sửa. Thứ tự các
+dòng trong .vmx không được giữ (lệnh sửa / hoàn tác ghi key ở cuối file) và không ảnh hưởng
+tới VM.
+"""
+
+import json
+import os
+import socket
+
+import pytest
+
+import main
+from simulator.server import start_fleet, stop_fleet, fleet_inventory
+from simulator.state import COMMUNITY_VIB, load_state
+from checks.virtual_machine import VM_LIST_CMD, parse_vmx
+from fingerprint import get_host_fingerprint
+from utils import FACT_CACHE, close_ssh_connections, run_ssh_command
+from vmx_cache import set_vmx_cache
+
+HOSTS = 2
+VMS_PER_HOST = 5
+
+
+def _free_port_range(count, attempts=20):
+    """Port đầu của `count` port liên tiếp đang trống trên 127.0.0.1."""
+    for _ in range(attempts):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            base = s.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(("127.0.0.1", port))
+        except OSError:
+            continue
+        return base
+    pytest.skip("không tìm được port trống cho simulator")
+
+
+@pytest.fixture
+def fleet(tmp_path, monkeypatch):
+    """Fleet giả lập (2 host, mỗi host 5 VM, ~50% setting KHÔNG ĐẠT) và file inventory của nó."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("CIS_CACHE_DIR", str(cache_dir))
+    set_vmx_cache(str(cache_dir))
+    FACT_CACHE.clear()
+
+    state_dir = tmp_path / "state"
+    hosts = start_fleet(str(state_dir), HOSTS, base_port=_free_port_range(HOSTS), vm_count=VMS_PER_HOST,
+                        failure_rate=0.5)
+    inventory = tmp_path / "inventory.json"
+    inventory.write_text(json.dumps(fleet_inventory(hosts)), encoding="utf-8")
+    try:
+        yield hosts, str(inventory)
+    finally:
+        close_ssh_connections()
+        stop_fleet(hosts)
+        FACT_CACHE.clear()
+        set_vmx_cache()
+
+
+def _snapshot(host):
+    """Trạng thái đầy đủ của một host giả lập: state.json và {file .vmx: {key: value}}."""
+    files = {}
+    vmfs = os.path.join(host.state_dir, "vmfs")
+    for dirpath, _, names in os.walk(vmfs):
+        for name in names:
+            if name.endswith(".vmx"):
+                path = os.path.join(dirpath, name)
+                with open(path, encoding="utf-8") as f:
+                    files[os.path.relpath(path, vmfs)] = parse_vmx(f)
+    return load_state(host.state_dir), files
+
+
+def test_scan_fix_verify_rollback(fleet, tmp_path):
+    hosts, inventory = fleet
+    before = {host.port: _snapshot(host) for host in hosts}
+
+    status_path = tmp_path / "status.json"
+    code = main.main([
+        "--inventory", inventory, "--fix", "all", "--syslog-host", "tcp://10.0.0.1:514",
+        "--vlan", "*=30", "--vms", "all", "--status-json", str(status_path),
+    ])
+    status = json.loads(status_path.read_text(encoding="utf-8"))
+
+    assert status["verified"] is True
+    assert status["errors"] == []
+    # 2.4 không sửa được khi còn VIB CommunitySupported (chỉ đổi acceptance level thì không đủ)
+    community_hosts = {f"127.0.0.1:{port}" for port, (state, _) in before.items()
+                       if any(vib[0] == COMMUNITY_VIB[0] for vib in state["vibs"])}
+    assert {(f["host"], f["section"]) for f in status["failed"]} == {(h, "2.4") for h in community_hosts}
+    assert code == (main.EXIT_FAILED if community_hosts else main.EXIT_OK)
+    assert {host.port: _snapshot(host) for host in hosts} != before
+
+    assert main.main(["--inventory", inventory, "--rollback", "latest"]) == main.EXIT_OK
+    assert {host.port: _snapshot(host) for host in hosts} == before
+
+
+def test_fingerprint_seeds_vm_list(fleet):
+    """Output getallvms đọc kèm dấu vân tay (--delta) được lưu vào FACT_CACHE đúng như khi chạy riêng."""
+    hosts, _ = fleet
+    port = hosts[0].port
+    components = get_host_fingerprint("127.0.0.1", "root", "simulator", port=port)
+
+    assert components["vms"]
+    assert FACT_CACHE.contains("127.0.0.1", port, VM_LIST_CMD)
+    cached = FACT_CACHE.get("127.0.0.1", port, VM_LIST_CMD, lambda: None)
+    assert cached == run_ssh_command("127.0.0.1", "root", "simulator", VM_LIST_CMD, port=port)
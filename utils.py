@@ -1,45 +1,100 @@
 """
 Hàm tiện ích dùng chung: SSH connection
+
+Mỗi host chỉ giữ MỘT kết nối SSH đã xác thực cho cả lần chạy (connection pool).
+Các hàm check_*/fix_* gọi run_ssh_command như cũ, pool được dùng trong suốt.
 """
 
-import paramiko
+import atexit
+import hashlib
 import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import paramiko
 
-def run_ssh_command(host, username, password=None, command="", port=22, timeout=10, key_path=None):
-    """
-    Chạy lệnh SSH và trả về stdout (str).
-    
-    Hỗ trợ 2 phương thức xác thực:
-    - Password: Truyền password
-    - SSH Key: Truyền key_path (đường dẫn đến private key)
-    """
+from limiter import LIMITER
+from metrics import METRICS
+
+# Gửi keepalive mỗi 30 giây để ESXi không đóng session đang rảnh
+SSH_KEEPALIVE_INTERVAL = 30
+
+# Số lần thử lại khi kết nối trong pool bị rớt giữa chừng
+SSH_RECONNECT_RETRIES = 1
+
+# Dòng phân cách giữa các phần output khi gộp nhiều lệnh vào một lần exec
+BATCH_MARKER = "@@CIS@@"
+
+# Dòng phân cách các lệnh trong script đọc gộp của read planner; khác BATCH_MARKER
+# vì bản thân các lệnh con có thể đã là lệnh gộp dùng BATCH_MARKER
+PLAN_MARKER = "@@CIS-PLAN@@"
+
+# Dòng đầu (comment shell) của lệnh dump nội dung các file .vmx
+VMX_DUMP_HEADER = "# cis-vmx-dump"
+
+# Số exec channel chạy đồng thời tối đa trên một transport
+# (sshd của ESXi mặc định MaxSessions = 10, chừa lại vài slot)
+MAX_CHANNELS_PER_HOST = 8
+
+
+class SSHStats:
+    """Bộ đếm SSH của lần chạy: số session mở, số exec channel, số byte gửi / nhận, số lần kết nối lại."""
+
+    FIELDS = ("sessions", "channels", "bytes_sent", "bytes_received", "reconnects")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add(self, **deltas):
+        with self._lock:
+            for name, n in deltas.items():
+                self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+
+SSH_STATS = SSHStats()
+
+
+def _load_private_key(key_path, password=None):
+    """Đọc private key, thử lần lượt các định dạng RSA / Ed25519 / ECDSA."""
+    key_path = os.path.expanduser(key_path)  # Hỗ trợ ~ trong đường dẫn
+
+    key_types = [
+        (paramiko.RSAKey, "RSA"),
+        (paramiko.Ed25519Key, "Ed25519"),
+        (paramiko.ECDSAKey, "ECDSA"),
+    ]
+
+    for key_class, key_name in key_types:
+        try:
+            return key_class.from_private_key_file(key_path, password=password)
+        except paramiko.ssh_exception.SSHException:
+            continue
+
+    raise ValueError(f"Không thể đọc private key từ: {key_path}")
+
+
+def _open_client(host, username, password=None, port=22, timeout=10, key_path=None):
+    """Mở một SSHClient mới đã xác thực (password hoặc SSH key)."""
     client = paramiko.SSHClient()
     client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    
+
+    started = time.perf_counter()
     try:
         if key_path:
             # Xác thực bằng SSH key
-            key_path = os.path.expanduser(key_path)  # Hỗ trợ ~ trong đường dẫn
-            
-            # Thử load key với các định dạng khác nhau
-            pkey = None
-            key_types = [
-                (paramiko.RSAKey, "RSA"),
-                (paramiko.Ed25519Key, "Ed25519"),
-                (paramiko.ECDSAKey, "ECDSA"),
-            ]
-            
-            for key_class, key_name in key_types:
-                try:
-                    pkey = key_class.from_private_key_file(key_path, password=password)
-                    break
-                except paramiko.ssh_exception.SSHException:
-                    continue
-            
-            if pkey is None:
-                raise ValueError(f"Không thể đọc private key từ: {key_path}")
-            
+            pkey = _load_private_key(key_path, password)
             client.connect(
                 hostname=host,
                 port=port,
@@ -60,13 +115,520 @@ def run_ssh_command(host, username, password=None, command="", port=22, timeout=
                 allow_agent=False,
                 timeout=timeout,
             )
-        
-        stdin, stdout, stderr = client.exec_command(command)
-        out = stdout.read().decode("utf-8", errors="ignore")
-        err = stderr.read().decode("utf-8", errors="ignore")
-        if err.strip():
-            print(f"[{host}] CẢNH BÁO: stderr trả về:\n{err}")
-        return out
-    finally:
+    except Exception:
         client.close()
+        raise
+
+    METRICS.observe("cis_ssh_connect_seconds", time.perf_counter() - started)
+    SSH_STATS.add(sessions=1)
+    transport = client.get_transport()
+    if transport is not None:
+        transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+    return client
+
+
+class SSHConnectionPool:
+    """
+    Pool kết nối SSH, mỗi khóa (host, port, username, auth) giữ một client.
+
+    - Kiểm tra sức khỏe transport trước mỗi lần dùng, tự kết nối lại nếu đã chết.
+    - Thread-safe: mỗi khóa có lock riêng nên nhiều host có thể kết nối song song.
+    - Mỗi khóa có semaphore giới hạn số exec channel mở đồng thời trên transport.
+    """
+
+    def __init__(self, max_channels=MAX_CHANNELS_PER_HOST):
+        self.max_channels = max_channels
+        self._clients = {}
+        self._locks = {}
+        self._channel_slots = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(host, username, password=None, port=22, key_path=None):
+        """Tạo khóa pool. Password/passphrase được băm, không giữ nguyên văn trong khóa."""
+        secret = hashlib.sha256((password or "").encode("utf-8")).hexdigest()
+        auth = ("key", os.path.expanduser(key_path), secret) if key_path else ("password", secret)
+        return (host, port, username, auth)
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def channel_slot(self, host, username, password=None, port=22, key_path=None):
+        """Semaphore giới hạn số channel đồng thời của một khóa."""
+        key = self.make_key(host, username, password, port, key_path)
+        with self._lock:
+            slot = self._channel_slots.get(key)
+            if slot is None:
+                slot = self._channel_slots[key] = threading.BoundedSemaphore(self.max_channels)
+            return slot
+
+    @staticmethod
+    def _is_alive(client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    def get_client(self, host, username, password=None, port=22, timeout=10, key_path=None):
+        """Lấy client đang sống trong pool, hoặc mở kết nối mới."""
+        key = self.make_key(host, username, password, port, key_path)
+        with self._key_lock(key):
+            client = self._clients.get(key)
+            if client is not None and self._is_alive(client):
+                return client
+            if client is not None:
+                client.close()
+            client = _open_client(host, username, password, port, timeout, key_path)
+            self._clients[key] = client
+            return client
+
+    def discard(self, host, username, password=None, port=22, key_path=None, client=None):
+        """
+        Đóng và loại bỏ kết nối của một khóa (ví dụ sau khi exec bị lỗi).
+
+        client: kết nối vừa lỗi; chỉ bị loại khỏi pool nếu pool vẫn đang giữ đúng nó, để
+        không đóng kết nối mới mà thread khác vừa mở lại.
+        """
+        key = self.make_key(host, username, password, port, key_path)
+        with self._key_lock(key):
+            if client is None:
+                client = self._clients.pop(key, None)
+            elif self._clients.get(key) is client:
+                del self._clients[key]
+        if client is not None:
+            client.close()
+
+    def close_all(self):
+        """Đóng toàn bộ kết nối trong pool."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+SSH_POOL = SSHConnectionPool()
+atexit.register(SSH_POOL.close_all)
+
+
+def close_ssh_connections():
+    """Đóng tất cả kết nối SSH đang giữ trong pool."""
+    SSH_POOL.close_all()
+
+
+def command_kind(command):
+    """Nhãn ngắn (số lượng giới hạn) của một lệnh cho metrics: plan, read:<topic>, write:<topic>, other."""
+    if PLAN_MARKER in command:
+        return "plan"
+    topics = write_topics(command)
+    if topics:
+        return "write:" + "+".join(sorted(topics))
+    topics = read_topics(command)
+    if topics:
+        return "read:" + "+".join(sorted(topics))
+    return "other"
+
+
+def _exec_ssh_command(host, username, password=None, command="", port=22, timeout=10, key_path=None,
+                      read_only=False):
+    """
+    Chạy lệnh trên kết nối trong SSH_POOL; nếu transport bị rớt, kết nối lại và chạy lại.
+
+    Chỉ chạy lại khi lỗi xảy ra trước khi host nhận lệnh (mở channel / exec_command). Lỗi
+    lúc đang đọc output thì lệnh có thể đã chạy trên host, nên chỉ lệnh đọc (read_only=True,
+    từ run_ssh_read / read planner) mới được chạy lại; lệnh ghi (printf >> file, reload,
+    script hoàn tác...) chạy lại có thể áp dụng thay đổi hai lần.
+
+    Lệnh phải lấy slot ở các giới hạn đồng thời thích ứng (limiter.LIMITER) của host,
+    hostd (với vim-cmd), site và toàn cục trước khi mở channel.
+    """
+    kind = command_kind(command)
+    with LIMITER.command(host, port, command, kind):
+        return _exec_ssh_command_limited(host, username, password, command, port, timeout, key_path, kind,
+                                         read_only)
+
+
+def _exec_ssh_command_limited(host, username, password, command, port, timeout, key_path, kind, read_only):
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        client = SSH_POOL.get_client(host, username, password, port, timeout, key_path)
+        executed = False
+        try:
+            with SSH_POOL.channel_slot(host, username, password, port, key_path):
+                SSH_STATS.add(channels=1, bytes_sent=len(command.encode("utf-8")))
+                exec_started = time.perf_counter()
+                stdin, stdout, stderr = client.exec_command(command)
+                executed = True
+                read_started = time.perf_counter()
+                raw_out = stdout.read()
+                raw_err = stderr.read()
+                read_done = time.perf_counter()
+            break
+        except (paramiko.SSHException, EOFError, socket.error):
+            SSH_POOL.discard(host, username, password, port, key_path, client=client)
+            if attempt >= SSH_RECONNECT_RETRIES or (executed and not read_only):
+                METRICS.inc("cis_ssh_errors_total", kind=kind)
+                raise
+            attempt += 1
+            SSH_STATS.add(reconnects=1)
+            METRICS.inc("cis_ssh_retries_total", kind=kind)
+            print(f"[{host}] Kết nối SSH bị gián đoạn, đang kết nối lại...")
+
+    METRICS.observe("cis_ssh_exec_seconds", read_started - exec_started, kind=kind)
+    METRICS.observe("cis_ssh_read_seconds", read_done - read_started, kind=kind)
+    METRICS.observe("cis_ssh_command_seconds", read_done - started, kind=kind)
+    METRICS.inc("cis_ssh_bytes_sent_total", len(command.encode("utf-8")), kind=kind)
+    METRICS.inc("cis_ssh_bytes_received_total", len(raw_out) + len(raw_err), kind=kind)
+    SSH_STATS.add(bytes_received=len(raw_out) + len(raw_err))
+    out = raw_out.decode("utf-8", errors="ignore")
+    err = raw_err.decode("utf-8", errors="ignore")
+    if err.strip():
+        print(f"[{host}] CẢNH BÁO: stderr trả về:\n{err}")
+    return out
+
+
+def run_ssh_command(host, username, password=None, command="", port=22, timeout=10, key_path=None):
+    """
+    Chạy lệnh SSH và trả về stdout (str).
+
+    Hỗ trợ 2 phương thức xác thực:
+    - Password: Truyền password
+    - SSH Key: Truyền key_path (đường dẫn đến private key)
+
+    Kết nối được lấy từ SSH_POOL. Nếu lệnh thay đổi cấu hình host, các dữ liệu đọc
+    liên quan trong FACT_CACHE bị bỏ để lần đọc sau lấy giá trị mới.
+    """
+    try:
+        return _exec_ssh_command(host, username, password, command, port=port, timeout=timeout, key_path=key_path)
+    finally:
+        FACT_CACHE.invalidate_for_write(host, port, command)
+
+
+def _run_concurrently(runner, host, username, password, commands, port, timeout, key_path, max_channels):
+    commands = list(commands)
+    if not commands:
+        return []
+
+    workers = min(len(commands), max_channels or SSH_POOL.max_channels)
+    if workers <= 1:
+        return [runner(host, username, password, cmd, port, timeout, key_path) for cmd in commands]
+
+    # Kết nối trước để các thread không cùng bắt tay SSH
+    SSH_POOL.get_client(host, username, password, port, timeout, key_path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(runner, host, username, password, cmd, port, timeout, key_path)
+            for cmd in commands
+        ]
+        return [f.result() for f in futures]
+
+
+def shell_quote(value):
+    """Quote một chuỗi cho shell (busybox sh trên ESXi) bằng dấu nháy đơn."""
+    return "'" + str(value).replace("'", "'\\''") + "'"
+
+
+def build_batch_command(commands, marker=BATCH_MARKER):
+    """
+    Gộp nhiều lệnh thành một script, mỗi phần output mở đầu bằng '<marker> <tên>'.
+
+    commands: dict {tên: lệnh}. Dùng cùng split_batch_output để tách kết quả.
+    """
+    lines = []
+    for name, cmd in commands.items():
+        lines.append(f"echo {shell_quote(f'{marker} {name}')}")
+        lines.append(cmd)
+    return "\n".join(lines)
+
+
+def iter_lines(output):
+    """
+    Các dòng của output cho parser: str được tách theo dòng, còn iterable các dòng
+    (list, file, stream...) được dùng trực tiếp (bỏ ký tự xuống dòng ở cuối).
+    """
+    if isinstance(output, str):
+        return output.splitlines()
+    return (line.rstrip("\r\n") for line in output)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def collapse_spaces(text):
+    """
+    Gộp các khoảng trắng liên tiếp thành một (chỉ tạo chuỗi mới khi cần); không cắt
+    khoảng trắng ở hai đầu, người gọi tự strip nếu cần.
+    """
+    if "  " in text or "\t" in text:
+        return _WHITESPACE_RE.sub(" ", text)
+    return text
+
+
+def split_batch_lines(output, marker=BATCH_MARKER):
+    """Như split_batch_output nhưng giữ mỗi phần là list các dòng (không nối lại thành chuỗi)."""
+    sections = {}
+    buf = None
+    prefix = marker + " "
+    for line in iter_lines(output):
+        if line.startswith(prefix):
+            buf = sections[line[len(prefix):]] = []
+        elif buf is not None:
+            buf.append(line)
+    return sections
+
+
+def split_batch_output(output, marker=BATCH_MARKER):
+    """Tách output của build_batch_command thành dict {tên: output của lệnh đó}."""
+    return {name: "\n".join(lines) for name, lines in split_batch_lines(output, marker).items()}
+
+
+# Chủ đề (topic) của dữ liệu đọc từ host: (tên, regex lệnh đọc, regex lệnh ghi).
+# Lệnh đọc được gắn các topic khớp regex đọc; khi một lệnh ghi khớp regex ghi của
+# topic nào, mọi lệnh đọc đã lưu thuộc topic đó trên host bị bỏ khỏi cache.
+FACT_TOPICS = [
+    ("advanced", r"esxcli system settings advanced list", r"esxcli system settings advanced set"),
+    ("advopt", r"vim-cmd hostsvc/advopt/view", r"vim-cmd hostsvc/advopt/update"),
+    ("network", r"esxcli network vswitch standard\b.*\b(list|get)\b",
+     r"esxcli network vswitch standard\b.*\b(set|add|remove)\b"),
+    ("syslog", r"esxcli system syslog config get", r"esxcli system syslog (config set|reload)"),
+    ("software", r"esxcli software (acceptance get|vib list)", r"esxcli software (acceptance set|vib (install|update|remove))"),
+    ("vms", r"vim-cmd vmsvc/getallvms", r"vim-cmd (vmsvc/(unregister|destroy)|solo/register)"),
+    ("vmx", r"\.vmx|" + re.escape(VMX_DUMP_HEADER), r"sed -i|>>|\bmv\b|vim-cmd vmsvc/reload"),
+]
+
+_FACT_TOPIC_PATTERNS = [
+    (name, re.compile(read_re), re.compile(write_re)) for name, read_re, write_re in FACT_TOPICS
+]
+
+_SHELL_TOKEN_RE = re.compile(r"('[^']*'|\"[^\"]*\")|\s+")
+
+
+def normalize_command(command):
+    """Chuẩn hóa lệnh làm khóa cache: bỏ dòng trống, gộp khoảng trắng ngoài dấu nháy."""
+    lines = []
+    for line in command.strip().splitlines():
+        line = _SHELL_TOKEN_RE.sub(lambda m: m.group(1) or " ", line.strip())
+        if line:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def read_topics(command):
+    """Các topic mà một lệnh đọc phụ thuộc vào."""
+    return frozenset(name for name, read_re, _ in _FACT_TOPIC_PATTERNS if read_re.search(command))
+
+
+def write_topics(command):
+    """Các topic mà một lệnh ghi làm thay đổi (rỗng nếu lệnh chỉ đọc)."""
+    return frozenset(name for name, _, write_re in _FACT_TOPIC_PATTERNS if write_re.search(command))
+
+
+class FactCache:
+    """
+    Bộ nhớ đệm dữ liệu đọc từ host trong một lần chạy, khóa (host, port, lệnh đã chuẩn hóa).
+
+    - Nhiều check cùng cần một output chỉ tốn một lần gọi SSH; các thread hỏi cùng
+      khóa sẽ chờ lần đọc đang chạy.
+    - run_ssh_command tự gọi invalidate_for_write sau mỗi lệnh ghi, nên fix_* không
+      bao giờ khiến check sau đọc phải dữ liệu cũ.
+    - loader() chạy ngoài self._lock; mỗi (host, port) có một generation mà invalidate /
+      clear tăng lên, và get không lưu kết quả nếu generation đã đổi trong lúc loader chạy
+      (output đó có thể đã cũ so với lệnh ghi vừa xong).
+    - Đếm hit / miss / invalidation để biết cache tiết kiệm được bao nhiêu lần gọi.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._topics = {}
+        self._locks = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.seeded = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _generation(self, host, port):
+        """Generation hiện tại của (host, port); gọi khi đang giữ self._lock."""
+        return self._epoch, self._generations.get((host, None), 0), self._generations.get((host, port), 0)
+
+    def _bump(self, host, port):
+        """Đánh dấu output của (host, port) (hoặc mọi port nếu port là None) có thể đã cũ."""
+        key = (host, port)
+        self._generations[key] = self._generations.get(key, 0) + 1
+
+    def get(self, host, port, command, loader, refresh=False):
+        """Trả về output đã lưu của lệnh, hoặc gọi loader() rồi lưu lại."""
+        key = (host, port, normalize_command(command))
+        with self._key_lock(key):
+            with self._lock:
+                if not refresh and key in self._entries:
+                    self.hits += 1
+                    return self._entries[key]
+                self.misses += 1
+                generation = self._generation(host, port)
+            value = loader()
+            with self._lock:
+                # Bị invalidate trong lúc đọc: trả output cho người gọi nhưng không lưu
+                if self._generation(host, port) == generation:
+                    self._entries[key] = value
+                    self._topics[key] = read_topics(command)
+            return value
+
+    def contains(self, host, port, command):
+        with self._lock:
+            return (host, port, normalize_command(command)) in self._entries
+
+    def seed(self, host, port, command, value):
+        """Lưu sẵn output của một lệnh đã được đọc bằng cách khác (ví dụ trong script gộp)."""
+        key = (host, port, normalize_command(command))
+        with self._lock:
+            self._entries[key] = value
+            self._topics[key] = read_topics(command)
+            self.seeded += 1
+
+    def invalidate(self, host, port=None, topics=None):
+        """Bỏ các output đã lưu của host (chỉ những lệnh thuộc `topics` nếu có)."""
+        with self._lock:
+            self._bump(host, port)
+            for key in list(self._entries):
+                k_host, k_port, _ = key
+                if k_host != host or (port is not None and k_port != port):
+                    continue
+                if topics is not None and not (self._topics[key] & topics):
+                    continue
+                del self._entries[key]
+                del self._topics[key]
+                self.invalidations += 1
+
+    def invalidate_for_write(self, host, port, command):
+        """Gọi sau một lệnh ghi: bỏ các lệnh đọc bị ảnh hưởng."""
+        topics = write_topics(command)
+        if topics:
+            self.invalidate(host, port, topics)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "seeded": self.seeded,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._topics.clear()
+            self._epoch += 1
+
+
+FACT_CACHE = FactCache()
+
+
+def run_ssh_read(host, username, password=None, command="", port=22, timeout=10, key_path=None, refresh=False):
+    """
+    Như run_ssh_command nhưng chỉ dùng cho lệnh đọc: output được giữ trong FACT_CACHE
+    cho cả lần chạy, tới khi một lệnh ghi liên quan làm nó hết hạn.
+    """
+    return FACT_CACHE.get(
+        host, port, command,
+        lambda: _exec_ssh_command(host, username, password, command, port=port, timeout=timeout, key_path=key_path,
+                                  read_only=True),
+        refresh=refresh,
+    )
+
+
+def run_ssh_reads(host, username, password=None, commands=(), port=22, timeout=10, key_path=None,
+                  max_channels=None):
+    """
+    Chạy nhiều lệnh đọc độc lập đồng thời trên cùng một transport của host, qua FACT_CACHE:
+    chỉ lệnh chưa có trong cache mới được gửi.
+
+    Mỗi lệnh dùng một exec channel riêng; số channel mở cùng lúc bị giới hạn bởi
+    semaphore của pool. Trả về list stdout theo đúng thứ tự của commands.
+    """
+    return _run_concurrently(run_ssh_read, host, username, password, commands, port, timeout, key_path,
+                             max_channels)
+
+
+def build_plan_script(commands, marker=PLAN_MARKER):
+    """
+    Gộp các lệnh đọc thành một script; output của lệnh thứ i nằm giữa dòng '<marker> i'
+    và dòng marker kế tiếp. Mỗi lệnh chạy trong subshell riêng để biến / exit không ảnh
+    hưởng lệnh sau, và marker luôn được in sau một ký tự xuống dòng nên output của lệnh
+    được giữ nguyên từng byte kể cả khi không kết thúc bằng newline.
+    """
+    lines = []
+    for i, cmd in enumerate(commands):
+        lines.append(f"printf '\\n%s\\n' {shell_quote(f'{marker} {i}')}")
+        lines.append(f"(\n{cmd}\n)")
+    lines.append(f"printf '\\n%s\\n' {shell_quote(f'{marker} end')}")
+    return "\n".join(lines)
+
+
+def split_plan_output(output, marker=PLAN_MARKER):
+    """Tách output của build_plan_script thành dict {chỉ số lệnh: output}; lệnh bị cắt giữa chừng bị bỏ."""
+    parts = re.split(f"\n{re.escape(marker)} (\\w+)\n", output)
+    outputs = {}
+    # parts = [trước marker đầu, tên_0, output_0, tên_1, output_1, ..., "end", phần còn lại]
+    for i in range(1, len(parts) - 2, 2):
+        name = parts[i]
+        if name.isdigit():
+            outputs[int(name)] = parts[i + 1]
+    return outputs
+
+
+def run_ssh_read_plan(host, username, password=None, commands=(), port=22, timeout=10, key_path=None):
+    """
+    Đọc trước nhiều lệnh trong MỘT lần exec và lưu output từng lệnh vào FACT_CACHE.
+
+    Các lệnh trùng nhau (sau khi chuẩn hóa) hoặc đã có trong cache bị bỏ qua; các lần
+    run_ssh_read sau đó với cùng lệnh sẽ lấy kết quả từ cache. Trả về số lệnh đã đọc.
+    """
+    pending = {}
+    for cmd in commands:
+        key = normalize_command(cmd)
+        if key not in pending and not FACT_CACHE.contains(host, port, cmd):
+            pending[key] = cmd
+    pending = list(pending.values())
+    if not pending:
+        return 0
+    if len(pending) == 1:
+        run_ssh_read(host, username, password, pending[0], port=port, timeout=timeout, key_path=key_path)
+        return 1
+
+    out = _exec_ssh_command(host, username, password, build_plan_script(pending),
+                            port=port, timeout=timeout, key_path=key_path, read_only=True)
+    outputs = split_plan_output(out)
+    for i, cmd in enumerate(pending):
+        if i in outputs:
+            FACT_CACHE.seed(host, port, cmd, outputs[i])
+    return len(pending)
+
+
+def invalidate_ssh_reads(host, port=None, topics=None):
+    """Bỏ các output đã lưu của host (chỉ những topic trong `topics` nếu có)."""
+    FACT_CACHE.invalidate(host, port, frozenset(topics) if topics is not None else None)
+
+
+def fact_cache_stats():
+    """Thống kê hit / miss / invalidation của FACT_CACHE."""
+    return FACT_CACHE.stats()
+
 
+def ssh_stats():
+    """Thống kê SSH của lần chạy (xem SSHStats)."""
+    return SSH_STATS.snapshot()
@@ -0,0 +1,126 @@
+"""
+Cache cấu hình VM (.vmx) lưu trên đĩa giữa các lần chạy
+
+Mỗi bản ghi là map key/value đã parse của một file .vmx, khóa (host, path) và kèm
+mtime + size + md5 của file lúc đọc. Lần quét sau chỉ cần một lệnh `stat` + `md5sum`
+cho mọi file; file nào có mtime/size/md5 không đổi được lấy từ cache, chỉ file thay
+đổi mới phải kéo nội dung về từ host. md5 là bắt buộc: mtime chỉ chính xác tới giây,
+nên sửa giữ nguyên kích thước trong cùng giây với lần đọc trước (ví dụ "0" -> "1")
+không làm mtime/size đổi.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+# Thư mục cache mặc định, có thể đổi bằng biến môi trường CIS_CACHE_DIR
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "cis-esxi")
+
+VMX_CACHE_FILE = "vmx_cache.sqlite3"
+
+
+def get_cache_dir():
+    """Thư mục cache đang dùng (tạo nếu chưa có)."""
+    cache_dir = os.path.expanduser(os.environ.get("CIS_CACHE_DIR") or DEFAULT_CACHE_DIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+class VmxCache:
+    """Cache SQLite của các file .vmx đã parse, khóa (host, path), kiểm tra bằng (mtime, size, md5)."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vmx ("
+                " host TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " mtime INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " config TEXT NOT NULL,"
+                " digest TEXT NOT NULL DEFAULT '',"
+                " PRIMARY KEY (host, path))"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(vmx)")]
+            if "digest" not in columns:
+                # Cache cũ (chưa có md5): các bản ghi có digest rỗng nên luôn bị đọc lại
+                self._conn.execute("ALTER TABLE vmx ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+
+    def lookup(self, host, stats):
+        """
+        So stats {path: (mtime, size, md5)} với cache của host.
+
+        Trả về (configs, changed): configs = {path: config} của các file không đổi,
+        changed = list path cần đọc lại từ host. File không có md5 luôn được đọc lại.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, mtime, size, digest, config FROM vmx WHERE host = ?", (host,)
+            ).fetchall()
+        cached = {path: ((mtime, size, digest), config) for path, mtime, size, digest, config in rows}
+
+        configs = {}
+        changed = []
+        for path, stat in stats.items():
+            entry = cached.get(path)
+            if entry is not None and stat[2] and entry[0] == tuple(stat):
+                configs[path] = json.loads(entry[1])
+            else:
+                changed.append(path)
+        return configs, changed
+
+    def store(self, host, entries):
+        """Lưu các bản ghi mới: entries = {path: (mtime, size, md5, config)}."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vmx (host, path, mtime, size, digest, config) VALUES (?, ?, ?, ?, ?, ?)",
+                [(host, path, mtime, size, digest, json.dumps(config))
+                 for path, (mtime, size, digest, config) in entries.items()],
+            )
+
+    def prune(self, host, keep_paths):
+        """Xóa bản ghi của các VM không còn trên host."""
+        keep_paths = set(keep_paths)
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT path FROM vmx WHERE host = ?", (host,)).fetchall()
+            stale = [(host, path) for (path,) in rows if path not in keep_paths]
+            if stale:
+                self._conn.executemany("DELETE FROM vmx WHERE host = ? AND path = ?", stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_VMX_CACHE = None
+_VMX_CACHE_DISABLED = os.environ.get("CIS_VMX_CACHE", "").lower() in ("0", "off", "false", "no")
+_VMX_CACHE_LOCK = threading.Lock()
+
+
+def get_vmx_cache():
+    """VmxCache dùng chung cho lần chạy, None nếu cache bị tắt hoặc không mở được."""
+    global _VMX_CACHE, _VMX_CACHE_DISABLED
+    with _VMX_CACHE_LOCK:
+        if _VMX_CACHE is None and not _VMX_CACHE_DISABLED:
+            try:
+                _VMX_CACHE = VmxCache(os.path.join(get_cache_dir(), VMX_CACHE_FILE))
+            except (OSError, sqlite3.Error) as e:
+                print(f"CẢNH BÁO: không mở được VMX cache, đọc toàn bộ .vmx từ host: {e}")
+                _VMX_CACHE_DISABLED = True
+        return _VMX_CACHE
+
+
+def set_vmx_cache(cache_dir=None, enabled=True):
+    """Bật/tắt VMX cache hoặc chuyển sang thư mục cache khác."""
+    global _VMX_CACHE, _VMX_CACHE_DISABLED
+    with _VMX_CACHE_LOCK:
+        if _VMX_CACHE is not None:
+            _VMX_CACHE.close()
+            _VMX_CACHE = None
+        _VMX_CACHE_DISABLED = not enabled
+        if cache_dir:
+            os.environ["CIS_CACHE_DIR"] = cache_dir